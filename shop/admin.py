@@ -1,6 +1,63 @@
+from datetime import timedelta
+from functools import reduce
+from operator import or_
+
+from django.conf import settings
 from django.contrib import admin
+from django.contrib.auth.models import User
+from django.db.models import Q, Sum
+from django.http import StreamingHttpResponse
+from django.template.response import TemplateResponse
+from django.utils import timezone
 from django.utils.html import format_html
-from .models import Category, Product, ProductImage, Cart, CartItem, Order, OrderItem, Review
+from .models import Category, Product, ProductImage, Cart, CartItem, Order, OrderItem, Review, cart_totals_expressions
+from .models import DailyCategorySales, DailyProductSales, DailySales, SalesRollupState
+from .order_export import CONTENT_TYPES, order_chunks, render
+from .pagination import EstimatedCountPaginator
+from .ratings import set_approval
+from .search import matching_products
+
+
+def prefix(field, term):
+    """Пошук за початком значення діапазоном: на відміну від LIKE використовує звичайний індекс"""
+    return Q(**{f'{field}__gte': term, f'{field}__lt': term + '\U0010ffff'})
+
+
+def username_prefix(term):
+    return User.objects.filter(prefix('username', term)).values('pk')
+
+
+def product_matches(term, column=None):
+    """id товарів для пошуку в адмінці: не більше SHOP_SEARCH_MAX_RESULTS найрелевантніших"""
+    limit = getattr(settings, 'SHOP_SEARCH_MAX_RESULTS', 1000)
+    return matching_products(term, column=column, limit=limit).values('pk')
+
+
+def product_name(term):
+    return product_matches(term, column='name')
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+    """Список для великих таблиць: оцінка кількості замість COUNT(*) і пошук лише за індексами.
+
+    Підкласи задають search_conditions(); search_fields лишаються для
+    поля пошуку та автодоповнення, а search_help_text пояснює, що шукається.
+    """
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    def search_conditions(self, term):
+        """Умови Q, об'єднані через OR; кожна має спиратися на індекс"""
+        return []
+
+    def get_search_results(self, request, queryset, search_term):
+        term = search_term.strip()
+        if not term:
+            return queryset, False
+        conditions = self.search_conditions(term)
+        if not conditions:
+            return queryset.none(), False
+        return queryset.filter(reduce(or_, conditions)), False
 
 
 @admin.register(Category)
@@ -19,12 +76,14 @@ class ProductImageInline(admin.TabularInline):
 
 
 @admin.register(Product)
-class ProductAdmin(admin.ModelAdmin):
-    list_display = ['name', 'category', 'price', 'discount_price', 'stock', 'is_active', 'is_featured', 'created_at']
+class ProductAdmin(LargeTableAdmin):
+    list_display = ['name', 'category', 'price', 'discount_price', 'stock', 'rating_avg', 'rating_count', 'is_active', 'is_featured', 'created_at']
     list_filter = ['category', 'is_active', 'is_featured', 'created_at']
     search_fields = ['name', 'description']
+    search_help_text = 'Слова з назви, категорії чи опису (найрелевантніші збіги) або початок slug'
     prepopulated_fields = {'slug': ('name',)}
-    readonly_fields = ['created_at', 'updated_at', 'discount_percentage_display']
+    readonly_fields = ['created_at', 'updated_at', 'discount_percentage_display', 'reserved',
+                       'rating_avg', 'rating_count', 'rating_1', 'rating_2', 'rating_3', 'rating_4', 'rating_5']
     inlines = [ProductImageInline]
     
     fieldsets = (
@@ -32,11 +91,15 @@ class ProductAdmin(admin.ModelAdmin):
             'fields': ('name', 'slug', 'description', 'category')
         }),
         ('Ціна та наявність', {
-            'fields': ('price', 'discount_price', 'discount_percentage_display', 'stock')
+            'fields': ('price', 'discount_price', 'discount_percentage_display', 'stock', 'reserved')
         }),
         ('Налаштування', {
             'fields': ('image', 'is_active', 'is_featured')
         }),
+        ('Рейтинг', {
+            'fields': ('rating_avg', 'rating_count', 'rating_5', 'rating_4', 'rating_3', 'rating_2', 'rating_1'),
+            'classes': ('collapse',)
+        }),
         ('Дата створення', {
             'fields': ('created_at', 'updated_at'),
             'classes': ('collapse',)
@@ -49,49 +112,110 @@ class ProductAdmin(admin.ModelAdmin):
         return "Немає знижки"
     discount_percentage_display.short_description = "Знижка"
 
+    def search_conditions(self, term):
+        return [Q(pk__in=product_matches(term)), prefix('slug', term)]
+
 
 @admin.register(ProductImage)
-class ProductImageAdmin(admin.ModelAdmin):
+class ProductImageAdmin(LargeTableAdmin):
     list_display = ['product', 'alt_text', 'is_main']
     list_filter = ['is_main']
-    search_fields = ['product__name', 'alt_text']
+    list_select_related = ['product']
+    search_fields = ['product__name']
+    search_help_text = 'Слова з назви товару'
+    autocomplete_fields = ['product']
+
+    def search_conditions(self, term):
+        return [Q(product__in=product_name(term))]
 
 
 class CartItemInline(admin.TabularInline):
     model = CartItem
     extra = 0
     readonly_fields = ['added_at']
+    autocomplete_fields = ['product']
+
+    def get_queryset(self, request):
+        # __str__ рядка показує назву товару
+        return super().get_queryset(request).select_related('product')
 
 
 @admin.register(Cart)
-class CartAdmin(admin.ModelAdmin):
+class CartAdmin(LargeTableAdmin):
     list_display = ['user', 'total_items', 'total_price', 'created_at']
     list_filter = ['created_at']
-    search_fields = ['user__username', 'user__email']
+    search_fields = ['user__username']
+    search_help_text = 'Початок імені користувача'
     readonly_fields = ['created_at', 'updated_at', 'total_items', 'total_price']
+    raw_id_fields = ['user']
     inlines = [CartItemInline]
 
+    def get_queryset(self, request):
+        # Підсумки рахуються в тому ж запиті, що й список кошиків
+        totals = cart_totals_expressions('items__')
+        return super().get_queryset(request).select_related('user').annotate(
+            annotated_total_items=totals['total_items'],
+            annotated_total_price=totals['total_price'],
+        )
+
+    @admin.display(description='Кількість товарів', ordering='annotated_total_items')
+    def total_items(self, obj):
+        return obj.annotated_total_items
+
+    @admin.display(description='Загальна вартість', ordering='annotated_total_price')
+    def total_price(self, obj):
+        return obj.annotated_total_price
+
+    def search_conditions(self, term):
+        return [Q(user__in=username_prefix(term))]
+
 
 @admin.register(CartItem)
-class CartItemAdmin(admin.ModelAdmin):
+class CartItemAdmin(LargeTableAdmin):
     list_display = ['cart', 'product', 'quantity', 'total_price', 'added_at']
     list_filter = ['added_at']
     search_fields = ['cart__user__username', 'product__name']
+    search_help_text = 'Початок імені користувача або слова з назви товару'
+    list_select_related = ['cart__user', 'product']
+    raw_id_fields = ['cart']
+    autocomplete_fields = ['product']
+
+    def search_conditions(self, term):
+        return [Q(cart__user__in=username_prefix(term)), Q(product__in=product_name(term))]
+
+
+# Склад списується під час оформлення, тож товар і кількість рядка збереженого замовлення не редагуються:
+# інакше Product.stock розійшовся б із замовленнями. Видалення рядка повертає товар (signals.restock_deleted_line)
+PLACED_LINE_FIELDS = ['product', 'quantity', 'price', 'total_price']
 
 
 class OrderItemInline(admin.TabularInline):
     model = OrderItem
     extra = 0
     readonly_fields = ['total_price']
+    autocomplete_fields = ['product']
+
+    def get_readonly_fields(self, request, obj=None):
+        return PLACED_LINE_FIELDS if obj and obj.pk else self.readonly_fields
+
+    def has_add_permission(self, request, obj=None):
+        return not (obj and obj.pk) and super().has_add_permission(request, obj)
+
+    def get_queryset(self, request):
+        # __str__ рядка показує назву товару
+        return super().get_queryset(request).select_related('product')
 
 
 @admin.register(Order)
-class OrderAdmin(admin.ModelAdmin):
+class OrderAdmin(LargeTableAdmin):
     list_display = ['order_number', 'user', 'status', 'total_amount', 'created_at']
     list_filter = ['status', 'created_at']
-    search_fields = ['order_number', 'user__username', 'shipping_city']
+    search_fields = ['order_number', 'user__username']
+    search_help_text = 'Початок номера замовлення або імені користувача'
     readonly_fields = ['order_number', 'created_at', 'updated_at']
+    raw_id_fields = ['user']
     inlines = [OrderItemInline]
+    actions = ['export_csv', 'export_jsonl']
     
     fieldsets = (
         ('Основна інформація', {
@@ -109,20 +233,60 @@ class OrderAdmin(admin.ModelAdmin):
         }),
     )
 
+    def search_conditions(self, term):
+        # Номери замовлень генеруються у верхньому регістрі
+        return [prefix('order_number', term.upper()), Q(user__in=username_prefix(term))]
+
+    def export(self, queryset, fmt):
+        # Фільтри списку (статус, дата) уже застосовані до queryset; «вибрати всі» експортує їх усі
+        response = StreamingHttpResponse(render(order_chunks(queryset), fmt), content_type=CONTENT_TYPES[fmt])
+        response['Content-Disposition'] = f'attachment; filename="orders-{timezone.localtime():%Y%m%d-%H%M}.{fmt}"'
+        return response
+
+    @admin.action(description='Експортувати вибрані замовлення в CSV', permissions=['view'])
+    def export_csv(self, request, queryset):
+        return self.export(queryset, 'csv')
+
+    @admin.action(description='Експортувати вибрані замовлення в JSONL', permissions=['view'])
+    def export_jsonl(self, request, queryset):
+        return self.export(queryset, 'jsonl')
+
 
 @admin.register(OrderItem)
-class OrderItemAdmin(admin.ModelAdmin):
+class OrderItemAdmin(LargeTableAdmin):
     list_display = ['order', 'product', 'quantity', 'price', 'total_price']
     list_filter = ['order__created_at']
     search_fields = ['order__order_number', 'product__name']
+    search_help_text = 'Початок номера замовлення або слова з назви товару'
+    list_select_related = ['order', 'product']
+    raw_id_fields = ['order']
+    autocomplete_fields = ['product']
+
+    def get_readonly_fields(self, request, obj=None):
+        return ['order', *PLACED_LINE_FIELDS] if obj else self.readonly_fields
+
+    def has_add_permission(self, request):
+        # Рядки з'являються лише під час оформлення замовлення
+        return False
+
+    def search_conditions(self, term):
+        return [
+            Q(order__in=Order.objects.filter(prefix('order_number', term.upper())).values('pk')),
+            Q(product__in=product_name(term)),
+        ]
 
 
 @admin.register(Review)
-class ReviewAdmin(admin.ModelAdmin):
+class ReviewAdmin(LargeTableAdmin):
     list_display = ['product', 'user', 'rating', 'title', 'is_approved', 'created_at']
     list_filter = ['rating', 'is_approved', 'created_at']
-    search_fields = ['product__name', 'user__username', 'title']
+    search_fields = ['product__name', 'user__username']
+    search_help_text = 'Слова з назви товару або початок імені користувача'
+    list_select_related = ['product', 'user']
     readonly_fields = ['created_at']
+    raw_id_fields = ['user']
+    autocomplete_fields = ['product']
+    actions = ['approve_reviews', 'unapprove_reviews']
     
     fieldsets = (
         ('Основна інформація', {
@@ -137,6 +301,78 @@ class ReviewAdmin(admin.ModelAdmin):
         }),
     )
 
+    @admin.action(description='Схвалити вибрані відгуки')
+    def approve_reviews(self, request, queryset):
+        updated = set_approval(queryset, True)
+        self.message_user(request, f'Схвалено відгуків: {updated}')
+
+    @admin.action(description='Зняти схвалення з вибраних відгуків')
+    def unapprove_reviews(self, request, queryset):
+        updated = set_approval(queryset, False)
+        self.message_user(request, f'Знято схвалення з відгуків: {updated}')
+
+    def search_conditions(self, term):
+        return [Q(product__in=product_name(term)), Q(user__in=username_prefix(term))]
+
+
+@admin.register(DailySales)
+class DailySalesAdmin(admin.ModelAdmin):
+    """Звіт продажів лише зі щоденних зведень: запити залежать від кількості днів періоду, а не замовлень"""
+    periods = (7, 30, 90, 365)
+    default_period = 30
+    top_size = 10
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+    def top(self, model, field, since, until):
+        rows = list(
+            model.objects.filter(day__range=(since, until))
+            .values(field)
+            .annotate(total_units=Sum('units'), total_revenue=Sum('revenue'))
+            .order_by('-total_revenue')[:self.top_size]
+        )
+        # Назви — окремим запитом лише для найкращих, а не з'єднанням для кожного рядка зведень
+        names = dict(model._meta.get_field(field).related_model.objects.filter(
+            pk__in=[row[field] for row in rows]
+        ).values_list('pk', 'name'))
+        for row in rows:
+            row['name'] = names.get(row[field], '')
+        return rows
+
+    def changelist_view(self, request, extra_context=None):
+        period = request.GET.get('days', '')
+        period = int(period) if period.isdigit() and int(period) in self.periods else self.default_period
+        until = timezone.localdate()
+        since = until - timedelta(days=period - 1)
+        by_day = {row.day: row for row in DailySales.objects.filter(day__range=(since, until))}
+        # Дні без продажів показуються нулями
+        days = [by_day.get(since + timedelta(days=offset)) or DailySales(day=since + timedelta(days=offset))
+                for offset in range(period)]
+        best = max((day.revenue for day in days), default=0) or 1
+        context = {
+            **self.admin_site.each_context(request),
+            'title': 'Продажі',
+            'opts': self.model._meta,
+            'periods': self.periods,
+            'period': period,
+            'days': [(day, round(day.revenue * 100 / best)) for day in reversed(days)],
+            'total_orders': sum(day.orders for day in days),
+            'total_units': sum(day.units for day in days),
+            'total_revenue': sum(day.revenue for day in days),
+            'top_products': self.top(DailyProductSales, 'product', since, until),
+            'top_categories': self.top(DailyCategorySales, 'category', since, until),
+            'state': SalesRollupState.objects.first(),
+            **(extra_context or {}),
+        }
+        return TemplateResponse(request, 'admin/shop/dailysales/dashboard.html', context)
+
 
 # Налаштування адміністративної панелі
 admin.site.site_header = "Terko Shop - Адміністративна панель"
@@ -0,0 +1,255 @@
+import threading
+import time
+from bisect import bisect_left, insort
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+
+from .search import TOKEN, normalize
+
+VERSION_KEY = 'shop:autocomplete:version'
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+class PrefixIndex:
+    """Компактний префіксний індекс назв: відсортовані масиви ключів + bisect.
+
+    Для кожної назви зберігаються ключі з початку кожного слова, тому
+    «wat» знаходить «Smart Watch». Записи — кортежі (тип, id) з вагою;
+    для кожної ваги окремий масив, тож пошук іде від найважчих записів і
+    зупиняється, щойно набере limit, — без обмеження кількості переглянутих збігів.
+
+    Пам'ять обмежує кількість ключів, а не записів: довга назва з багатьма
+    словами дає стільки ж ключів, скільки в ній слів.
+    """
+
+    def __init__(self, max_keys):
+        self.max_keys = max_keys
+        self.key_count = 0
+        self.tiers = {}  # вага -> відсортовані трійки (ключ, тип, id)
+        self.entries = {}  # (тип, id) -> (назва, slug, вага)
+
+    def __len__(self):
+        return len(self.entries)
+
+    @staticmethod
+    def _keys_for(name):
+        text = normalize(name)
+        return {text[match.start():] for match in TOKEN.finditer(text)}
+
+    def add(self, kind, pk, name, slug, weight=0):
+        """Додає або оновлює запис; понад бюджет пам'яті нові записи пропускаються"""
+        ref = (kind, pk)
+        if ref in self.entries:
+            self.remove(kind, pk)
+        new_keys = self._keys_for(name)
+        if self.key_count + len(new_keys) > self.max_keys:
+            return
+        self.entries[ref] = (name, slug, weight)
+        self.key_count += len(new_keys)
+        keys = self.tiers.setdefault(weight, [])
+        for key in new_keys:
+            insort(keys, (key, kind, pk))
+
+    def load(self, records):
+        """Масове заповнення з (тип, id, назва, slug, вага): ключі сортуються один раз"""
+        for kind, pk, name, slug, weight in records:
+            if (kind, pk) in self.entries:
+                continue
+            keys = self._keys_for(name)
+            if self.key_count + len(keys) > self.max_keys:
+                break
+            self.entries[(kind, pk)] = (name, slug, weight)
+            self.key_count += len(keys)
+            self.tiers.setdefault(weight, []).extend((key, kind, pk) for key in keys)
+        for keys in self.tiers.values():
+            keys.sort()
+
+    def remove(self, kind, pk):
+        entry = self.entries.pop((kind, pk), None)
+        if entry is None:
+            return
+        keys = self.tiers.get(entry[2], [])
+        for key in self._keys_for(entry[0]):
+            position = bisect_left(keys, (key, kind, pk))
+            if position < len(keys) and keys[position] == (key, kind, pk):
+                del keys[position]
+                self.key_count -= 1
+
+    def search(self, prefix, limit):
+        """До limit записів за префіксом: спершу більша вага, за рівної — ключі за абеткою"""
+        prefix = normalize(prefix).strip()
+        if not prefix:
+            return []
+        found = {}
+        for weight in sorted(self.tiers, reverse=True):
+            keys = self.tiers[weight]
+            position = bisect_left(keys, (prefix,))
+            while len(found) < limit and position < len(keys):
+                key, kind, pk = keys[position]
+                if not key.startswith(prefix):
+                    break
+                # Читання без блокування: запис могли щойно видалити в іншому потоці
+                entry = self.entries.get((kind, pk))
+                if entry is not None:
+                    found.setdefault((kind, pk), entry)
+                position += 1
+            if len(found) >= limit:
+                break
+        return [(kind, pk, name, slug) for (kind, pk), (name, slug, weight) in found.items()]
+
+
+def product_weight(is_featured, stock):
+    """Рекомендовані та наявні товари показуються вище"""
+    return 2 * is_featured + (stock > 0)
+
+
+# Категорії завжди вище товарів
+CATEGORY_WEIGHT = 10
+
+_index = None
+_local_version = None
+_checked_at = 0.0
+_builder = None  # потік, що будує індекс
+_lock = threading.Lock()
+
+# Відповідь, доки перший індекс процесу ще будується
+EMPTY = PrefixIndex(0)
+
+
+def build_index():
+    """Будує індекс з бази: категорії та активні товари в межах бюджету"""
+    from .models import Category, Product
+
+    index = PrefixIndex(_setting('SHOP_AUTOCOMPLETE_MAX_KEYS', 200000))
+    categories = Category.objects.values_list('pk', 'name', 'slug')
+    products = Product.objects.filter(is_active=True).order_by('-is_featured', '-created_at').values_list(
+        'pk', 'name', 'slug', 'is_featured', 'stock'
+    )
+    index.load([('category', pk, name, slug, CATEGORY_WEIGHT) for pk, name, slug in categories])
+    index.load(
+        ('product', pk, name, slug, product_weight(is_featured, stock))
+        # load() зупиняється на вичерпаному бюджеті, тож решта товарів з бази не читається
+        for pk, name, slug, is_featured, stock in products.iterator(chunk_size=5000)
+    )
+    return index
+
+
+def _shared_version():
+    return cache.get_or_set(VERSION_KEY, 1)
+
+
+def _install(index, version):
+    global _index, _local_version
+    with _lock:
+        # Зміни під час побудови підняли версію — наступна перевірка перебудує індекс ще раз
+        _index, _local_version = index, version
+
+
+def _rebuild(version):
+    try:
+        _install(build_index(), version)
+    finally:
+        connection.close()
+
+
+def _start_build(version):
+    """Запускає фонову побудову, якщо її ще немає; викликається під _lock"""
+    global _builder
+    # Після fork потоки батьківського процесу не існують — is_alive() це враховує
+    if _builder is None or not _builder.is_alive():
+        _builder = threading.Thread(target=_rebuild, args=(version,), name='autocomplete-rebuild', daemon=True)
+        _builder.start()
+
+
+def warm_up(background=True):
+    """Будує перший індекс процесу: у фоновому потоці під час старту воркера (terko_shop/wsgi.py) чи одразу"""
+    version = _shared_version()
+    if not background:
+        _install(build_index(), version)
+        return
+    with _lock:
+        if _index is None:
+            _start_build(version)
+
+
+def get_index():
+    """Повертає індекс процесу; якщо інший воркер змінив каталог, новий будується у фоновому потоці.
+
+    Доки нового індексу немає, запити обслуговує попередній, а доки не
+    побудовано перший — порожній (підказок немає, але запит не чекає на базу).
+    """
+    global _checked_at
+    now = time.monotonic()
+    if _index is not None and now - _checked_at < _setting('SHOP_AUTOCOMPLETE_CHECK_INTERVAL', 5):
+        return _index
+    with _lock:
+        version = _shared_version()
+        if _index is None or version != _local_version:
+            _start_build(version)
+        _checked_at = now
+    return EMPTY if _index is None else _index
+
+
+def _bump_version():
+    global _local_version
+    try:
+        version = cache.incr(VERSION_KEY)
+    except ValueError:
+        cache.set(VERSION_KEY, 2)
+        version = 2
+    # Цей процес уже оновив свій індекс інкрементально — перебудова не потрібна
+    if _local_version is not None and version == _local_version + 1:
+        _local_version = version
+
+
+def update_product(product):
+    """Інкрементально оновлює товар в індексі процесу та сповіщає інші воркери"""
+    with _lock:
+        if _index is not None:
+            if product.is_active:
+                _index.add('product', product.pk, product.name, product.slug,
+                           product_weight(product.is_featured, product.stock))
+            else:
+                _index.remove('product', product.pk)
+        _bump_version()
+
+
+def remove_product(product_id):
+    with _lock:
+        if _index is not None:
+            _index.remove('product', product_id)
+        _bump_version()
+
+
+def update_category(category):
+    with _lock:
+        if _index is not None:
+            _index.add('category', category.pk, category.name, category.slug, CATEGORY_WEIGHT)
+        _bump_version()
+
+
+def invalidate():
+    """Після масових змін каталогу в обхід сигналів індекс буде перебудовано з бази (у фоні)"""
+    global _local_version, _checked_at
+    with _lock:
+        _local_version = None
+        _checked_at = 0.0
+        _bump_version()
+
+
+def remove_category(category_id):
+    with _lock:
+        if _index is not None:
+            _index.remove('category', category_id)
+        _bump_version()
+
+
+def suggest(prefix, limit=None):
+    """Підказки для рядка пошуку: [(тип, id, назва, slug), ...]"""
+    limit = limit or _setting('SHOP_AUTOCOMPLETE_LIMIT', 8)
+    return get_index().search(prefix, limit)
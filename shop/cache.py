@@ -0,0 +1,194 @@
+"""Кеш каталогу: сторінки та фрагменти, що залежать від версії каталогу.
+
+Будь-яка зміна товару, категорії, зображення чи схваленого відгуку
+збільшує версію, і всі старі ключі перестають використовуватися (вони
+просто спливають за таймаутом). Залишки на складі змінюються під час
+оформлення замовлень без сигналів, тому в кешованих сторінках вони можуть
+відставати не більше ніж на SHOP_CATALOG_CACHE_TIMEOUT секунд; для фасету
+«В наявності» inventory окремо збільшує версію залишків.
+
+Категорії для навігації додатково тримаються в пам'яті процесу
+(SHOP_CATEGORIES_CACHE_TTL секунд), бо потрібні майже кожній сторінці.
+"""
+import hashlib
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.contrib.messages import get_messages
+from django.core.cache import cache
+from django.http import HttpResponse
+
+VERSION_KEY = 'shop:catalog:version'
+CHANGED_KEY = 'shop:catalog:changed_at'
+STOCK_KEY = 'shop:catalog:stock_version'
+CATEGORIES_KEY = 'shop:catalog:categories'
+STATS = ('page', 'fragment', 'facet')
+
+# Локальна копія категорій процесу: (список, момент спливання)
+_categories = (None, 0.0)
+
+
+def cache_enabled():
+    return getattr(settings, 'SHOP_CATALOG_CACHE', True)
+
+
+def cache_timeout():
+    return getattr(settings, 'SHOP_CATALOG_CACHE_TIMEOUT', 60)
+
+
+def _initial_version():
+    # Якщо ключ версії витіснено з кешу, нова версія не збігається зі старими
+    return time.time_ns() // 1000
+
+
+def _catalog_state(request):
+    """(версія каталогу, час останньої зміни в секундах або 0, версія залишків);
+    в межах запиту читається з кешу один раз"""
+    state = getattr(request, '_catalog_state', None)
+    if state is None:
+        values = cache.get_many([VERSION_KEY, CHANGED_KEY, STOCK_KEY])
+        version = values.get(VERSION_KEY)
+        if version is None:
+            cache.add(VERSION_KEY, _initial_version(), timeout=None)
+            version = cache.get(VERSION_KEY)
+        state = (version, values.get(CHANGED_KEY, 0), values.get(STOCK_KEY, 0))
+        if request is not None:
+            request._catalog_state = state
+    return state
+
+
+def catalog_version(request=None):
+    """Поточна версія каталогу"""
+    return _catalog_state(request)[0]
+
+
+def catalog_changed_at(request=None):
+    """Коли каталог змінився востаннє (Unix-час), 0 — невідомо"""
+    return _catalog_state(request)[1]
+
+
+def stock_version(request=None):
+    """Версія залишків і резервів (змінюється разом із Product.stock чи Product.reserved)"""
+    return _catalog_state(request)[2]
+
+
+def bump_stock_version():
+    """Залишки змінено UPDATE в обхід сигналів — маска «В наявності» фасетів оновиться"""
+    try:
+        cache.incr(STOCK_KEY)
+    except ValueError:
+        cache.set(STOCK_KEY, _initial_version(), timeout=None)
+
+
+def bump_catalog_version():
+    """Робить недійсними всі закешовані сторінки та фрагменти каталогу"""
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:
+        cache.set(VERSION_KEY, _initial_version(), timeout=None)
+    cache.set(CHANGED_KEY, int(time.time()), timeout=None)
+
+
+def record(kind, hit):
+    """Лічильники влучань і промахів кешу"""
+    key = f'shop:cache:stats:{kind}:{"hits" if hit else "misses"}'
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, 1, timeout=None)
+
+
+def stats():
+    """{тип: {'hits': ..., 'misses': ..., 'ratio': ...}} для сторінок, фрагментів і фасетів"""
+    keys = [f'shop:cache:stats:{kind}:{name}' for kind in STATS for name in ('hits', 'misses')]
+    values = cache.get_many(keys)
+    result = {}
+    for kind in STATS:
+        hits = values.get(f'shop:cache:stats:{kind}:hits', 0)
+        misses = values.get(f'shop:cache:stats:{kind}:misses', 0)
+        total = hits + misses
+        result[kind] = {'hits': hits, 'misses': misses, 'ratio': hits / total if total else 0.0}
+    return result
+
+
+def reset_stats():
+    cache.delete_many([f'shop:cache:stats:{kind}:{name}' for kind in STATS for name in ('hits', 'misses')])
+
+
+def fragment_key(request, name, *parts):
+    raw = ':'.join(str(part) for part in parts)
+    return f'shop:fragment:{catalog_version(request)}:{name}:{hashlib.md5(raw.encode()).hexdigest()}'
+
+
+def _page_key(request):
+    url = request.build_absolute_uri().encode()
+    return f'shop:page:{catalog_version(request)}:{hashlib.md5(url).hexdigest()}'
+
+
+def _cacheable(request):
+    from .guest_cart import cookie_name
+
+    # Сторінки авторизованих користувачів і гостей з кошиком містять персональні дані
+    # (меню, лічильник кошика), а повідомлення показуються лише один раз — такі запити кеш оминають
+    return (
+        cache_enabled()
+        and request.method in ('GET', 'HEAD')
+        and not request.user.is_authenticated
+        and cookie_name() not in request.COOKIES
+        and not get_messages(request)
+    )
+
+
+def cache_catalog_page(view):
+    """Кешує повну сторінку каталогу для анонімних відвідувачів"""
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if not _cacheable(request):
+            return view(request, *args, **kwargs)
+
+        key = _page_key(request)
+        cached = cache.get(key)
+        if cached is not None:
+            record('page', hit=True)
+            content, content_type = cached
+            return HttpResponse(content, content_type=content_type)
+
+        record('page', hit=False)
+        response = view(request, *args, **kwargs)
+        # Сторінку з CSRF-токеном чи cookie не можна віддавати іншим відвідувачам
+        if (
+            response.status_code == 200
+            and not response.streaming
+            and not response.cookies
+            and not request.META.get('CSRF_COOKIE_NEEDS_UPDATE')
+        ):
+            cache.set(key, (response.content, response['Content-Type']), cache_timeout())
+        return response
+
+    return wrapper
+
+
+def catalog_categories():
+    """Усі категорії для навігації: спершу з пам'яті процесу, потім зі спільного кешу, і лише тоді з бази"""
+    global _categories
+    categories, expires_at = _categories
+    now = time.monotonic()
+    if categories is not None and now < expires_at:
+        return categories
+    ttl = getattr(settings, 'SHOP_CATEGORIES_CACHE_TTL', 60)
+    categories = cache.get(CATEGORIES_KEY)
+    if categories is None:
+        from .models import Category
+
+        categories = list(Category.objects.all())
+        cache.set(CATEGORIES_KEY, categories, ttl)
+    _categories = (categories, now + ttl)
+    return categories
+
+
+def invalidate_categories():
+    """Скидає категорії в цьому процесі та у спільному кеші; інші процеси оновляться після TTL"""
+    global _categories
+    _categories = (None, 0.0)
+    cache.delete(CATEGORIES_KEY)
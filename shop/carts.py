@@ -0,0 +1,91 @@
+"""Зміни кошика користувача без гонок.
+
+Додавання товару — один оператор INSERT ... ON CONFLICT DO UPDATE, який
+збільшує кількість у самій базі, тож подвійні кліки та паралельні вкладки
+не гублять приростів і не натрапляють на unique_together (cart, product).
+Встановлення кількості та видалення — один UPDATE чи DELETE за id рядка,
+а пакет змін (set_quantities) — один DELETE і один upsert на весь кошик.
+"""
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .inventory import reservations_enabled, reserve_many
+from .models import Cart, CartItem, Product
+
+
+def cart_for(user):
+    """Кошик користувача; паралельні запити не створять другого і не впадуть на унікальності"""
+    cart = Cart.objects.filter(user=user).first()
+    if cart is None:
+        Cart.objects.bulk_create([Cart(user=user)], ignore_conflicts=True)
+        cart = Cart.objects.get(user=user)
+    # user.cart у шаблонах отримає цей самий об'єкт разом із закешованими підсумками
+    Cart._meta.get_field('user').remote_field.set_cached_value(user, cart)
+    return cart
+
+
+def _upsert_sql(rows):
+    quote = connection.ops.quote_name
+    table = quote(CartItem._meta.db_table)
+    cart, product, quantity, added_at = (
+        quote(CartItem._meta.get_field(name).column) for name in ('cart', 'product', 'quantity', 'added_at')
+    )
+    values = ', '.join(['(%s, %s, %s, %s)'] * rows)
+    return (
+        f'INSERT INTO {table} ({cart}, {product}, {quantity}, {added_at}) VALUES {values} '
+        f'ON CONFLICT ({cart}, {product}) DO UPDATE SET {quantity} = {table}.{quantity} + excluded.{quantity} '
+        f'RETURNING {product}, {quantity}'
+    )
+
+
+def add_items(cart, lines):
+    """Додає {product_id: кількість} до кошика одним upsert, повертає {product_id: нова кількість}"""
+    lines = sorted((product_id, quantity) for product_id, quantity in lines.items() if quantity > 0)
+    if not lines:
+        return {}
+    added_at = CartItem._meta.get_field('added_at').get_db_prep_value(timezone.now(), connection)
+    params = []
+    for product_id, quantity in lines:
+        params += [cart.pk, product_id, quantity, added_at]
+    with connection.cursor() as cursor:
+        cursor.execute(_upsert_sql(len(lines)), params)
+        result = dict(cursor.fetchall())
+    cart.refresh_summary()
+    return result
+
+
+def set_quantity(cart_item, quantity):
+    """Встановлює кількість рядка (0 і менше — видаляє), повертає False, якщо рядка вже немає"""
+    rows = CartItem.objects.filter(pk=cart_item.pk)
+    if quantity <= 0:
+        changed = rows.delete()[0]
+    else:
+        changed = rows.update(quantity=quantity)
+        cart_item.quantity = quantity
+    cart_item.cart.refresh_summary()
+    return bool(changed)
+
+
+def set_quantities(cart, quantities):
+    """Встановлює кількості {product_id: кількість} однією транзакцією (0 — видалити рядок).
+
+    Неактивні товари до кошика не додаються. Якщо з резервами складу
+    товару не вистачає, піднімається OutOfStockError і нічого не змінюється.
+    """
+    with transaction.atomic():
+        remove = [product_id for product_id, quantity in quantities.items() if quantity <= 0]
+        keep = {product_id: quantity for product_id, quantity in quantities.items() if quantity > 0}
+        if keep:
+            active = set(Product.objects.filter(pk__in=keep, is_active=True).values_list('pk', flat=True))
+            keep = {product_id: quantity for product_id, quantity in keep.items() if product_id in active}
+        if remove:
+            CartItem.objects.filter(cart=cart, product_id__in=remove).delete()
+        if keep:
+            CartItem.objects.bulk_create(
+                [CartItem(cart=cart, product_id=product_id, quantity=quantity)
+                 for product_id, quantity in sorted(keep.items())],
+                update_conflicts=True, unique_fields=['cart', 'product'], update_fields=['quantity'],
+            )
+        if reservations_enabled():
+            reserve_many(cart, {**dict.fromkeys(remove, 0), **keep})
+    cart.refresh_summary()
@@ -0,0 +1,309 @@
+"""Масовий імпорт і експорт каталогу у CSV та JSON Lines.
+
+Файл читається потоково й обробляється пакетами: рядки з усіма
+обов'язковими полями (name, category, price) записуються одним
+INSERT ... ON CONFLICT (slug) DO UPDATE, а часткові рядки (наприклад,
+лише slug і stock) оновлюють наявні товари через bulk_update. Змінюються
+тільки колонки, присутні в рядку. Категорії шукаються за slug або назвою
+у словнику в пам'яті. Товарам без slug він генерується з назви
+(транслітерація) без збігів з базою та між собою. Помилки рядків
+збираються, а не переривають імпорт.
+
+Масові операції не викликають сигналів, тому пошуковий індекс оновлюється
+після кожного пакета (або перебудовується після імпорту), а кеш каталогу
+й підказки скидаються в кінці. Варіанти зображень створює
+generate_image_variants.
+"""
+import csv
+import json
+from collections import Counter
+from decimal import Decimal
+from functools import reduce
+from operator import or_
+
+from django.core.exceptions import ValidationError
+from django.db import DatabaseError, transaction
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.text import slugify
+
+from . import autocomplete, search
+from .cache import bump_catalog_version
+from .models import Category, Product
+
+FIELDS = ('slug', 'name', 'category', 'description', 'price', 'discount_price', 'stock',
+          'is_active', 'is_featured', 'image')
+REQUIRED = ('name', 'category', 'price')
+FORMATS = ('csv', 'jsonl')
+
+TRUE = {'1', 'true', 'yes', 'так', '+'}
+FALSE = {'0', 'false', 'no', 'ні', '-'}
+
+# Спрощена транслітерація (українська та російська абетки) для slug
+TRANSLIT = str.maketrans({
+    'а': 'a', 'б': 'b', 'в': 'v', 'г': 'h', 'ґ': 'g', 'д': 'd', 'е': 'e', 'є': 'ie', 'ж': 'zh', 'з': 'z',
+    'и': 'y', 'і': 'i', 'ї': 'i', 'й': 'i', 'к': 'k', 'л': 'l', 'м': 'm', 'н': 'n', 'о': 'o', 'п': 'p',
+    'р': 'r', 'с': 's', 'т': 't', 'у': 'u', 'ф': 'f', 'х': 'kh', 'ц': 'ts', 'ч': 'ch', 'ш': 'sh',
+    'щ': 'shch', 'ь': '', 'ю': 'iu', 'я': 'ia', 'ё': 'io', 'ы': 'y', 'э': 'e', 'ъ': '',
+    "'": '', '’': '', 'ʼ': '',
+})
+
+
+def make_slug(text, max_length):
+    """ASCII-slug з назви; залишає місце під суфікс -N"""
+    return slugify((text or '').casefold().translate(TRANSLIT))[:max_length - 8].strip('-') or 'item'
+
+
+def guess_format(path, default='csv'):
+    for fmt in FORMATS:
+        if str(path).endswith(f'.{fmt}'):
+            return fmt
+    return default
+
+
+class RowError(Exception):
+    """Рядок файлу не можна імпортувати"""
+
+
+def read_rows(stream, fmt):
+    """Потоково повертає (номер рядка, словник полів) з CSV чи JSONL"""
+    if fmt == 'csv':
+        reader = csv.DictReader(stream)
+        for row in reader:
+            yield reader.line_num, row
+        return
+    for number, line in enumerate(stream, start=1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError as error:
+            yield number, RowError(f'некоректний JSON: {error}')
+            continue
+        yield number, row if isinstance(row, dict) else RowError('очікується об\'єкт JSON')
+
+
+def _clean(name, value):
+    field = Product._meta.get_field(name)
+    try:
+        return field.clean(value, None)
+    except ValidationError as error:
+        raise RowError(f'{name}: {" ".join(error.messages)}')
+
+
+def parse_row(row, categories):
+    """Перевіряє рядок і повертає {поле моделі: значення} лише для присутніх колонок"""
+    if isinstance(row, RowError):
+        raise row
+    values = {}
+    for name in FIELDS:
+        if name not in row:
+            continue
+        raw = row[name]
+        raw = '' if raw is None else str(raw).strip()
+        if name in REQUIRED and not raw:
+            raise RowError(f'{name}: обов\'язкове поле')
+        if name == 'category':
+            category_id = categories.resolve(raw)
+            if category_id is None:
+                raise RowError(f'category: категорію «{raw}» не знайдено')
+            values['category_id'] = category_id
+        elif name == 'slug':
+            if raw:
+                values[name] = _clean(name, raw)
+        elif not raw:
+            # Порожня необов'язкова колонка — значення за замовчуванням (наприклад, порожній опис з експорту)
+            values[name] = Product._meta.get_field(name).get_default()
+        elif name in ('is_active', 'is_featured'):
+            if raw.casefold() not in TRUE | FALSE:
+                raise RowError(f'{name}: очікується 1/0, true/false або так/ні')
+            values[name] = raw.casefold() in TRUE
+        else:
+            values[name] = _clean(name, raw)
+    for name in ('price', 'discount_price'):
+        if values.get(name) is not None and values[name] < 0:
+            raise RowError(f'{name}: ціна не може бути від\'ємною')
+    if 'slug' not in values and 'name' not in values:
+        raise RowError('потрібен slug або name')
+    return values
+
+
+class CategoryMap:
+    """Категорії за slug і назвою; відсутні створюються лише з create=True"""
+
+    def __init__(self, create=False):
+        self.create = create
+        self.by_key = {}
+        for pk, slug, name in Category.objects.values_list('pk', 'slug', 'name'):
+            self.by_key[slug] = pk
+            self.by_key.setdefault(name.casefold(), pk)
+
+    def resolve(self, value):
+        pk = self.by_key.get(value) or self.by_key.get(value.casefold())
+        if pk is None and self.create:
+            max_length = Category._meta.get_field('slug').max_length
+            base = slug = make_slug(value, max_length)
+            number = 2
+            while Category.objects.filter(slug=slug).exists():
+                slug, number = f'{base}-{number}', number + 1
+            pk = Category.objects.create(name=value[:Category._meta.get_field('name').max_length], slug=slug).pk
+            self.by_key[slug] = self.by_key[value.casefold()] = pk
+        return pk
+
+
+def assign_slugs(values_list):
+    """Генерує slug для рядків без нього: без збігів з базою, явними slug пакета та між собою"""
+    pending = [values for values in values_list if 'slug' not in values]
+    if not pending:
+        return
+    max_length = Product._meta.get_field('slug').max_length
+    bases = [make_slug(values['name'], max_length) for values in pending]
+    taken = {values['slug'] for values in values_list if 'slug' in values}
+    taken |= set(Product.objects.filter(slug__in=set(bases)).values_list('slug', flat=True))
+    # Для зайнятих основ одним запитом підтягуємо всі вже наявні варіанти з суфіксами
+    counts = Counter(bases)
+    busy = {base for base in bases if base in taken or counts[base] > 1}
+    if busy:
+        taken |= set(Product.objects.filter(
+            reduce(or_, (Q(slug__startswith=f'{base}-') for base in busy))
+        ).values_list('slug', flat=True))
+    for values, base in zip(pending, bases):
+        slug, number = base, 2
+        while slug in taken:
+            slug, number = f'{base}-{number}', number + 1
+        taken.add(slug)
+        values['slug'] = slug
+
+
+class Importer:
+    """Імпорт пакетами по chunk_size; помилки рядків передаються в on_error(номер рядка, повідомлення).
+
+    З index=False пошуковий індекс не оновлюється — для великих файлів
+    швидше перебудувати його повністю після імпорту.
+    """
+
+    def __init__(self, create_categories=False, chunk_size=2000, on_error=None, index=True):
+        self.categories = CategoryMap(create=create_categories)
+        self.chunk_size = chunk_size
+        self.on_error = on_error
+        self.index = index
+        self.created = self.updated = self.errors = 0
+
+    def error(self, number, message):
+        self.errors += 1
+        if self.on_error:
+            self.on_error(number, message)
+
+    def run(self, rows, progress=None):
+        """rows — (номер рядка, сирий рядок); повертає self з лічильниками та помилками"""
+        chunk = []
+        slugs = set()
+        for number, row in rows:
+            try:
+                values = parse_row(row, self.categories)
+            except RowError as error:
+                self.error(number, str(error))
+                continue
+            # Повторний slug у пакеті йде в наступний, тож перемагає пізніший рядок файлу
+            if len(chunk) >= self.chunk_size or ('slug' in values and values['slug'] in slugs):
+                self.flush(chunk)
+                chunk, slugs = [], set()
+                if progress:
+                    progress(self)
+            chunk.append((number, values))
+            if 'slug' in values:
+                slugs.add(values['slug'])
+        self.flush(chunk)
+        if progress:
+            progress(self)
+        if self.created or self.updated:
+            bump_catalog_version()
+            autocomplete.invalidate()
+        return self
+
+    def flush(self, chunk):
+        if not chunk:
+            return
+        now = timezone.now()
+        with transaction.atomic():
+            assign_slugs([values for _, values in chunk])
+            existing = {slug: (pk, image) for slug, pk, image in Product.objects.filter(
+                slug__in=[values['slug'] for _, values in chunk]
+            ).values_list('slug', 'pk', 'image')}
+
+            # Групи з однаковим набором колонок: змінюються лише поля, присутні у файлі
+            upserts, updates, failed = {}, {}, set()
+            for number, values in chunk:
+                current = existing.get(values['slug'])
+                if 'image' in values and (current is None or current[1] != values['image']):
+                    # Варіанти старого зображення більше не дійсні (див. generate_image_variants)
+                    values['image_variants'] = {}
+                fields = tuple(sorted(name for name in values if name != 'slug')) + ('updated_at',)
+                if all(name in values for name in ('name', 'category_id', 'price')):
+                    upserts.setdefault(fields, []).append((number, Product(**values)))
+                elif current is not None:
+                    product = Product(pk=current[0], updated_at=now, **values)
+                    updates.setdefault(fields, []).append((number, product))
+                else:
+                    failed.add(number)
+                    required = ', '.join(REQUIRED)
+                    self.error(number, f'товару «{values["slug"]}» немає, а для нового потрібні {required}')
+
+            for fields, rows in upserts.items():
+                failed |= self.write(rows, lambda products, fields=fields: Product.objects.bulk_create(
+                    products, update_conflicts=True, unique_fields=['slug'], update_fields=fields,
+                ))
+            for fields, rows in updates.items():
+                failed |= self.write(rows, lambda products, fields=fields: Product.objects.bulk_update(
+                    products, fields,
+                ))
+
+            slugs = [values['slug'] for number, values in chunk if number not in failed]
+            self.created += sum(slug not in existing for slug in slugs)
+            self.updated += sum(slug in existing for slug in slugs)
+            if self.index:
+                search.index_products(Product.objects.filter(slug__in=slugs).values_list('pk', flat=True))
+
+    def write(self, rows, operation):
+        """Записує пакет; якщо база його відхилила, пробує рядки поодинці. Повертає номери невдалих"""
+        try:
+            with transaction.atomic():
+                operation([product for _, product in rows])
+            return set()
+        except DatabaseError:
+            failed = set()
+            for number, product in rows:
+                try:
+                    with transaction.atomic():
+                        operation([product])
+                except DatabaseError as error:
+                    failed.add(number)
+                    self.error(number, f'база даних: {error}')
+            return failed
+
+
+def export_rows(queryset, chunk_size=2000):
+    """Потоково повертає словники полів FIELDS; пам'ять не залежить від розміру каталогу"""
+    columns = [name if name != 'category' else 'category__slug' for name in FIELDS]
+    for values in queryset.order_by('pk').values_list(*columns).iterator(chunk_size=chunk_size):
+        row = dict(zip(FIELDS, values))
+        for name in ('price', 'discount_price'):
+            if isinstance(row[name], Decimal):
+                row[name] = str(row[name])
+        yield row
+
+
+def write_rows(stream, rows, fmt):
+    """Пише рядки у stream, повертає їх кількість"""
+    total = 0
+    if fmt == 'csv':
+        writer = csv.DictWriter(stream, fieldnames=FIELDS)
+        writer.writeheader()
+        for row in rows:
+            writer.writerow({name: int(value) if isinstance(value, bool) else value for name, value in row.items()})
+            total += 1
+        return total
+    for row in rows:
+        stream.write(json.dumps(row, ensure_ascii=False) + '\n')
+        total += 1
+    return total
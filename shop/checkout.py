@@ -0,0 +1,72 @@
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import transaction
+
+from .inventory import allocate, reservations_enabled, unreserve
+from .models import CartItem, Order, OrderItem, StockReservation
+
+
+class EmptyCartError(Exception):
+    """Кошик порожній — оформлювати нічого"""
+
+
+def place_order(cart, **order_fields):
+    """Оформлює замовлення з кошика однією транзакцією.
+
+    Кошик читається один раз разом з товарами, рядки замовлення
+    записуються одним bulk_create, а кошик очищується в тій самій
+    транзакції — кількість запитів не залежить від кількості позицій.
+
+    Товари списуються зі складу в тій самій транзакції; якщо залишку не
+    вистачає, піднімається inventory.OutOfStockError і нічого не
+    змінюється. З SHOP_CHECKOUT_PARTIAL_FILL замовлення оформлюється на
+    доступну кількість. Резерви кошика (SHOP_STOCK_RESERVATIONS)
+    перетворюються на продаж і видаляються.
+    """
+    allow_partial = getattr(settings, 'SHOP_CHECKOUT_PARTIAL_FILL', False)
+    with transaction.atomic():
+        cart_items = list(CartItem.objects.filter(cart=cart).select_related('product'))
+        if not cart_items:
+            raise EmptyCartError
+
+        reservations = {}
+        if reservations_enabled():
+            reservations = dict(
+                StockReservation.objects.filter(cart=cart).values_list('product_id', 'quantity')
+            )
+        allocated = allocate(
+            ((cart_item.product_id, cart_item.quantity) for cart_item in cart_items),
+            allow_partial=allow_partial,
+            reservations=reservations,
+        )
+
+        order_items = []
+        total_amount = Decimal('0')
+        for cart_item in cart_items:
+            quantity = allocated[cart_item.product_id]
+            if not quantity:
+                continue
+            price = cart_item.product.final_price
+            # bulk_create не викликає save(), тому total_price рахуємо тут
+            total_price = price * quantity
+            order_items.append(OrderItem(
+                product=cart_item.product,
+                quantity=quantity,
+                price=price,
+                total_price=total_price,
+            ))
+            total_amount += total_price
+
+        order = Order.objects.create(user_id=cart.user_id, total_amount=total_amount, **order_fields)
+        for order_item in order_items:
+            order_item.order = order
+        OrderItem.objects.bulk_create(order_items)
+
+        CartItem.objects.filter(cart=cart).delete()
+        if reservations:
+            # Резерви на товари, яких уже немає в кошику, просто знімаємо
+            unreserve((product_id, quantity) for product_id, quantity in reservations.items()
+                      if product_id not in allocated)
+            StockReservation.objects.filter(cart=cart).delete()
+    return order
@@ -0,0 +1,112 @@
+"""Умовні GET-запити (ETag / Last-Modified) і Cache-Control для сторінок каталогу.
+
+Валідатор сторінки складається з версії каталогу (її збільшує будь-яка
+зміна товару, категорії, зображення чи відгуку), updated_at об'єктів сторінки
+та вікна часу довжиною SHOP_CATALOG_CACHE_TIMEOUT: залишки й рекомендації
+змінюються без сигналів, тож, як і в кеші сторінок, можуть відставати не
+більше ніж на це вікно. Перевірка коштує читання версії з кешу й щонайбільше
+одного запиту за індексом — незмінна сторінка повертає 304 без виклику view
+і рендерингу шаблону.
+
+Last-Modified — найпізніший з часу зміни каталогу, updated_at об'єктів і
+початку вікна.
+
+Умовні відповіді отримують лише анонімні відвідувачі без повідомлень.
+Сторінки каталогу не містять CSRF-токена і не видають його cookie: main.js
+бере токен з cookie або з /csrf/ перед першим POST. Тож відвідувач без
+cookie отримує відповідь без Set-Cookie, яку спільний кеш (reverse proxy)
+може зберігати (public, s-maxage). Cookie гостьового кошика входить у ETag
+(лічильник у шапці), а така сторінка — private. Усі сторінки мають
+Vary: Cookie, бо вміст залежить від сесії та входу.
+"""
+import hashlib
+import time
+from datetime import datetime
+from functools import wraps
+
+from django.conf import settings
+from django.contrib.messages import get_messages
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import http_date
+
+from .cache import cache_timeout, catalog_changed_at, catalog_version
+from .guest_cart import cookie_name
+
+
+def conditional_enabled():
+    return getattr(settings, 'SHOP_CONDITIONAL_GET', True)
+
+
+def _window():
+    """Початок поточного вікна часу (однаковий для всіх процесів)"""
+    length = max(cache_timeout(), 1)
+    return int(time.time()) // length * length
+
+
+def _conditional(request):
+    return (
+        conditional_enabled()
+        and request.method in ('GET', 'HEAD')
+        and not request.user.is_authenticated
+        and not get_messages(request)
+    )
+
+
+def page_validators(request, timestamps=()):
+    """(ETag, Last-Modified) сторінки; timestamps — updated_at та інші значення, від яких залежить сторінка"""
+    window = _window()
+    parts = [catalog_version(request), window, *timestamps, request.COOKIES.get(cookie_name(), '')]
+    etag = 'W/"%s"' % hashlib.md5(':'.join(str(part) for part in parts).encode()).hexdigest()
+    last_modified = max([
+        window, catalog_changed_at(request),
+        *(int(value.timestamp()) for value in timestamps if isinstance(value, datetime)),
+    ])
+    return etag, last_modified
+
+
+def _shared(request, response):
+    # Cookie з відповіді чи запиту (кошик) робить сторінку персональною
+    return (
+        response.status_code in (200, 304)
+        and not response.cookies
+        and not request.META.get('CSRF_COOKIE_NEEDS_UPDATE')
+        and cookie_name() not in request.COOKIES
+    )
+
+
+def set_cache_headers(request, response, conditional):
+    patch_vary_headers(response, ('Cookie',))
+    if conditional and _shared(request, response):
+        # Браузер щоразу перевіряє сторінку (дешевий 304), а проксі віддає її сам упродовж s-maxage
+        patch_cache_control(response, public=True, max_age=0, s_maxage=cache_timeout())
+    else:
+        patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+
+def conditional_catalog_page(timestamps=None):
+    """ETag / Last-Modified і Cache-Control для сторінки каталогу.
+
+    timestamps(request, *args, **kwargs) повертає значення, від яких залежить
+    сторінка, або None, якщо об'єкта немає (тоді view відповість сам, наприклад 404).
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if not _conditional(request):
+                return set_cache_headers(request, view(request, *args, **kwargs), conditional=False)
+            values = timestamps(request, *args, **kwargs) if timestamps else ()
+            if values is None:
+                return set_cache_headers(request, view(request, *args, **kwargs), conditional=False)
+            etag, last_modified = page_validators(request, values)
+            response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+            if response is None:
+                response = view(request, *args, **kwargs)
+            if response.status_code in (200, 304):
+                response.headers.setdefault('ETag', etag)
+                response.headers.setdefault('Last-Modified', http_date(last_modified))
+            return set_cache_headers(request, response, conditional=True)
+
+        return wrapper
+
+    return decorator
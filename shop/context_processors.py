@@ -1,8 +1,19 @@
-from .models import Category
+from django.utils.functional import SimpleLazyObject
+
+from .cache import catalog_categories
+from .guest_cart import GuestCart
 
 
 def categories(request):
     """Контекстний процесор для додавання категорій до всіх шаблонів"""
     return {
-        'categories': Category.objects.all()[:6]  # Показуємо тільки перші 6 категорій в навігації
+        # Обчислюється лише тоді, коли шаблон справді звертається до categories
+        'categories': SimpleLazyObject(lambda: catalog_categories()[:6]),  # Показуємо тільки перші 6 категорій в навігації
     }
+
+
+def guest_cart(request):
+    """Кошик гостя для лічильника в навігації (читається з cookie, без запитів до бази)"""
+    if request.user.is_authenticated:
+        return {}
+    return {'guest_cart': SimpleLazyObject(lambda: GuestCart.from_request(request))}
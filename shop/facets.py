@@ -0,0 +1,307 @@
+"""Фасетні фільтри каталогу з кількістю товарів для кожного варіанту.
+
+Кожна група фасетів враховує всі активні фільтри, крім власного, тож
+покупець бачить, скільки товарів залишиться після вибору іншого варіанту.
+Для категорії (чи всього каталогу) лічильники беруться з бітового
+індексу в пам'яті процесу, який перебудовується після зміни каталогу;
+для результатів пошуку — з одного агрегатного запиту з умовними COUNT.
+"""
+import copy
+import threading
+import time
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+from decimal import Decimal, InvalidOperation
+from math import ceil, floor
+
+from django.conf import settings
+from django.db.models import Count, F, IntegerField, Q
+from django.db.models.functions import Cast, Round
+
+from .cache import cache_enabled, cache_timeout, catalog_version, record, stock_version
+
+# Мінімальна середня оцінка та мінімальна знижка (%) для фільтрів каталогу
+RATING_FILTERS = (4, 3, 2)
+DISCOUNT_FILTERS = (10, 25, 50)
+
+# Прапорці: параметр URL -> (назва, умова)
+FLAGS = {
+    'in_stock': ('В наявності', Q(stock__gt=F('reserved'))),
+    'on_sale': ('Зі знижкою', Q(discount_percent__gt=0)),
+    'featured': ('Рекомендовані', Q(is_featured=True)),
+}
+
+
+def price_buckets():
+    """Діапазони цін [(від, до включно), ...]; останній — без верхньої межі"""
+    bounds = [Decimal(0)] + [Decimal(bound) for bound in getattr(settings, 'SHOP_PRICE_FACETS', (500, 1000, 2500, 5000))]
+    # Ціни мають два знаки після коми, тож «до 499.99» рівнозначно «менше 500»
+    return list(zip(bounds, [bound - Decimal('0.01') for bound in bounds[1:]] + [None]))
+
+
+def _price_param(params, name):
+    try:
+        value = Decimal(params.get(name, ''))
+    except InvalidOperation:
+        return None
+    return value if value.is_finite() and value >= 0 else None
+
+
+def _choice_param(params, name, choices):
+    value = params.get(name)
+    return int(value) if value in {str(choice) for choice in choices} else None
+
+
+class CatalogFilters:
+    """Фільтри каталогу з параметрів запиту"""
+
+    def __init__(self, params):
+        self.min_price = _price_param(params, 'min_price')
+        self.max_price = _price_param(params, 'max_price')
+        self.min_discount = _choice_param(params, 'discount', DISCOUNT_FILTERS)
+        self.min_rating = _choice_param(params, 'rating', RATING_FILTERS)
+        self.flags = {name for name in FLAGS if params.get(name) == '1'}
+
+    def groups(self):
+        """{група: умова} для активних фільтрів"""
+        groups = {}
+        price = Q()
+        if self.min_price is not None:
+            price &= Q(effective_price__gte=self.min_price)
+        if self.max_price is not None:
+            price &= Q(effective_price__lte=self.max_price)
+        if price:
+            groups['price'] = price
+        if self.min_discount:
+            groups['discount'] = Q(discount_percent__gte=self.min_discount)
+        if self.min_rating:
+            groups['rating'] = Q(rating_avg__gte=self.min_rating)
+        for name in self.flags:
+            groups[name] = FLAGS[name][1]
+        return groups
+
+    def q(self, exclude=None):
+        """Умова для всіх активних фільтрів, крім групи exclude"""
+        condition = Q()
+        for group, group_q in self.groups().items():
+            if group != exclude:
+                condition &= group_q
+        return condition
+
+    def apply(self, queryset):
+        return queryset.filter(self.q())
+
+
+def _counts(queryset, filters):
+    """Усі лічильники одним запитом: {ключ: кількість}"""
+    aggregates = {'total': Count('pk', filter=filters.q())}
+    for name, (_, condition) in FLAGS.items():
+        aggregates[name] = Count('pk', filter=filters.q(exclude=name) & condition)
+    for percent in DISCOUNT_FILTERS:
+        aggregates[f'discount_{percent}'] = Count(
+            'pk', filter=filters.q(exclude='discount') & Q(discount_percent__gte=percent)
+        )
+    for stars in RATING_FILTERS:
+        aggregates[f'rating_{stars}'] = Count('pk', filter=filters.q(exclude='rating') & Q(rating_avg__gte=stars))
+    for i, (low, high) in enumerate(price_buckets()):
+        bucket = Q(effective_price__gte=low)
+        if high is not None:
+            bucket &= Q(effective_price__lte=high)
+        aggregates[f'price_{i}'] = Count('pk', filter=filters.q(exclude='price') & bucket)
+    return queryset.order_by().aggregate(**aggregates)
+
+
+class FacetIndex:
+    """Бітові маски активних товарів категорії для миттєвого підрахунку фасетів.
+
+    Товари впорядковані за ціною зі знижкою, тому будь-який діапазон цін —
+    це суцільний відрізок бітів. Маски — цілі числа Python; кількість
+    товарів для комбінації фільтрів — popcount від їх побітового AND.
+    """
+
+    def __init__(self, rows):
+        # rows: (id, ціна в копійках, знижка %, рейтинг, рекомендований, залишок, резерв), за зростанням ціни
+        pks, cents, discounts, ratings, featured, stock, reserved = zip(*rows) if rows else ((),) * 7
+        self.pks = array('q', pks)
+        self.cents = array('q', cents)
+        self.size = len(self.cents)
+        self.all = (1 << self.size) - 1
+        self.masks = {
+            'in_stock': self._mask(left > right for left, right in zip(stock, reserved)),
+            'on_sale': self._mask(discount > 0 for discount in discounts),
+            'featured': self._mask(featured),
+        }
+        for percent in DISCOUNT_FILTERS:
+            self.masks[f'discount_{percent}'] = self._mask(discount >= percent for discount in discounts)
+        for stars in RATING_FILTERS:
+            self.masks[f'rating_{stars}'] = self._mask(rating >= stars for rating in ratings)
+
+    @staticmethod
+    def _mask(values):
+        """Маска з послідовності булевих значень: i-й елемент — i-й біт"""
+        bits = ''.join(['1' if value else '0' for value in values])
+        return int(bits[::-1], 2) if bits else 0
+
+    @staticmethod
+    def _products(category_id):
+        from .models import Product
+
+        products = Product.objects.filter(is_active=True)
+        if category_id is not None:
+            products = products.filter(category_id=category_id)
+        # id — другий ключ сортування: порядок стабільний, і with_stock() знаходить ті самі біти
+        return products.order_by('effective_price', 'pk')
+
+    @classmethod
+    def build(cls, category_id=None):
+        # Ціна в копійках цілим числом: перетворення мільйонів Decimal у Python — найдорожча частина побудови
+        rows = cls._products(category_id).annotate(
+            cents=Cast(Round(F('effective_price') * 100), IntegerField())
+        ).values_list(
+            'pk', 'cents', 'discount_percent', 'rating_avg', 'is_featured', 'stock', 'reserved'
+        )
+        return cls(list(rows))
+
+    def with_stock(self, category_id=None):
+        """Копія індексу з маскою «В наявності» за поточними залишками; None — набір товарів змінився"""
+        rows = list(self._products(category_id).values_list('pk', 'stock', 'reserved'))
+        if array('q', [pk for pk, stock, reserved in rows]) != self.pks:
+            return None
+        index = copy.copy(self)
+        index.masks = {**self.masks, 'in_stock': self._mask(stock > reserved for pk, stock, reserved in rows)}
+        return index
+
+    def price_mask(self, low=None, high=None):
+        """Маска товарів з ціною від low до high включно"""
+        start = bisect_left(self.cents, ceil(low * 100)) if low is not None else 0
+        end = bisect_right(self.cents, floor(high * 100)) if high is not None else self.size
+        if end <= start:
+            return 0
+        return ((1 << end) - 1) ^ ((1 << start) - 1)
+
+    def counts(self, filters):
+        groups = {}
+        if filters.min_price is not None or filters.max_price is not None:
+            groups['price'] = self.price_mask(filters.min_price, filters.max_price)
+        if filters.min_discount:
+            groups['discount'] = self.masks[f'discount_{filters.min_discount}']
+        if filters.min_rating:
+            groups['rating'] = self.masks[f'rating_{filters.min_rating}']
+        for name in filters.flags:
+            groups[name] = self.masks[name]
+
+        def matching(exclude=None):
+            mask = self.all
+            for group, group_mask in groups.items():
+                if group != exclude:
+                    mask &= group_mask
+            return mask
+
+        counts = {'total': matching().bit_count()}
+        for name in FLAGS:
+            counts[name] = (matching(name) & self.masks[name]).bit_count()
+        for percent in DISCOUNT_FILTERS:
+            counts[f'discount_{percent}'] = (matching('discount') & self.masks[f'discount_{percent}']).bit_count()
+        for stars in RATING_FILTERS:
+            counts[f'rating_{stars}'] = (matching('rating') & self.masks[f'rating_{stars}']).bit_count()
+        for i, (low, high) in enumerate(price_buckets()):
+            counts[f'price_{i}'] = (matching('price') & self.price_mask(low, high)).bit_count()
+        return counts
+
+
+# Індекси фасетів процесу: id категорії (None — весь каталог) ->
+# (версія каталогу, версія залишків, час побудови, FacetIndex)
+_indexes = OrderedDict()
+# Категорії, індекс яких зараз перебудовується: id -> Event, що спрацює після побудови
+_building = {}
+_lock = threading.Lock()
+
+
+def _refresh(entry, category_id, version, stock):
+    """Новий індекс: після зміни лише залишків оновлюється маска «В наявності», інакше — повна побудова"""
+    now = time.monotonic()
+    if entry and entry[0] == version and now - entry[2] < cache_timeout():
+        index = entry[3].with_stock(category_id)
+        if index is not None:
+            return (version, stock, entry[2], index)
+    return (version, stock, now, FacetIndex.build(category_id))
+
+
+def get_index(request, category_id=None):
+    """Індекс фасетів категорії; перебудовується після зміни каталогу або через SHOP_CATALOG_CACHE_TIMEOUT.
+
+    Перебудовує лише один потік: решта тим часом отримують попередній
+    індекс, а якщо його ще немає — чекають на побудову.
+    """
+    version, stock = catalog_version(request), stock_version(request)
+    with _lock:
+        entry = _indexes.get(category_id)
+        if entry and entry[:2] == (version, stock) and time.monotonic() - entry[2] < cache_timeout():
+            _indexes.move_to_end(category_id)
+            record('facet', hit=True)
+            return entry[3]
+        building = _building.get(category_id)
+        if building is None:
+            _building[category_id] = threading.Event()
+    if building is not None:
+        if entry:
+            record('facet', hit=True)
+            return entry[3]
+        building.wait()
+        with _lock:
+            entry = _indexes.get(category_id)
+        # Побудова в іншому потоці могла впасти — тоді будуємо самі, не зберігаючи
+        return entry[3] if entry else FacetIndex.build(category_id)
+
+    record('facet', hit=False)
+    try:
+        entry = _refresh(entry, category_id, version, stock)
+        with _lock:
+            _indexes[category_id] = entry
+            _indexes.move_to_end(category_id)
+            while len(_indexes) > getattr(settings, 'SHOP_FACET_INDEXES', 32):
+                _indexes.popitem(last=False)
+    finally:
+        with _lock:
+            _building.pop(category_id).set()
+    return entry[3]
+
+
+def facet_counts(request, filters, queryset=None, category_id=None):
+    """Лічильники фасетів: для довільного queryset (наприклад, результатів пошуку) — одним
+    агрегатним запитом, для категорії чи всього каталогу — з бітового індексу"""
+    if queryset is not None:
+        return _counts(queryset, filters)
+    if not cache_enabled():
+        return FacetIndex.build(category_id).counts(filters)
+    return get_index(request, category_id).counts(filters)
+
+
+def build_facets(request, filters, queryset=None, category_id=None):
+    """Дані для шаблону фільтрів: варіанти з кількістю та станом вибору"""
+    counts = facet_counts(request, filters, queryset, category_id)
+    return {
+        'total': counts['total'],
+        'flags': [
+            {'param': name, 'label': label, 'count': counts[name], 'active': name in filters.flags}
+            for name, (label, _) in FLAGS.items()
+        ],
+        'discounts': [
+            {'value': percent, 'count': counts[f'discount_{percent}'], 'active': filters.min_discount == percent}
+            for percent in DISCOUNT_FILTERS
+        ],
+        'ratings': [
+            {'value': stars, 'count': counts[f'rating_{stars}'], 'active': filters.min_rating == stars}
+            for stars in RATING_FILTERS
+        ],
+        'prices': [
+            {
+                'min': low,
+                'max': high,
+                'count': counts[f'price_{i}'],
+                'active': filters.min_price == low and filters.max_price == high,
+            }
+            for i, (low, high) in enumerate(price_buckets())
+        ],
+    }
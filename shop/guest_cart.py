@@ -0,0 +1,166 @@
+"""Кошик гостя в підписаному cookie.
+
+Анонімний відвідувач не створює жодного рядка в базі: вміст кошика —
+компактний рядок «id:кількість,...» у cookie, підписаний SECRET_KEY.
+Кількість у рядку обмежена SHOP_CART_MAX_QUANTITY і залишком на складі,
+а кількість рядків — SHOP_GUEST_CART_MAX_LINES, зокрема й у cookie,
+збереженому до зміни налаштувань.
+Після входу кошик гостя додається до кошика користувача одним upsert,
+а cookie видаляється. Резерви складу для гостей не створюються — їх
+отримує кошик користувача після входу.
+"""
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import transaction
+from django.utils.functional import cached_property
+
+from .inventory import reservations_enabled, reserve_many
+from .carts import add_items, cart_for
+from .models import Product
+
+COOKIE_SALT = 'shop.guest_cart'
+
+
+def cookie_name():
+    return getattr(settings, 'SHOP_GUEST_CART_COOKIE', 'cart')
+
+
+def max_lines():
+    return getattr(settings, 'SHOP_GUEST_CART_MAX_LINES', 50)
+
+
+def max_quantity():
+    return getattr(settings, 'SHOP_CART_MAX_QUANTITY', 99)
+
+
+def _clamp(quantity, stock):
+    # Рядок товару, якого немає на складі, лишається з кількістю 1 — нестачу покаже оформлення
+    return min(quantity, max_quantity(), max(stock, 1))
+
+
+class GuestCartFull(Exception):
+    """У кошику гостя забагато різних товарів (cookie має обмежений розмір)"""
+
+
+class GuestCartItem:
+    """Рядок кошика гостя з тим самим інтерфейсом, що й CartItem у шаблонах; id — id товару"""
+
+    def __init__(self, product, quantity):
+        self.id = product.pk
+        self.product = product
+        self.product_id = product.pk
+        self.quantity = quantity
+
+    @property
+    def total_price(self):
+        return self.product.final_price * self.quantity
+
+
+class GuestCart:
+    def __init__(self, lines=None):
+        # {product_id: кількість} у порядку додавання
+        self.lines = dict(lines or {})
+        self._items = None
+
+    @classmethod
+    def from_request(cls, request):
+        value = request.get_signed_cookie(cookie_name(), default='', salt=COOKIE_SALT)
+        lines = {}
+        limit = max_quantity()
+        for part in value.split(','):
+            if len(lines) >= max_lines():
+                break
+            product_id, _, quantity = part.partition(':')
+            # Довгі рядки цифр не перетворюємо на int: це дорого і не потрібно
+            if product_id.isdigit() and len(product_id) <= 18 and quantity.isdigit():
+                quantity = min(int(quantity), limit) if len(quantity) <= 9 else limit
+                if quantity > 0:
+                    lines[int(product_id)] = quantity
+        return cls(lines)
+
+    def dumps(self):
+        return ','.join(f'{product_id}:{quantity}' for product_id, quantity in self.lines.items())
+
+    def save(self, response):
+        """Записує кошик у cookie відповіді; порожній кошик видаляє cookie"""
+        if not self.lines:
+            response.delete_cookie(cookie_name())
+            return
+        response.set_signed_cookie(
+            cookie_name(), self.dumps(), salt=COOKIE_SALT,
+            max_age=getattr(settings, 'SHOP_GUEST_CART_AGE', 30 * 24 * 60 * 60),
+            httponly=True, samesite='Lax', secure=settings.SESSION_COOKIE_SECURE,
+        )
+
+    def quantity(self, product_id):
+        return self.lines.get(product_id, 0)
+
+    def set(self, product_id, quantity):
+        """Встановлює кількість товару (0 — прибрати з кошика)"""
+        self.__dict__.pop('summary', None)
+        self._items = None
+        if quantity <= 0:
+            self.lines.pop(product_id, None)
+            return
+        if product_id not in self.lines and len(self.lines) >= max_lines():
+            raise GuestCartFull
+        self.lines[product_id] = min(quantity, max_quantity())
+
+    @property
+    def total_items(self):
+        # Кількість для лічильника в навігації — без запитів до бази
+        return sum(self.lines.values())
+
+    def items(self):
+        """Рядки з товарами, завантаженими одним запитом (до наступної зміни).
+
+        Неактивні та видалені товари прибираються з кошика, а кількість обмежується залишком на складі.
+        """
+        if self._items is None:
+            products = (
+                Product.objects.filter(pk__in=self.lines, is_active=True)
+                .select_related('category').defer('description').in_bulk()
+            ) if self.lines else {}
+            self.lines = {
+                product_id: _clamp(quantity, products[product_id].stock)
+                for product_id, quantity in self.lines.items() if product_id in products
+            }
+            self._items = [GuestCartItem(products[product_id], quantity) for product_id, quantity in self.lines.items()]
+        return self._items
+
+    @cached_property
+    def summary(self):
+        items = self.items()
+        return {
+            'total_items': sum(item.quantity for item in items),
+            'total_price': sum((item.total_price for item in items), Decimal('0')).quantize(Decimal('0.01')),
+        }
+
+    @property
+    def total_price(self):
+        return self.summary['total_price']
+
+
+def merge(cart, lines):
+    """Додає рядки {product_id: кількість} до кошика користувача одним upsert"""
+    with transaction.atomic():
+        stock = dict(Product.objects.filter(pk__in=lines, is_active=True).values_list('pk', 'stock'))
+        merged = add_items(cart, {
+            product_id: _clamp(quantity, stock[product_id])
+            for product_id, quantity in lines.items() if product_id in stock
+        })
+        if reservations_enabled():
+            # Резервується, скільки є; нестачу покаже оформлення замовлення, кошик лишається як є
+            reserve_many(cart, merged, allow_partial=True)
+    return merged
+
+
+def merge_guest_cart(request, response):
+    """Після входу переносить кошик гостя до кошика користувача та видаляє cookie"""
+    guest = GuestCart.from_request(request)
+    if guest.lines:
+        merge(cart_for(request.user), guest.lines)
+    if cookie_name() in request.COOKIES:
+        response.delete_cookie(cookie_name())
+    return response
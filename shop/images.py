@@ -0,0 +1,238 @@
+"""Похідні зображення товарів, галереї та категорій.
+
+Після завантаження зображення генеруються варіанти фіксованої ширини
+(SHOP_IMAGE_VARIANTS) у WebP і JPEG. Вони лежать поруч з оригіналом з
+хешем вмісту в імені, тож їх можна кешувати браузером назавжди. Генерація
+виконується в пулі процесів поза запитом (SHOP_IMAGE_WORKERS; 0 — одразу
+в поточному процесі; у черзі пулу не більше SHOP_IMAGE_MAX_PENDING задач,
+решту пізніше створить manage.py generate_image_variants), а результат
+записується в поле image_variants:
+
+    {'name': 'products/a.jpg', 'hash': '…',
+     'card': {'width': 400, 'height': 300, 'webp': '…', 'jpeg': '…'}, ...}
+
+Поки варіантів немає, шаблони показують оригінал. Збереження варіантів не
+змінює версію каталогу, щоб не скидати кеш сторінок та індекси фасетів після
+кожного завантаження: кешовані сторінки покажуть варіанти не пізніше ніж за
+SHOP_CATALOG_CACHE_TIMEOUT секунд.
+"""
+import hashlib
+import logging
+import posixpath
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connections, transaction
+
+logger = logging.getLogger(__name__)
+
+FORMATS = {
+    'webp': ('WEBP', {'quality': 80, 'method': 4}),
+    'jpeg': ('JPEG', {'quality': 82, 'optimize': True, 'progressive': True}),
+}
+
+_executor = None
+_executor_lock = threading.Lock()
+_pending = 0  # задач, переданих у пул і ще не завершених
+
+
+def variant_sizes():
+    """{назва варіанту: ширина} від найменшого до найбільшого"""
+    sizes = getattr(settings, 'SHOP_IMAGE_VARIANTS', {'thumb': 160, 'card': 400, 'detail': 1200})
+    return dict(sorted(sizes.items(), key=lambda item: item[1]))
+
+
+def _variant_name(name, digest, variant, extension):
+    root, _ = posixpath.splitext(name)
+    return f'{root}.{digest}.{variant}.{extension}'
+
+
+def _encode(image, image_format, options):
+    from PIL import Image
+
+    if image_format == 'JPEG' and image.mode != 'RGB':
+        # JPEG не підтримує прозорість: накладаємо на білий фон
+        background = Image.new('RGB', image.size, (255, 255, 255))
+        rgba = image.convert('RGBA')
+        background.paste(rgba, mask=rgba.getchannel('A'))
+        image = background
+    elif image.mode not in ('RGB', 'RGBA'):
+        image = image.convert('RGBA' if 'transparency' in image.info or image.mode in ('LA', 'PA') else 'RGB')
+    buffer = BytesIO()
+    image.save(buffer, image_format, **options)
+    return buffer.getvalue()
+
+
+def generate_variants(name, force=False):
+    """Створює варіанти зображення name у сховищі; вже наявні файли повторно не генеруються.
+
+    Виконується в процесі пулу, тому працює лише з файлами, без бази.
+    """
+    from PIL import Image, ImageOps
+
+    with default_storage.open(name, 'rb') as source:
+        data = source.read()
+    digest = hashlib.sha256(data).hexdigest()[:12]
+    result = {'name': name, 'hash': digest}
+    original = None
+    for variant, width in variant_sizes().items():
+        files = {extension: _variant_name(name, digest, variant, extension) for extension in FORMATS}
+        if not force and all(default_storage.exists(path) for path in files.values()):
+            with default_storage.open(files['jpeg'], 'rb') as existing:
+                size = Image.open(existing).size
+        else:
+            if original is None:
+                original = ImageOps.exif_transpose(Image.open(BytesIO(data)))
+            resized = original.copy()
+            # Менші за ширину варіанту оригінали не збільшуємо
+            resized.thumbnail((width, width * 4), Image.LANCZOS)
+            size = resized.size
+            for extension, (image_format, options) in FORMATS.items():
+                if default_storage.exists(files[extension]):
+                    default_storage.delete(files[extension])
+                saved = default_storage.save(files[extension], ContentFile(_encode(resized, image_format, options)))
+                files[extension] = saved
+        result[variant] = {'width': size[0], 'height': size[1], **files}
+    return result
+
+
+def init_worker():
+    # Для методу запуску spawn дочірній процес має сам налаштувати Django
+    import django
+
+    django.setup()
+
+
+def get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ProcessPoolExecutor(
+                max_workers=getattr(settings, 'SHOP_IMAGE_WORKERS', 2), initializer=init_worker
+            )
+        return _executor
+
+
+def needs_variants(instance):
+    return bool(instance.image) and instance.image_variants.get('name') != instance.image.name
+
+
+def variant_files(variants):
+    """Шляхи файлів усіх варіантів з image_variants"""
+    return {
+        path
+        for data in (variants or {}).values() if isinstance(data, dict)
+        for extension, path in data.items() if extension in FORMATS
+    }
+
+
+def _shared(variants, model, pk):
+    """Чи посилається на ті самі файли варіантів інший запис (одне зображення в кількох товарах)"""
+    from .models import Category, Product, ProductImage
+
+    for other in (Product, ProductImage, Category):
+        records = other.objects.filter(image=variants.get('name'), image_variants__hash=variants.get('hash'))
+        if other is model:
+            records = records.exclude(pk=pk)
+        if records.exists():
+            return True
+    return False
+
+
+def delete_stale_variants(model, pk, old, new=None):
+    """Видаляє файли старих варіантів запису, яких немає серед нових; повертає кількість видалених"""
+    stale = variant_files(old) - variant_files(new)
+    if not stale or _shared(old, model, pk):
+        return 0
+    for path in stale:
+        try:
+            default_storage.delete(path)
+        except OSError:
+            logger.warning('Не вдалося видалити застарілий варіант %s', path)
+    return len(stale)
+
+
+def save_variants(model, pk, variants):
+    """Записує варіанти, якщо зображення запису не змінилося за час генерації"""
+    return bool(model.objects.filter(pk=pk, image=variants['name']).update(image_variants=variants))
+
+
+def _take_slot():
+    """Займає місце в черзі пулу; False — черга заповнена"""
+    global _pending
+    with _executor_lock:
+        if _pending >= getattr(settings, 'SHOP_IMAGE_MAX_PENDING', 100):
+            return False
+        _pending += 1
+        return True
+
+
+def _free_slot():
+    global _pending
+    with _executor_lock:
+        _pending -= 1
+
+
+def _saved(model, pk, name):
+    def callback(future):
+        _free_slot()
+        try:
+            save_variants(model, pk, future.result())
+        except Exception:
+            logger.exception('Не вдалося створити варіанти зображення %s', name)
+        finally:
+            # Колбек виконується в службовому потоці пулу, який не закриває з'єднання сам
+            connections.close_all()
+
+    return callback
+
+
+def schedule(instance):
+    """Ставить генерацію варіантів у чергу після фіксації транзакції"""
+    model, pk, name = type(instance), instance.pk, instance.image.name
+
+    def submit():
+        if not default_storage.exists(name):
+            logger.warning('Зображення %s не знайдено, варіанти не створено', name)
+            return
+        if getattr(settings, 'SHOP_IMAGE_WORKERS', 2):
+            # Масовий імпорт не накопичує в пам'яті необмежену чергу: запис без варіантів
+            # лишається needs_variants, і його обробить manage.py generate_image_variants
+            if not _take_slot():
+                logger.warning('Черга генерації варіантів заповнена, %s пропущено', name)
+                return
+            try:
+                future = get_executor().submit(generate_variants, name)
+            except Exception:
+                _free_slot()
+                raise
+            future.add_done_callback(_saved(model, pk, name))
+            return
+        try:
+            save_variants(model, pk, generate_variants(name))
+        except Exception:
+            logger.exception('Не вдалося створити варіанти зображення %s', name)
+
+    transaction.on_commit(submit)
+
+
+def srcset(variants, extension):
+    """Рядок srcset з усіх варіантів різної ширини"""
+    entries = {}
+    for variant in variant_sizes():
+        data = variants.get(variant)
+        if data:
+            entries.setdefault(data['width'], default_storage.url(data[extension]))
+    return ', '.join(f'{url} {width}w' for width, url in entries.items())
+
+
+def variant_url(instance, variant, extension='jpeg'):
+    """URL варіанту зображення або оригіналу, якщо варіантів ще немає"""
+    data = instance.image_variants.get(variant) if instance.image_variants else None
+    if data:
+        return default_storage.url(data[extension])
+    return instance.image.url if instance.image else ''
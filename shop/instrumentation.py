@@ -0,0 +1,119 @@
+"""Облік SQL-запитів: кількість, час у базі та повтори однакових запитів.
+
+QueryInstrumentationMiddleware рахує запити кожного HTTP-запиту, додає
+підсумок у заголовок X-DB-Queries (SHOP_QUERY_DEBUG_HEADER) і пише його в
+журнал shop.queries. Запит однієї форми, повторений SHOP_QUERY_DUPLICATE_THRESHOLD
+разів і більше, — типова ознака N+1, про неї журнал попереджає.
+
+query_budget() — та сама лічба для тестів: блок падає, якщо перевищив
+бюджет запитів чи повторів.
+"""
+import logging
+import re
+import time
+from collections import Counter
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+logger = logging.getLogger('shop.queries')
+
+# Керування транзакціями не рахується: у тестах ті самі блоки atomic стають точками збереження
+_TRANSACTION = re.compile(r'\s*(BEGIN|COMMIT|ROLLBACK|SAVEPOINT|RELEASE)\b', re.IGNORECASE)
+_IN_LIST = re.compile(r'\((?:%s, )*%s\)')
+_LITERAL = re.compile(r"'(?:[^']|'')*'|\b\d+\b")
+
+
+def query_shape(sql):
+    """Форма запиту без значень: однакові форми в межах одного HTTP-запиту — кандидати на N+1"""
+    return _LITERAL.sub('?', _IN_LIST.sub('(...)', sql))
+
+
+class QueryStats:
+    """Обгортка execute для connection.execute_wrapper, що накопичує статистику"""
+
+    def __init__(self):
+        self.count = 0
+        self.time = 0.0
+        self.queries = []
+        self.shapes = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        if _TRANSACTION.match(sql):
+            return execute(sql, params, many, context)
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.time += time.perf_counter() - start
+            self.count += 1
+            self.queries.append(sql)
+            self.shapes[query_shape(sql)] += 1
+
+    @property
+    def duplicates(self):
+        """{форма: кількість} для запитів, виконаних більше одного разу"""
+        return {shape: total for shape, total in self.shapes.items() if total > 1}
+
+    @property
+    def duplicate_count(self):
+        """Скільки запитів повторюють уже виконані"""
+        return sum(total - 1 for total in self.duplicates.values())
+
+    def summary(self):
+        return f'count={self.count}; time={self.time * 1000:.1f}ms; duplicates={self.duplicate_count}'
+
+
+@contextmanager
+def collect_queries():
+    """Рахує запити до всіх баз у поточному потоці"""
+    stats = QueryStats()
+    with ExitStack() as stack:
+        for alias in connections:
+            stack.enter_context(connections[alias].execute_wrapper(stats))
+        yield stats
+
+
+@contextmanager
+def query_budget(max_queries, max_duplicates=0):
+    """Для тестів: блок має виконати не більше max_queries запитів і max_duplicates повторів"""
+    with collect_queries() as stats:
+        yield stats
+    problems = []
+    if stats.count > max_queries:
+        problems.append(f'Запитів {stats.count}, бюджет {max_queries}')
+    if stats.duplicate_count > max_duplicates:
+        problems.append(f'Повторених запитів {stats.duplicate_count}, бюджет {max_duplicates}')
+        problems += [f'  {total}× {shape}' for shape, total in stats.duplicates.items()]
+    if problems:
+        queries = '\n'.join(f'  {number}. {sql}' for number, sql in enumerate(stats.queries, start=1))
+        raise AssertionError('\n'.join(problems) + f'\nЗапити:\n{queries}')
+
+
+class QueryInstrumentationMiddleware:
+    """Статистика запитів до бази для кожного HTTP-запиту (за замовчуванням лише з DEBUG)"""
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'SHOP_QUERY_INSTRUMENTATION', settings.DEBUG):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        # Запити під час віддачі потокових відповідей сюди не потрапляють
+        with collect_queries() as stats:
+            response = self.get_response(request)
+
+        if getattr(settings, 'SHOP_QUERY_DEBUG_HEADER', settings.DEBUG):
+            response['X-DB-Queries'] = stats.summary()
+        threshold = getattr(settings, 'SHOP_QUERY_DUPLICATE_THRESHOLD', 3)
+        repeated = {shape: total for shape, total in stats.duplicates.items() if total >= threshold}
+        if repeated:
+            logger.warning(
+                'Можливий N+1: %s %s (%s)\n%s', request.method, request.path, stats.summary(),
+                '\n'.join(f'  {total}× {shape}' for shape, total in repeated.items()),
+            )
+        else:
+            logger.debug('%s %s: %s', request.method, request.path, stats.summary())
+        return response
@@ -0,0 +1,260 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Case, F, IntegerField, OuterRef, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .cache import bump_stock_version
+from .models import Cart, Product, StockReservation
+
+
+class OutOfStockError(Exception):
+    """Недостатньо товару на складі для оформлення замовлення"""
+
+    def __init__(self, shortages):
+        # {product_id: (запитано, списано)}
+        self.shortages = shortages
+        super().__init__(f'Недостатньо товару на складі: {sorted(shortages)}')
+
+
+def reservations_enabled():
+    """Чи резервуються товари під час додавання в кошик"""
+    return getattr(settings, 'SHOP_STOCK_RESERVATIONS', False)
+
+
+# Товарів в одному UPDATE … CASE: параметрів запиту лишається менше за ліміт SQLite (999)
+UPDATE_CHUNK = 100
+
+
+class _Shortage(Exception):
+    """Умовний UPDATE змінив не всі рядки — точку збереження треба відкотити"""
+
+
+def _case(values):
+    """CASE WHEN id IN (…) THEN значення … END для {product_id: значення}.
+
+    Товари з однаковим значенням ідуть в одну гілку: кількості в кошиках
+    здебільшого повторюються, тож гілок мало і Django швидше будує запит.
+    """
+    groups = {}
+    for product_id, value in values.items():
+        groups.setdefault(value, []).append(product_id)
+    return Case(
+        *(When(pk__in=product_ids, then=Value(value)) for value, product_ids in groups.items()),
+        default=Value(0), output_field=IntegerField(),
+    )
+
+
+def _bulk_update(changes, required=None):
+    """Змінює stock і reserved кількох товарів одним UPDATE … CASE на кожні UPDATE_CHUNK товарів.
+
+    changes — {product_id: (приріст stock, приріст reserved)}; з required
+    ({product_id: потрібний вільний залишок}) рядок змінюється лише тоді,
+    коли stock >= reserved + потрібне. Повертає кількість змінених рядків.
+    """
+    updated = 0
+    product_ids = sorted(changes)
+    for start in range(0, len(product_ids), UPDATE_CHUNK):
+        chunk = product_ids[start:start + UPDATE_CHUNK]
+        rows = Product.objects.filter(pk__in=chunk)
+        if connection.features.has_select_for_update:
+            # Рядки блокуються в порядку id — паралельні транзакції не захоплять їх у протилежному порядку
+            list(rows.select_for_update().order_by('pk').values_list('pk', flat=True))
+        if required:
+            rows = rows.filter(stock__gte=F('reserved') + _case({pk: required[pk] for pk in chunk}))
+        values = {}
+        for index, field in enumerate(('stock', 'reserved')):
+            deltas = {pk: changes[pk][index] for pk in chunk if changes[pk][index]}
+            if deltas:
+                values[field] = F(field) + _case(deltas)
+        updated += rows.update(**values) if values else len(chunk)
+    if updated:
+        # Після відкоту точки збереження чи транзакції колбек скасовується разом зі змінами
+        transaction.on_commit(bump_stock_version)
+    return updated
+
+
+def _apply(changes, required):
+    """_bulk_update з умовою для всіх рядків разом; False — комусь не вистачило, і нічого не змінено"""
+    try:
+        # Умовний UPDATE: дві паралельні транзакції не можуть продати одну одиницю двічі,
+        # а рядки, яким вистачило, відкочуються разом з точкою збереження
+        with transaction.atomic():
+            if _bulk_update(changes, required) != len(changes):
+                raise _Shortage
+    except _Shortage:
+        return False
+    return True
+
+
+def _take_all(quantities, reservations):
+    """Списує всі рядки разом одним умовним UPDATE; False — комусь не вистачило, і нічого не змінено.
+
+    Резерв кошика знімається разом зі списанням, а понад нього потрібен вільний залишок.
+    """
+    changes = {
+        product_id: (-quantity, -reservations.get(product_id, 0))
+        for product_id, quantity in quantities.items() if quantity or reservations.get(product_id)
+    }
+    required = {product_id: quantities[product_id] - reservations.get(product_id, 0) for product_id in changes}
+    return _apply(changes, required)
+
+
+def _free(product_ids):
+    """{product_id: вільний залишок} одним запитом; видалені товари мають 0"""
+    free = dict(Product.objects.filter(pk__in=product_ids).values_list('pk', F('stock') - F('reserved')))
+    return {product_id: max(free.get(product_id, 0), 0) for product_id in product_ids}
+
+
+def allocate(lines, allow_partial=False, reservations=None):
+    """Списує товари зі складу для рядків замовлення.
+
+    lines — ітерабельна послідовність пар (product_id, quantity),
+    reservations — {product_id: зарезервована кількість} для кошика.
+    Повертає словник {product_id: списана кількість}. Без allow_partial
+    будь-яка нестача спричиняє OutOfStockError; виклик має бути всередині
+    транзакції, щоб уже зроблені списання відкотилися разом з нею.
+
+    Усі рядки списуються одним умовним UPDATE, тож кількість запитів не
+    залежить від кількості позицій; лише після нестачі додається запит
+    вільних залишків (і повторна спроба з меншими кількостями для allow_partial).
+    """
+    reservations = reservations or {}
+    requested = dict(lines)
+    quantities = dict(requested)
+    while not _take_all(quantities, reservations):
+        free = _free(quantities)
+        available = {product_id: free[product_id] + reservations.get(product_id, 0) for product_id in quantities}
+        if not allow_partial:
+            shortages = {
+                product_id: (quantity, 0) for product_id, quantity in quantities.items()
+                if quantity > available[product_id]
+            }
+            if shortages:
+                raise OutOfStockError(shortages)
+            # Залишок звільнили між UPDATE і перевіркою — пробуємо ще раз
+            continue
+        quantities = {product_id: min(quantity, available[product_id]) for product_id, quantity in quantities.items()}
+
+    shortages = {
+        product_id: (quantity, quantities[product_id])
+        for product_id, quantity in requested.items() if quantities[product_id] < quantity
+    }
+    if shortages and not (allow_partial and any(quantities.values())):
+        raise OutOfStockError(shortages)
+    return quantities
+
+
+def _totals(lines):
+    """{product_id: сума кількостей} для пар (product_id, quantity)"""
+    totals = {}
+    for product_id, quantity in lines:
+        totals[product_id] = totals.get(product_id, 0) + quantity
+    return totals
+
+
+def restock(lines):
+    """Повертає товари на склад (наприклад, при скасуванні замовлення) одним UPDATE … CASE"""
+    _bulk_update({product_id: (quantity, 0) for product_id, quantity in _totals(lines).items() if quantity})
+
+
+def unreserve(lines):
+    """Зменшує лічильники резервів товарів (резерви вже видалено або скасовано) одним UPDATE … CASE"""
+    _bulk_update({product_id: (0, -quantity) for product_id, quantity in _totals(lines).items() if quantity})
+
+
+def reserve_many(cart, quantities, allow_partial=False):
+    """Встановлює резерви кошика {product_id: кількість} (0 — зняти резерв).
+
+    Без allow_partial нестача будь-якого товару піднімає OutOfStockError і
+    жоден резерв не змінюється; з allow_partial резервується стільки, скільки
+    є вільним. Кожна зміна подовжує всі резерви кошика на SHOP_RESERVATION_TTL
+    секунд. Повертає {product_id: зарезервована кількість}.
+
+    Кількість запитів не залежить від кількості товарів: читання резервів,
+    умовний UPDATE збільшень, UPDATE зменшень, upsert рядків резервів,
+    видалення знятих і подовження строку.
+    """
+    quantities = {product_id: max(quantity, 0) for product_id, quantity in quantities.items()}
+    with transaction.atomic():
+        if connection.features.has_select_for_update:
+            # Зміни резервів одного кошика йдуть по черзі: інакше дві транзакції прочитали б
+            # однаковий поточний резерв і обидві додали б різницю до Product.reserved
+            list(Cart.objects.select_for_update().filter(pk=cart.pk).values_list('pk', flat=True))
+        held = dict(
+            StockReservation.objects.filter(cart=cart, product_id__in=quantities).values_list('product_id', 'quantity')
+        )
+        requested = dict(quantities)
+        while True:
+            increases = {
+                product_id: quantity - held.get(product_id, 0)
+                for product_id, quantity in quantities.items() if quantity > held.get(product_id, 0)
+            }
+            if _apply({product_id: (0, delta) for product_id, delta in increases.items()}, increases):
+                break
+            free = _free(increases)
+            short = {product_id for product_id, delta in increases.items() if delta > free[product_id]}
+            if not short:
+                # Залишок звільнили між UPDATE і перевіркою — пробуємо ще раз
+                continue
+            if not allow_partial:
+                raise OutOfStockError({
+                    product_id: (requested[product_id], held.get(product_id, 0) + free[product_id])
+                    for product_id in short
+                })
+            for product_id in short:
+                quantities[product_id] = held.get(product_id, 0) + free[product_id]
+
+        _bulk_update({
+            product_id: (0, quantity - held[product_id])
+            for product_id, quantity in quantities.items() if quantity < held.get(product_id, 0)
+        })
+        expires_at = timezone.now() + timedelta(seconds=getattr(settings, 'SHOP_RESERVATION_TTL', 15 * 60))
+        kept = sorted(product_id for product_id, quantity in quantities.items() if quantity)
+        if kept:
+            StockReservation.objects.bulk_create(
+                [StockReservation(cart=cart, product_id=product_id, quantity=quantities[product_id],
+                                  expires_at=expires_at) for product_id in kept],
+                update_conflicts=True, unique_fields=['cart', 'product'], update_fields=['quantity', 'expires_at'],
+            )
+        released = [product_id for product_id, quantity in quantities.items() if not quantity and product_id in held]
+        if released:
+            StockReservation.objects.filter(cart=cart, product_id__in=released).delete()
+        StockReservation.objects.filter(cart=cart).exclude(product_id__in=kept).update(expires_at=expires_at)
+    return quantities
+
+
+def reserve(cart, product_id, quantity):
+    """Встановлює резерв кошика на один товар (див. reserve_many)"""
+    reserve_many(cart, {product_id: quantity})
+
+
+def release_expired(batch_size=1000):
+    """Знімає прострочені резерви пакетами, повертає кількість знятих резервів"""
+    released = 0
+    lock_kwargs = {'skip_locked': True} if connection.features.has_select_for_update_skip_locked else {}
+    while True:
+        with transaction.atomic():
+            batch = list(
+                StockReservation.objects.select_for_update(**lock_kwargs)
+                .filter(expires_at__lte=timezone.now())
+                .order_by('expires_at')
+                .values_list('id', 'product_id', 'quantity')[:batch_size]
+            )
+            if not batch:
+                return released
+            StockReservation.objects.filter(id__in=[row[0] for row in batch]).delete()
+            unreserve((product_id, quantity) for _, product_id, quantity in batch)
+        released += len(batch)
+
+
+def recount_reserved():
+    """Перераховує Product.reserved із рядків резервів (після збоїв чи видалення кошиків)"""
+    held = StockReservation.objects.filter(product=OuterRef('pk')).values('product').annotate(
+        total=Sum('quantity')
+    ).values('total')
+    updated = Product.objects.update(reserved=Coalesce(Subquery(held), Value(0)))
+    transaction.on_commit(bump_stock_version)
+    return updated
@@ -0,0 +1,69 @@
+"""Спільні помічники для команд бенчмарків (bench_*)"""
+import random
+import statistics
+from decimal import Decimal
+
+from shop.models import Category, Product
+
+WORDS = (
+    'смартфон ноутбук навушники чохол кабель зарядка годинник планшет монітор клавіатура '
+    'мишка колонка камера рюкзак сумка кросівки куртка футболка чашка лампа крісло стіл '
+    'м\'ясорубка ґудзик їжак smart phone laptop wireless bluetooth gaming charger cable case '
+    'watch tablet monitor keyboard mouse speaker camera backpack sneakers jacket shirt mug lamp '
+    'чорний білий червоний синій зелений black white red blue green pro max mini ultra lite'
+).split()
+
+
+SYLLABLES = 'ка ро ма ні те ло ву за ри до ба ле ти но са ko ra mi te lo va zi no be'.split()
+
+
+def vocabulary(rng, size=5000):
+    """Базові слова плюс згенеровані, щоб частоти слів нагадували справжній каталог"""
+    generated = {''.join(rng.choices(SYLLABLES, k=rng.randint(2, 4))) for _ in range(size)}
+    return WORDS + sorted(generated)
+
+
+def summarize(timings):
+    """p50/p95/p99 та середнє (мс) для списку вимірів"""
+    ordered = sorted(timings)
+
+    def percentile(p):
+        return ordered[min(len(ordered) - 1, int(len(ordered) * p))]
+
+    return {
+        'p50': statistics.median(ordered),
+        'p95': percentile(0.95),
+        'p99': percentile(0.99),
+        'mean': statistics.mean(ordered),
+    }
+
+
+def seed_catalog(products, categories=20, description_words=60, batch_size=5000, seed=42):
+    """Створює синтетичний каталог пакетними вставками, повертає список категорій"""
+    rng = random.Random(seed)
+    words = vocabulary(rng)
+    # Розподіл Ципфа: кілька слів трапляються часто, більшість — рідко
+    weights = [1 / rank for rank in range(1, len(words) + 1)]
+    category_objects = Category.objects.bulk_create([
+        Category(name=f'Категорія {i} {rng.choice(WORDS)}', slug=f'bench-category-{i}')
+        for i in range(categories)
+    ])
+    batch = []
+    for i in range(products):
+        price = Decimal(rng.randint(100, 100000)) / 100
+        batch.append(Product(
+            name=' '.join(rng.choices(words, weights, k=3)).capitalize() + f' {i}',
+            slug=f'bench-product-{i}',
+            description=' '.join(rng.choices(words, weights, k=description_words)),
+            category=category_objects[i % categories],
+            price=price,
+            discount_price=(price * Decimal('0.8')).quantize(Decimal('0.01')) if i % 5 == 0 else None,
+            stock=rng.randint(0, 50),
+            is_featured=i % 50 == 0,
+            image='products/bench.jpg',
+        ))
+        if len(batch) >= batch_size:
+            Product.objects.bulk_create(batch)
+            batch = []
+    Product.objects.bulk_create(batch)
+    return category_objects
@@ -0,0 +1,66 @@
+import time
+
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test import Client
+from django.test.utils import override_settings
+
+from shop import search
+from shop.cache import reset_stats, stats
+from shop.models import Category, Product
+
+from ._bench import seed_catalog, summarize
+
+
+class Command(BaseCommand):
+    help = 'Порівнює пропускну здатність сторінок каталогу без кешу та з кешем (згенеровані дані відкочуються)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=5000,
+                            help='Скільки товарів згенерувати (0 — використати наявні дані)')
+        parser.add_argument('--requests', type=int, default=500, help='Запитів на кожен прогін')
+
+    def handle(self, *args, **options):
+        with transaction.atomic(), override_settings(ALLOWED_HOSTS=['testserver']):
+            if options['products']:
+                self.stdout.write(f'Генерація {options["products"]} товарів...')
+                seed_catalog(options['products'])
+                search.rebuild_index()
+
+            urls = self.urls()
+            self.stdout.write(f'{"кеш":>8} {"запит/с":>9} {"p50, мс":>9} {"p99, мс":>9} {"влучання":>9}')
+            for label, enabled in (('вимк.', False), ('увімк.', True)):
+                cache.clear()
+                reset_stats()
+                with override_settings(SHOP_CATALOG_CACHE=enabled):
+                    elapsed, timings = self.run(urls, options['requests'])
+                ratio = stats()['page']['ratio']
+                summary = summarize(timings)
+                self.stdout.write(
+                    f'{label:>8} {len(timings) / elapsed:>9.1f} {summary["p50"]:>9.2f} '
+                    f'{summary["p99"]:>9.2f} {ratio:>9.1%}'
+                )
+            transaction.set_rollback(True)
+
+    def urls(self):
+        """Суміш анонімного трафіку: головна, каталог, категорії, товари, пошук"""
+        categories = list(Category.objects.values_list('slug', flat=True)[:5])
+        products = list(Product.objects.filter(is_active=True).values_list('slug', flat=True)[:20])
+        urls = ['/', '/catalog/', '/catalog/?sort=price_asc', '/search/?q=смартфон']
+        urls += [f'/catalog/{slug}/' for slug in categories]
+        urls += [f'/product/{slug}/' for slug in products]
+        return urls
+
+    def run(self, urls, total):
+        client = Client()
+        timings = []
+        start = time.perf_counter()
+        for i in range(total):
+            url = urls[i % len(urls)]
+            request_start = time.perf_counter()
+            response = client.get(url)
+            timings.append((time.perf_counter() - request_start) * 1000)
+            if response.status_code != 200:
+                self.stderr.write(f'{url}: {response.status_code}')
+        return time.perf_counter() - start, timings
@@ -0,0 +1,57 @@
+import time
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+
+from shop.checkout import place_order
+from shop.models import Cart, CartItem, Category, Product
+
+from ._bench import summarize
+
+
+class Command(BaseCommand):
+    help = 'Вимірює час оформлення замовлення для кошиків різного розміру (дані відкочуються)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lines', type=int, nargs='+', default=[1, 10, 100],
+                            help='Кількість позицій у кошику')
+        parser.add_argument('--repeat', type=int, default=50, help='Кількість замовлень на кожен розмір')
+
+    def handle(self, *args, **options):
+        lines = options['lines']
+        with transaction.atomic():
+            category = Category.objects.create(name='bench', slug='bench-checkout')
+            products = Product.objects.bulk_create([
+                Product(
+                    name=f'bench {i}', slug=f'bench-checkout-{i}', description='bench',
+                    category=category, price=Decimal('100.00'), stock=10 ** 6, image='products/bench.jpg',
+                )
+                for i in range(max(lines))
+            ])
+            user = User.objects.create(username='bench-checkout')
+            cart = Cart.objects.create(user=user)
+            shipping = {
+                'shipping_address': 'вул. Тестова, 1', 'shipping_city': 'Київ',
+                'shipping_zip_code': '01001', 'shipping_phone': '+380000000000',
+            }
+
+            self.stdout.write(f'{"позицій":>8} {"запитів":>8} {"p50, мс":>9} {"p95, мс":>9} {"середнє, мс":>12}')
+            for size in lines:
+                timings = []
+                for _ in range(options['repeat']):
+                    CartItem.objects.bulk_create(
+                        CartItem(cart=cart, product=product, quantity=1) for product in products[:size]
+                    )
+                    with CaptureQueriesContext(connection) as queries:
+                        start = time.perf_counter()
+                        place_order(cart, **shipping)
+                        timings.append((time.perf_counter() - start) * 1000)
+                stats = summarize(timings)
+                self.stdout.write(
+                    f'{size:>8} {len(queries):>8} {stats["p50"]:>9.2f} '
+                    f'{stats["p95"]:>9.2f} {stats["mean"]:>12.2f}'
+                )
+            transaction.set_rollback(True)
@@ -0,0 +1,79 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.http import QueryDict
+
+from shop.facets import (
+    DISCOUNT_FILTERS, FLAGS, RATING_FILTERS, CatalogFilters, FacetIndex, _counts, get_index, price_buckets,
+)
+from shop.models import Category, Product
+
+from ._bench import seed_catalog, summarize
+
+
+class Command(BaseCommand):
+    help = 'Вимірює підрахунок фасетів для великої категорії (згенеровані дані відкочуються)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=100000,
+                            help='Скільки товарів згенерувати в одній категорії (0 — використати наявні дані)')
+        parser.add_argument('--repeat', type=int, default=20, help='Повторів кожного способу')
+        parser.add_argument('--filters', default='in_stock=1&min_price=100',
+                            help='Активні фільтри як рядок запиту')
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            if options['products']:
+                self.stdout.write(f'Генерація {options["products"]} товарів...')
+                seed_catalog(options['products'], categories=1)
+
+            category = Category.objects.order_by('-pk').first()
+            products = Product.objects.filter(is_active=True, category=category)
+            filters = CatalogFilters(QueryDict(options['filters']))
+            self.stdout.write(f'Категорія «{category}»: {products.count()} товарів, фільтри: {options["filters"]}')
+
+            def per_option():
+                # Наївний спосіб: окремий COUNT на кожен варіант фасету
+                counts = {'total': products.filter(filters.q()).count()}
+                for name, (_, condition) in FLAGS.items():
+                    counts[name] = products.filter(filters.q(exclude=name) & condition).count()
+                for percent in DISCOUNT_FILTERS:
+                    counts[f'discount_{percent}'] = products.filter(
+                        filters.q(exclude='discount'), discount_percent__gte=percent
+                    ).count()
+                for stars in RATING_FILTERS:
+                    counts[f'rating_{stars}'] = products.filter(filters.q(exclude='rating'), rating_avg__gte=stars).count()
+                for i, (low, high) in enumerate(price_buckets()):
+                    bucket = products.filter(filters.q(exclude='price'), effective_price__gte=low)
+                    counts[f'price_{i}'] = (bucket.filter(effective_price__lte=high) if high is not None else bucket).count()
+                return counts
+
+            def grouped():
+                return _counts(products, filters)
+
+            def build():
+                return FacetIndex.build(category.pk)
+
+            def indexed():
+                return get_index(None, category.pk).counts(filters)
+
+            expected = per_option()
+            if grouped() != expected or indexed() != expected:
+                self.stderr.write('Лічильники різних способів не збігаються')
+
+            self.stdout.write(f'{"спосіб":>16} {"p50, мс":>9} {"p95, мс":>9} {"p99, мс":>9}')
+            for name, run in (
+                ('COUNT×N', per_option),
+                ('один запит', grouped),
+                ('побудова індексу', build),
+                ('бітовий індекс', indexed),
+            ):
+                timings = []
+                for _ in range(options['repeat']):
+                    start = time.perf_counter()
+                    run()
+                    timings.append((time.perf_counter() - start) * 1000)
+                stats = summarize(timings)
+                self.stdout.write(f'{name:>16} {stats["p50"]:>9.2f} {stats["p95"]:>9.2f} {stats["p99"]:>9.2f}')
+            transaction.set_rollback(True)
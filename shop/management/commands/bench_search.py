@@ -0,0 +1,61 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Q
+
+from shop import search
+from shop.models import Product
+
+from ._bench import seed_catalog, summarize
+
+
+class Command(BaseCommand):
+    help = 'Порівнює затримку пошуку через icontains та через індекс FTS5 (згенеровані дані відкочуються)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=500000,
+                            help='Скільки товарів згенерувати (0 — використати наявні дані)')
+        parser.add_argument('--repeat', type=int, default=20, help='Повторів кожного запиту')
+        parser.add_argument('--query', action='append', dest='queries',
+                            help='Пошуковий запит (можна вказати кілька разів)')
+
+    def handle(self, *args, **options):
+        if not search.fts_enabled():
+            raise CommandError('Бенчмарк порівнює з FTS5 і працює лише на SQLite')
+        queries = options['queries'] or ['смартф', 'wireless', 'чорний ноутбук', 'мʼясорубка', 'gaming mouse']
+
+        with transaction.atomic():
+            if options['products']:
+                self.stdout.write(f'Генерація {options["products"]} товарів...')
+                seed_catalog(options['products'])
+                search.rebuild_index()
+
+            base = Product.objects.filter(is_active=True)
+
+            def icontains(query):
+                products = base.filter(
+                    Q(name__icontains=query) |
+                    Q(description__icontains=query) |
+                    Q(category__name__icontains=query)
+                )
+                return products.count(), list(products[:12])
+
+            def fts(query):
+                products = search.search_products(base, query)
+                return products.count(), list(products[:12])
+
+            self.stdout.write(f'{"шлях":>10} {"p50, мс":>9} {"p95, мс":>9} {"p99, мс":>9} {"середнє, мс":>12}')
+            for name, run in (('icontains', icontains), ('fts5', fts)):
+                timings = []
+                for _ in range(options['repeat']):
+                    for query in queries:
+                        start = time.perf_counter()
+                        run(query)
+                        timings.append((time.perf_counter() - start) * 1000)
+                stats = summarize(timings)
+                self.stdout.write(
+                    f'{name:>10} {stats["p50"]:>9.2f} {stats["p95"]:>9.2f} '
+                    f'{stats["p99"]:>9.2f} {stats["mean"]:>12.2f}'
+                )
+            transaction.set_rollback(True)
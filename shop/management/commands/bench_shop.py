@@ -0,0 +1,351 @@
+import asyncio
+import json
+import platform
+import random
+import subprocess
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from http.cookiejar import CookieJar
+from urllib.error import HTTPError
+from urllib.parse import urlencode
+from urllib.request import HTTPCookieProcessor, HTTPRedirectHandler, Request, build_opener
+
+import django
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import AsyncClient, Client
+from django.test.utils import override_settings
+from django.utils import timezone
+
+from shop.carts import cart_for, set_quantities
+from shop.models import Category, Order, Product
+
+from ._bench import summarize
+
+USERNAME = 'bench-shop'
+PASSWORD = 'bench-shop-password'
+SHIPPING = {
+    'shipping_address': 'вул. Тестова, 1', 'shipping_city': 'Київ',
+    'shipping_zip_code': '01001', 'shipping_phone': '+380000000000',
+}
+AJAX = {'X-Requested-With': 'XMLHttpRequest'}
+
+
+class Response:
+    def __init__(self, status, body, location=''):
+        self.status = status
+        self.body = body
+        self.location = location
+
+    def json(self):
+        return json.loads(self.body)
+
+
+class WsgiSession:
+    """Віртуальний користувач, запити якого проходять через WSGI-обробник Django у цьому процесі"""
+
+    def __init__(self, base_url):
+        self.client = Client()
+
+    def request(self, method, path, data=None, headers=None, as_json=False):
+        kwargs = {'headers': headers or {}}
+        if as_json:
+            data, kwargs['content_type'] = json.dumps(data), 'application/json'
+        response = getattr(self.client, method.lower())(path, data, **kwargs)
+        return Response(response.status_code, response.content, response.get('Location', ''))
+
+    def close(self):
+        pass
+
+
+class AsgiSession(WsgiSession):
+    """Віртуальний користувач поверх ASGI-обробника; кожна сесія має власний цикл подій"""
+
+    def __init__(self, base_url):
+        self.client = AsyncClient()
+        self.loop = asyncio.new_event_loop()
+
+    def request(self, method, path, data=None, headers=None, as_json=False):
+        kwargs = {'headers': headers or {}}
+        if as_json:
+            data, kwargs['content_type'] = json.dumps(data), 'application/json'
+        response = self.loop.run_until_complete(getattr(self.client, method.lower())(path, data, **kwargs))
+        return Response(response.status_code, response.content, response.get('Location', ''))
+
+    def close(self):
+        self.loop.close()
+
+
+class _NoRedirect(HTTPRedirectHandler):
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+
+class HttpSession:
+    """Віртуальний користувач справжнього сервера: cookie, CSRF-токен, без переходу за редиректами"""
+
+    def __init__(self, base_url):
+        self.base_url = base_url.rstrip('/')
+        self.cookies = CookieJar()
+        self.opener = build_opener(HTTPCookieProcessor(self.cookies), _NoRedirect)
+
+    def request(self, method, path, data=None, headers=None, as_json=False):
+        headers = dict(headers or {})
+        url, body = self.base_url + path, None
+        if method == 'GET' and data:
+            url += '?' + urlencode(data)
+        elif method == 'POST':
+            if as_json:
+                body, headers['Content-Type'] = json.dumps(data).encode(), 'application/json'
+            else:
+                body = urlencode(data or {}).encode()
+            token = next((cookie.value for cookie in self.cookies if cookie.name == settings.CSRF_COOKIE_NAME), '')
+            headers.update({'X-CSRFToken': token, 'Referer': self.base_url + '/'})
+        try:
+            with self.opener.open(Request(url, body, headers, method=method)) as response:
+                return Response(response.status, response.read(), response.headers.get('Location', ''))
+        except HTTPError as error:
+            return Response(error.code, error.read(), error.headers.get('Location', ''))
+
+    def close(self):
+        pass
+
+
+TRANSPORTS = {'wsgi': WsgiSession, 'asgi': AsgiSession, 'http': HttpSession}
+
+
+class Recorder:
+    """Час кожного запиту за іменем маршруту"""
+
+    def __init__(self):
+        self.timings = {}
+        self.errors = {}
+        self.lock = threading.Lock()
+
+    def call(self, session, route, method, path, data=None, expect=(200, 302), **kwargs):
+        start = time.perf_counter()
+        response = session.request(method, path, data, **kwargs)
+        elapsed = (time.perf_counter() - start) * 1000
+        with self.lock:
+            self.timings.setdefault(route, []).append(elapsed)
+            if response.status not in expect:
+                self.errors[route] = self.errors.get(route, 0) + 1
+        return response
+
+    def fail(self, route):
+        with self.lock:
+            self.errors[route] = self.errors.get(route, 0) + 1
+
+
+class Command(BaseCommand):
+    help = ('Навантажувальний бенчмарк усіх маршрутів магазину: перегляд каталогу, пошук, AJAX-кошик, '
+            'оформлення замовлення та кабінет. Запити йдуть через WSGI чи ASGI у цьому процесі або на '
+            'локальний сервер; звіт із p50/p95/p99 можна зберегти в JSON і порівнювати між комітами. '
+            'Сценарій покупця створює замовлення — запускайте на згенерованих даних (seed_shop)')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--transport', nargs='+', choices=sorted(TRANSPORTS), default=['wsgi'])
+        parser.add_argument('--url', default='http://127.0.0.1:8000', help='Адреса сервера для --transport http')
+        parser.add_argument('--iterations', type=int, default=20, help='Скільки разів пройти кожен сценарій')
+        parser.add_argument('--concurrency', type=int, default=1,
+                            help='Паралельні віртуальні користувачі (лише для http: у процесі запити послідовні)')
+        parser.add_argument('--warmup', type=int, default=1, help='Ітерації прогріву, що не входять у звіт')
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--output', help='Файл для JSON-звіту')
+        parser.add_argument('--baseline', help='Попередній JSON-звіт для порівняння')
+
+    def handle(self, *args, **options):
+        if settings.DEBUG:
+            self.stderr.write('DEBUG увімкнено: час запитів включає накладні витрати налагодження')
+        self.prepare_data(options['seed'], max(options['concurrency'], 1))
+        report = {'meta': self.meta(options), 'transports': {}}
+        with override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver']):
+            for transport in options['transport']:
+                if options['concurrency'] > 1 and transport != 'http':
+                    self.stderr.write(f'{transport}: запити в процесі послідовні, --concurrency ігнорується')
+                result = self.run(transport, options)
+                report['transports'][transport] = result
+                self.print_result(transport, result)
+
+        if options['baseline']:
+            with open(options['baseline'], encoding='utf-8') as baseline:
+                self.print_comparison(json.load(baseline), report)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as output:
+                json.dump(report, output, ensure_ascii=False, indent=2, sort_keys=True)
+                output.write('\n')
+            self.stdout.write(f'Звіт збережено: {options["output"]}')
+
+    def prepare_data(self, seed, users):
+        """Вибірка товарів, категорій і пошукових запитів та окремий покупець на кожного віртуального користувача"""
+        # Вибірка залежить лише від seed і даних, тож звіти різних комітів порівнювані
+        rng = random.Random(seed)
+        products = Product.objects.filter(is_active=True).order_by('pk')
+        sample = list(products.values_list('id', 'slug', 'name')[:5000])
+        self.products = rng.sample(sample, min(200, len(sample)))
+        # Для оформлення — товари із запасом, щоб повторні замовлення не вичерпали склад
+        self.stocked = list(products.filter(stock__gte=100).values_list('id', flat=True)[:200])
+        self.categories = list(Category.objects.order_by('pk').values_list('slug', flat=True)[:20])
+        if not self.products or not self.stocked or not self.categories:
+            raise CommandError('Немає даних для бенчмарку: спершу виконайте seed_shop')
+        self.queries = [name.split()[0] for _, _, name in rng.sample(self.products, min(20, len(self.products)))]
+        for number in range(users):
+            user, created = User.objects.get_or_create(username=f'{USERNAME}-{number}')
+            if created or not user.check_password(PASSWORD):
+                user.set_password(PASSWORD)
+                user.save()
+            # Залишки кошика з перерваного запуску зіпсували б оформлення замовлень
+            cart = cart_for(user)
+            set_quantities(cart, dict.fromkeys(cart.items.values_list('product_id', flat=True), 0))
+
+    def meta(self, options):
+        try:
+            commit = subprocess.run(
+                ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, cwd=settings.BASE_DIR,
+            ).stdout.strip() or None
+        except OSError:
+            commit = None
+        return {
+            'commit': commit,
+            'created': timezone.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'database': connection.vendor,
+            'products': Product.objects.count(),
+            'orders': Order.objects.count(),
+            'iterations': options['iterations'],
+            'concurrency': options['concurrency'],
+        }
+
+    def run(self, transport, options):
+        recorder = Recorder()
+        users = options['concurrency'] if transport == 'http' else 1
+
+        def virtual_user(number, iterations, record):
+            rng = random.Random(options['seed'] + number)
+            scenarios = (self.browse, self.guest_cart, partial(self.customer, username=f'{USERNAME}-{number}'))
+            session = TRANSPORTS[transport](options['url'])
+            try:
+                for _ in range(iterations):
+                    for scenario in scenarios:
+                        scenario(session, record, rng)
+            finally:
+                session.close()
+
+        virtual_user(0, options['warmup'], Recorder())
+        start = time.perf_counter()
+        per_user = [options['iterations'] // users + (i < options['iterations'] % users) for i in range(users)]
+        with ThreadPoolExecutor(max_workers=users) as executor:
+            for future in [executor.submit(virtual_user, i, n, recorder) for i, n in enumerate(per_user)]:
+                future.result()
+        elapsed = time.perf_counter() - start
+
+        timings = [value for values in recorder.timings.values() for value in values]
+        return {
+            'total': {
+                'requests': len(timings),
+                'errors': sum(recorder.errors.values()),
+                'seconds': round(elapsed, 3),
+                'throughput': round(len(timings) / elapsed, 1),
+                **{key: round(value, 3) for key, value in summarize(timings).items()},
+            },
+            'routes': {
+                route: {
+                    'requests': len(values),
+                    'errors': recorder.errors.get(route, 0),
+                    **{key: round(value, 3) for key, value in summarize(values).items()},
+                }
+                for route, values in sorted(recorder.timings.items())
+            },
+        }
+
+    def browse(self, session, record, rng):
+        """Анонімний перегляд: головна, каталог, фільтри, картки товарів, пошук"""
+        _, slug, _ = rng.choice(self.products)
+        record.call(session, 'home', 'GET', '/')
+        record.call(session, 'product_list', 'GET', '/catalog/')
+        record.call(session, 'product_list', 'GET', '/catalog/', {
+            'sort': rng.choice(('price_asc', 'price_desc', 'rating', 'discount')), 'min_price': rng.randint(1, 300),
+        })
+        record.call(session, 'product_list_by_category', 'GET', f'/catalog/{rng.choice(self.categories)}/')
+        record.call(session, 'product_detail', 'GET', f'/product/{slug}/')
+        query = rng.choice(self.queries)
+        record.call(session, 'search', 'GET', '/search/', {'q': query})
+        record.call(session, 'search_autocomplete', 'GET', '/search/autocomplete/', {'q': query[:3]})
+        record.call(session, 'user_register', 'GET', '/register/')
+
+    def guest_cart(self, session, record, rng):
+        """Кошик гостя в cookie: AJAX-додавання, пакетна зміна кількостей, сторінка кошика"""
+        # Сторінка кошика видає CSRF cookie, потрібний для POST на справжньому сервері
+        record.call(session, 'cart_view', 'GET', '/cart/')
+        # Після входу кошик гостя переходить покупцю, тож і тут лише товари із запасом
+        product_ids = rng.sample(self.stocked, min(3, len(self.stocked)))
+        for product_id in product_ids:
+            record.call(session, 'add_to_cart', 'POST', f'/cart/add/{product_id}/', headers=AJAX)
+        record.call(session, 'update_cart_batch', 'POST', '/cart/batch/', {'operations': [
+            {'product_id': product_id, 'quantity': rng.randint(0, 3)} for product_id in product_ids
+        ]}, as_json=True)
+        record.call(session, 'cart_view', 'GET', '/cart/')
+
+    def customer(self, session, record, rng, username):
+        """Покупець: вхід, кошик, оформлення замовлення, кабінет, вихід"""
+        record.call(session, 'user_login', 'GET', '/login/')
+        record.call(session, 'user_login', 'POST', '/login/', {'username': username, 'password': PASSWORD},
+                    expect=(302,))
+        product_ids = rng.sample(self.stocked, min(3, len(self.stocked)))
+        for product_id in product_ids:
+            record.call(session, 'add_to_cart', 'POST', f'/cart/add/{product_id}/', headers=AJAX)
+        state = record.call(session, 'update_cart_batch', 'POST', '/cart/batch/', {'operations': [
+            {'product_id': product_id, 'quantity': 2} for product_id in product_ids
+        ]}, as_json=True)
+        item_ids = list(state.json().get('items', {})) if state.status == 200 else []
+        if len(item_ids) > 1:
+            record.call(session, 'update_cart_item', 'POST', f'/cart/update/{item_ids[0]}/', {'quantity': 1},
+                        headers=AJAX)
+            record.call(session, 'remove_from_cart', 'POST', f'/cart/remove/{item_ids[-1]}/', headers=AJAX)
+        record.call(session, 'cart_view', 'GET', '/cart/')
+        record.call(session, 'checkout', 'GET', '/checkout/')
+        order = record.call(session, 'checkout', 'POST', '/checkout/', SHIPPING, expect=(302,))
+        record.call(session, 'order_list', 'GET', '/orders/')
+        if '/orders/' in order.location:
+            record.call(session, 'order_detail', 'GET', '/orders/' + order.location.split('/orders/')[1])
+        else:
+            # Замість замовлення — повернення в кошик (нестача товару чи порожній кошик)
+            record.fail('checkout')
+        record.call(session, 'user_profile', 'GET', '/profile/')
+        record.call(session, 'change_password', 'GET', '/change-password/')
+        record.call(session, 'user_logout', 'GET', '/logout/', expect=(302,))
+
+    def print_result(self, transport, result):
+        total = result['total']
+        self.stdout.write(self.style.MIGRATE_HEADING(
+            f'{transport}: {total["requests"]} запитів за {total["seconds"]:.1f} с, '
+            f'{total["throughput"]:.1f} запит/с, помилок: {total["errors"]}'
+        ))
+        self.stdout.write(f'{"маршрут":<26} {"запитів":>8} {"p50, мс":>9} {"p95, мс":>9} {"p99, мс":>9} {"помилок":>8}')
+        for route, stats in result['routes'].items():
+            self.stdout.write(
+                f'{route:<26} {stats["requests"]:>8} {stats["p50"]:>9.2f} {stats["p95"]:>9.2f} '
+                f'{stats["p99"]:>9.2f} {stats["errors"]:>8}'
+            )
+
+    def print_comparison(self, baseline, report):
+        label = baseline['meta'].get('commit') or 'базовим звітом'
+        self.stdout.write(self.style.MIGRATE_HEADING(f'Порівняння з {label}'))
+        self.stdout.write(f'{"маршрут":<32} {"p50 було":>9} {"p50 стало":>10} {"зміна":>8} {"p95 зміна":>10}')
+        for transport, result in report['transports'].items():
+            previous = baseline['transports'].get(transport, {}).get('routes', {})
+            for route, stats in result['routes'].items():
+                if route not in previous:
+                    continue
+                before = previous[route]
+                change = (stats['p50'] - before['p50']) / before['p50'] if before['p50'] else 0
+                change_p95 = (stats['p95'] - before['p95']) / before['p95'] if before['p95'] else 0
+                self.stdout.write(
+                    f'{transport + ":" + route:<32} {before["p50"]:>9.2f} {stats["p50"]:>10.2f} '
+                    f'{change:>+8.1%} {change_p95:>+10.1%}'
+                )
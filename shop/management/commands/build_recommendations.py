@@ -0,0 +1,30 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from shop.recommendations import Builder
+
+
+class Command(BaseCommand):
+    help = ('Рахує «часто купують разом» зі спільних покупок: без --rebuild враховує лише нові замовлення. '
+            'Запускайте періодично (cron)')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rebuild', action='store_true',
+                            help='Перерахувати всі замовлення заново (періодично, наприклад щотижня)')
+        parser.add_argument('--chunk-size', type=int, default=2000, help='Розмір пакета читання з бази')
+        parser.add_argument('--max-pairs', type=int, default=200000,
+                            help='Скільки пар тримати в пам\'яті до запису в базу')
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+
+        def progress(builder):
+            self.stdout.write(f'  замовлень {builder.orders}, пар {builder.pairs}', ending='\r')
+
+        builder = Builder(options['chunk_size'], options['max_pairs'], progress).run(rebuild=options['rebuild'])
+        self.stdout.write('')
+        self.stdout.write(self.style.SUCCESS(
+            f'Враховано замовлень {builder.orders}, записано пар {builder.pairs}, '
+            f'оновлено рекомендацій для {builder.products} товарів за {time.monotonic() - started:.1f} с'
+        ))
@@ -0,0 +1,33 @@
+import sys
+
+from django.core.management.base import BaseCommand
+
+from shop.catalog_io import FORMATS, export_rows, guess_format, write_rows
+from shop.models import Product
+
+
+class Command(BaseCommand):
+    help = 'Експортує товари в CSV чи JSONL потоково: пам\'ять не залежить від розміру каталогу'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', nargs='?', default='-', help='Файл для експорту («-» — стандартний вивід)')
+        parser.add_argument('--format', choices=FORMATS, help='Формат файлу (за замовчуванням — за розширенням)')
+        parser.add_argument('--chunk-size', type=int, default=2000, help='Розмір пакета читання з бази')
+        parser.add_argument('--category', help='Лише товари категорії з цим slug')
+        parser.add_argument('--active-only', action='store_true', help='Лише активні товари')
+
+    def handle(self, *args, **options):
+        products = Product.objects.all()
+        if options['category']:
+            products = products.filter(category__slug=options['category'])
+        if options['active_only']:
+            products = products.filter(is_active=True)
+
+        fmt = options['format'] or guess_format(options['path'])
+        rows = export_rows(products, options['chunk_size'])
+        if options['path'] == '-':
+            write_rows(sys.stdout, rows, fmt)
+            return
+        with open(options['path'], 'w', encoding='utf-8', newline='') as stream:
+            total = write_rows(stream, rows, fmt)
+        self.stdout.write(self.style.SUCCESS(f'Експортовано товарів: {total}'))
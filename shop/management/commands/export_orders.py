@@ -0,0 +1,48 @@
+import sys
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from shop.catalog_io import guess_format
+from shop.models import Order
+from shop.order_export import FORMATS, filter_orders, order_chunks, render
+
+STATUSES = [status for status, _ in Order.STATUS_CHOICES]
+
+
+def parse_date(value):
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        raise CommandError(f'Некоректна дата «{value}», очікується РРРР-ММ-ДД')
+
+
+class Command(BaseCommand):
+    help = 'Експортує замовлення з рядками в CSV чи JSONL потоково: пам\'ять не залежить від кількості замовлень'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', nargs='?', default='-', help='Файл для експорту («-» — стандартний вивід)')
+        parser.add_argument('--format', choices=FORMATS, help='Формат файлу (за замовчуванням — за розширенням)')
+        parser.add_argument('--chunk-size', type=int, default=2000, help='Розмір пакета читання з бази')
+        parser.add_argument('--since', type=parse_date, help='Від дати РРРР-ММ-ДД включно')
+        parser.add_argument('--until', type=parse_date, help='До дати РРРР-ММ-ДД включно')
+        parser.add_argument('--status', action='append', choices=STATUSES, help='Статус (можна вказати кілька разів)')
+
+    def handle(self, *args, **options):
+        orders = filter_orders(Order.objects.all(), options['since'], options['until'], options['status'])
+        fmt = options['format'] or guess_format(options['path'])
+        chunks = order_chunks(orders, options['chunk_size'])
+        if options['path'] == '-':
+            for text in render(chunks, fmt):
+                sys.stdout.write(text)
+            return
+        with open(options['path'], 'w', encoding='utf-8', newline='') as stream:
+            for text in render(self.counted(chunks), fmt):
+                stream.write(text)
+        self.stdout.write(self.style.SUCCESS(f'Експортовано замовлень: {self.total}'))
+
+    def counted(self, chunks):
+        self.total = 0
+        for orders in chunks:
+            self.total += len(orders)
+            yield orders
@@ -0,0 +1,80 @@
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, as_completed, wait
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from shop.cache import bump_catalog_version
+from shop.images import delete_stale_variants, generate_variants, init_worker
+from shop.models import Category, Product, ProductImage
+
+MODELS = (Product, ProductImage, Category)
+
+
+class Command(BaseCommand):
+    help = ('Створює варіанти зображень для наявних товарів, галерей і категорій. '
+            'Оброблені записи та вже створені файли пропускаються, тож перерваний запуск можна продовжити')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=getattr(settings, 'SHOP_IMAGE_WORKERS', 2) or 1,
+                            help='Кількість процесів')
+        parser.add_argument('--force', action='store_true', help='Перегенерувати всі варіанти')
+        parser.add_argument('--chunk-size', type=int, default=2000, help='Скільки записів читати з бази за раз')
+        parser.add_argument('--progress-every', type=int, default=100, help='Як часто виводити прогрес')
+
+    def pending(self, model, force, chunk_size):
+        """(модель, pk, ім'я файлу, поточні варіанти) записів без актуальних варіантів"""
+        rows = model.objects.exclude(image='').exclude(image__isnull=True).order_by('pk')
+        for pk, name, variants in rows.values_list('pk', 'image', 'image_variants').iterator(chunk_size=chunk_size):
+            if force or (variants or {}).get('name') != name:
+                yield model, pk, name, variants or {}
+
+    def handle(self, *args, **options):
+        force, chunk_size = options['force'], options['chunk_size']
+        # Окремий прохід лише рахує записи: у пам'яті не тримається жоден список задач
+        self.total = sum(1 for model in MODELS for _ in self.pending(model, force, chunk_size))
+        self.stdout.write(f'Зображень до обробки: {self.total}')
+        if not self.total:
+            return
+
+        self.done = self.failed = self.removed = 0
+        self.progress_every = options['progress_every']
+        self.start = time.monotonic()
+        # Не більше кількох задач на процес: решта записів ще не прочитана з бази
+        max_pending = options['workers'] * 4
+        futures = {}
+        with ProcessPoolExecutor(max_workers=options['workers'], initializer=init_worker) as executor:
+            for model in MODELS:
+                for task in self.pending(model, force, chunk_size):
+                    futures[executor.submit(generate_variants, task[2], force)] = task
+                    if len(futures) >= max_pending:
+                        self.collect(futures, wait(futures, return_when=FIRST_COMPLETED).done)
+            self.collect(futures, as_completed(list(futures)))
+
+        if self.removed:
+            # Кешовані сторінки можуть посилатися на видалені файли
+            bump_catalog_version()
+        self.stdout.write(self.style.SUCCESS(
+            f'Створено варіанти для {self.done} зображень, видалено застарілих файлів: {self.removed}, '
+            f'помилок: {self.failed}'
+        ))
+
+    def collect(self, futures, completed):
+        for future in completed:
+            model, pk, name, old = futures.pop(future)
+            try:
+                variants = future.result()
+            except Exception as exc:
+                self.failed += 1
+                self.stderr.write(f'{name}: {exc}')
+            else:
+                # Зберігаємо одразу, щоб після переривання не обробляти запис повторно
+                if model.objects.filter(pk=pk, image=name).update(image_variants=variants):
+                    self.removed += delete_stale_variants(model, pk, old, variants)
+                self.done += 1
+            processed = self.done + self.failed
+            if processed % self.progress_every == 0 or processed == self.total:
+                elapsed = time.monotonic() - self.start
+                self.stdout.write(
+                    f'{processed}/{self.total} ({processed / elapsed:.1f} зобр./с), помилок: {self.failed}'
+                )
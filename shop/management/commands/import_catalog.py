@@ -0,0 +1,71 @@
+import csv
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from shop import search
+from shop.catalog_io import FIELDS, FORMATS, Importer, guess_format, read_rows
+
+
+class Command(BaseCommand):
+    help = ('Імпортує товари з CSV чи JSONL (колонки: ' + ', '.join(FIELDS) + '). Товари з наявним slug '
+            'оновлюються лише в присутніх колонках, без slug — створюються. Помилкові рядки пропускаються')
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Файл для імпорту («-» — стандартний ввід)')
+        parser.add_argument('--format', choices=FORMATS, help='Формат файлу (за замовчуванням — за розширенням)')
+        parser.add_argument('--chunk-size', type=int, default=2000, help='Розмір пакета')
+        parser.add_argument('--create-categories', action='store_true', help='Створювати відсутні категорії')
+        parser.add_argument('--errors', help='Файл CSV для помилок рядків (за замовчуванням — stderr)')
+        parser.add_argument('--rebuild-search-index', action='store_true',
+                            help='Перебудувати пошуковий індекс після імпорту замість оновлення по пакетах '
+                                 '(швидше для великих файлів)')
+
+    def handle(self, *args, **options):
+        fmt = options['format'] or guess_format(options['path'])
+        errors_file = open(options['errors'], 'w', encoding='utf-8', newline='') if options['errors'] else None
+        errors = csv.writer(errors_file) if errors_file else None
+        if errors:
+            errors.writerow(['line', 'error'])
+
+        def on_error(number, message):
+            if errors:
+                errors.writerow([number, message])
+            else:
+                self.stderr.write(f'Рядок {number}: {message}')
+
+        start = time.monotonic()
+
+        def progress(importer):
+            elapsed = time.monotonic() - start
+            done = importer.created + importer.updated
+            self.stdout.write(
+                f'  створено {importer.created}, оновлено {importer.updated}, помилок {importer.errors} '
+                f'({done / elapsed if elapsed else 0:.0f} рядків/с)', ending='\r'
+            )
+
+        try:
+            stream = sys.stdin if options['path'] == '-' else open(options['path'], encoding='utf-8-sig', newline='')
+        except OSError as error:
+            raise CommandError(error)
+        rebuild = options['rebuild_search_index']
+        importer = Importer(options['create_categories'], options['chunk_size'], on_error, index=not rebuild)
+        try:
+            with stream:
+                importer.run(read_rows(stream, fmt), progress)
+        finally:
+            if errors_file:
+                errors_file.close()
+        if rebuild and (importer.created or importer.updated):
+            self.stdout.write('')
+            self.stdout.write('Перебудова пошукового індексу...')
+            with transaction.atomic():
+                search.rebuild_index()
+
+        self.stdout.write('')
+        self.stdout.write(self.style.SUCCESS(
+            f'Створено {importer.created}, оновлено {importer.updated}, помилок {importer.errors} '
+            f'за {time.monotonic() - start:.1f} с. Варіанти нових зображень: manage.py generate_image_variants'
+        ))
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from shop import search
+
+
+class Command(BaseCommand):
+    help = 'Повністю перебудовує повнотекстовий індекс товарів (SQLite FTS5)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=5000, help='Розмір пакета вставки')
+
+    def handle(self, *args, **options):
+        if not search.fts_enabled():
+            raise CommandError('Повнотекстовий індекс підтримується лише на SQLite')
+        with transaction.atomic():
+            total = search.rebuild_index(chunk_size=options['chunk_size'])
+        self.stdout.write(self.style.SUCCESS(f'Проіндексовано товарів: {total}'))
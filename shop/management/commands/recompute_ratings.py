@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from shop.ratings import recompute
+
+
+class Command(BaseCommand):
+    help = 'Звіряє рейтинги товарів зі схваленими відгуками та виправляє розбіжності'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=1000, help='Кількість товарів в одному пакеті')
+
+    def handle(self, *args, **options):
+        fixed = recompute(chunk_size=options['chunk_size'])
+        self.stdout.write(self.style.SUCCESS(f'Виправлено рейтинги товарів: {fixed}'))
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from shop.inventory import recount_reserved, release_expired
+
+
+class Command(BaseCommand):
+    help = 'Знімає прострочені резерви товарів у кошиках (запускати періодично, наприклад з cron)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Кількість резервів в одній транзакції')
+        parser.add_argument('--recount', action='store_true',
+                            help='Додатково перерахувати лічильники резервів товарів з нуля')
+
+    def handle(self, *args, **options):
+        released = release_expired(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Знято прострочених резервів: {released}'))
+        if options['recount']:
+            updated = recount_reserved()
+            self.stdout.write(self.style.SUCCESS(f'Перераховано резерви для товарів: {updated}'))
@@ -0,0 +1,28 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from shop import sales
+
+
+class Command(BaseCommand):
+    help = ('Оновлює щоденні зведення продажів: без --rebuild перераховує лише дні з новими, зміненими '
+            'чи видаленими замовленнями. Запускайте періодично (cron)')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rebuild', action='store_true', help='Перерахувати всю історію заново')
+        parser.add_argument('--workers', type=int, default=4, help='Потоків для читання з --rebuild')
+        parser.add_argument('--chunk-days', type=int, default=7, help='Днів в одному пакеті з --rebuild')
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+
+        def progress(done, total):
+            self.stdout.write(f'  днів {done} з {total}', ending='\r')
+
+        if options['rebuild']:
+            days = sales.rebuild(options['workers'], options['chunk_days'], progress)
+        else:
+            days = sales.update(progress)
+        self.stdout.write('')
+        self.stdout.write(self.style.SUCCESS(f'Перераховано днів: {days} за {time.monotonic() - started:.1f} с'))
@@ -0,0 +1,246 @@
+import random
+import time
+from contextlib import contextmanager
+from datetime import timedelta
+from decimal import Decimal
+from io import BytesIO
+from itertools import accumulate
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+from shop import search
+from shop.cache import bump_catalog_version
+from shop.images import generate_variants
+from shop.models import RATING_FIELDS, Cart, CartItem, Category, Order, OrderItem, Product, Review
+
+from ._bench import WORDS, vocabulary
+
+PREFIX = 'seed'
+PASSWORD = 'seed-password'
+COLORS = (
+    (52, 101, 164), (204, 0, 0), (78, 154, 6), (196, 160, 0),
+    (117, 80, 123), (206, 92, 0), (85, 87, 83), (6, 152, 154),
+)
+STATUSES = [status for status, _ in Order.STATUS_CHOICES]
+STATUS_WEIGHTS = (5, 5, 5, 10, 70, 5)
+
+
+@contextmanager
+def explicit_timestamps(model, *names):
+    """Дозволяє bulk_create записати задані дати замість auto_now/auto_now_add"""
+    fields = [model._meta.get_field(name) for name in names]
+    saved = [(field.auto_now, field.auto_now_add) for field in fields]
+    for field in fields:
+        field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, (auto_now, auto_now_add) in zip(fields, saved):
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+class Command(BaseCommand):
+    help = ('Генерує синтетичний магазин: категорії, товари із зображеннями, користувачів, кошики, '
+            'замовлення та відгуки. Вставки пакетні, тож 1 млн товарів і замовлень займає хвилини')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--categories', type=int, default=50)
+        parser.add_argument('--products', type=int, default=10000)
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--carts', type=int, default=500, help='Скільки користувачів мають непорожній кошик')
+        parser.add_argument('--orders', type=int, default=10000)
+        parser.add_argument('--reviews', type=int, default=20000)
+        parser.add_argument('--images', type=int, default=len(COLORS),
+                            help='Кількість різних зображень-заглушок (зі своїми варіантами)')
+        parser.add_argument('--days', type=int, default=365, help='За скільки останніх днів розподілити замовлення')
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        if Category.objects.filter(slug__startswith=f'{PREFIX}-').exists():
+            raise CommandError('Синтетичні дані вже згенеровано в цій базі')
+        if options['products'] < 1 or options['categories'] < 1 or options['users'] < 1:
+            raise CommandError('Потрібні хоча б одна категорія, один товар і один користувач')
+        self.rng = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        started = time.monotonic()
+
+        with self.stage('Зображення'):
+            images = self.seed_images(max(options['images'], 1))
+        with self.stage('Категорії'):
+            categories = self.seed_categories(options['categories'])
+        with self.stage('Користувачі'):
+            users = self.seed_users(options['users'])
+        # Відгуки плануються до товарів, щоб гістограми рейтингів записалися разом з товарами
+        reviews = self.plan_reviews(options['reviews'], options['products'], users)
+        with self.stage('Товари'):
+            products = self.seed_products(options['products'], categories, images, reviews)
+        with self.stage('Відгуки'):
+            self.seed_reviews(reviews, products)
+        with self.stage('Кошики'):
+            self.seed_carts(users[:options['carts']], products)
+        with self.stage('Замовлення'):
+            self.seed_orders(options['orders'], users, products, options['days'])
+        with self.stage('Пошуковий індекс'):
+            with transaction.atomic():
+                search.rebuild_index(chunk_size=self.batch_size)
+            bump_catalog_version()
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Готово за {time.monotonic() - started:.0f} с. Пароль користувачів {PREFIX}-user-N: {PASSWORD}'
+        ))
+
+    @contextmanager
+    def stage(self, label):
+        self.stdout.write(f'{label}...')
+        start = time.monotonic()
+        yield
+        self.stdout.write(f'  {time.monotonic() - start:.1f} с')
+
+    def batches(self, total):
+        """Діапазони номерів по batch_size, кожен у своїй транзакції"""
+        for start in range(0, total, self.batch_size):
+            with transaction.atomic():
+                yield range(start, min(start + self.batch_size, total))
+            self.stdout.write(f'  {min(start + self.batch_size, total)}/{total}', ending='\r')
+        self.stdout.write('')
+
+    def seed_images(self, count):
+        """Однотонні JPEG у сховищі та їхні варіанти: [(ім'я, варіанти), ...]"""
+        from PIL import Image
+
+        images = []
+        for i in range(count):
+            name = f'products/{PREFIX}-{i}.jpg'
+            if not default_storage.exists(name):
+                buffer = BytesIO()
+                Image.new('RGB', (1200, 900), COLORS[i % len(COLORS)]).save(buffer, 'JPEG', quality=80)
+                name = default_storage.save(name, ContentFile(buffer.getvalue()))
+            images.append((name, generate_variants(name)))
+        return images
+
+    def seed_categories(self, count):
+        return Category.objects.bulk_create(
+            Category(name=f'{self.rng.choice(WORDS).capitalize()} {i}', slug=f'{PREFIX}-category-{i}')
+            for i in range(count)
+        )
+
+    def seed_products(self, count, categories, images, reviews):
+        """Повертає [(id, фінальна ціна), ...] у порядку створення"""
+        words = vocabulary(self.rng)
+        # Розподіл Ципфа: кілька слів трапляються часто, більшість — рідко
+        cum_weights = list(accumulate(1 / rank for rank in range(1, len(words) + 1)))
+        histograms = {}
+        for number, _, rating, approved in reviews:
+            if approved:
+                histograms.setdefault(number, [0] * len(RATING_FIELDS))[rating - 1] += 1
+        products = []
+        for numbers in self.batches(count):
+            batch = []
+            for i in numbers:
+                words_in_description = self.rng.randint(20, 120)
+                price = Decimal(self.rng.randint(100, 100000)) / 100
+                image, variants = images[i % len(images)]
+                batch.append(Product(
+                    name=' '.join(self.rng.choices(words, cum_weights=cum_weights, k=3)).capitalize() + f' {i}',
+                    slug=f'{PREFIX}-product-{i}',
+                    description=' '.join(self.rng.choices(words, cum_weights=cum_weights, k=words_in_description)),
+                    category=categories[i % len(categories)],
+                    price=price,
+                    discount_price=(price * Decimal('0.8')).quantize(Decimal('0.01')) if i % 5 == 0 else None,
+                    stock=self.rng.choice((0, 3, 10, 50, 200, 1000)),
+                    is_active=i % 50 != 1,
+                    is_featured=i % 100 == 0,
+                    image=image,
+                    image_variants=variants,
+                    **dict(zip(RATING_FIELDS, histograms.get(i, ()))),
+                ))
+            Product.objects.bulk_create(batch)
+            products += [(product.pk, product.final_price) for product in batch]
+        return products
+
+    def seed_users(self, count):
+        """Повертає id користувачів; пароль у всіх однаковий, тож хешується один раз"""
+        password = make_password(PASSWORD)
+        users = []
+        for numbers in self.batches(count):
+            batch = User.objects.bulk_create(
+                User(username=f'{PREFIX}-user-{i}', email=f'{PREFIX}-user-{i}@example.com', password=password)
+                for i in numbers
+            )
+            users += [user.pk for user in batch]
+        return users
+
+    def pick(self, count):
+        # Квадрат рівномірного розподілу: перші товари купують і оцінюють значно частіше за решту
+        return int(count * self.rng.random() ** 2)
+
+    def seed_carts(self, users, products):
+        for numbers in self.batches(len(users)):
+            carts = Cart.objects.bulk_create(Cart(user_id=users[i]) for i in numbers)
+            CartItem.objects.bulk_create(
+                CartItem(cart=cart, product_id=product_id, quantity=self.rng.randint(1, 3))
+                for cart in carts
+                for product_id in {products[self.pick(len(products))][0] for _ in range(self.rng.randint(1, 5))}
+            )
+
+    def seed_orders(self, count, users, products, days):
+        now = timezone.now()
+        with explicit_timestamps(Order, 'created_at', 'updated_at'):
+            for numbers in self.batches(count):
+                orders = []
+                lines = []
+                for i in numbers:
+                    items = {}
+                    for _ in range(self.rng.randint(1, 4)):
+                        product_id, price = products[self.pick(len(products))]
+                        items[product_id] = (price, self.rng.randint(1, 3))
+                    created_at = now - timedelta(seconds=self.rng.randint(0, days * 24 * 60 * 60))
+                    orders.append(Order(
+                        user_id=self.rng.choice(users),
+                        order_number=f'{PREFIX.upper()}{i:08d}',
+                        status=self.rng.choices(STATUSES, STATUS_WEIGHTS)[0],
+                        total_amount=sum(price * quantity for price, quantity in items.values()),
+                        shipping_address=f'вул. Тестова, {i % 200 + 1}',
+                        shipping_city=self.rng.choice(('Київ', 'Львів', 'Одеса', 'Харків', 'Дніпро')),
+                        shipping_zip_code=f'{self.rng.randint(1000, 99999):05d}',
+                        shipping_phone=f'+380{self.rng.randint(10 ** 8, 10 ** 9 - 1)}',
+                        created_at=created_at,
+                        updated_at=created_at,
+                    ))
+                    lines.append(items)
+                Order.objects.bulk_create(orders)
+                # bulk_create не викликає OrderItem.save(), тому total_price рахуємо тут
+                OrderItem.objects.bulk_create(
+                    OrderItem(order=order, product_id=product_id, quantity=quantity, price=price,
+                              total_price=price * quantity)
+                    for order, items in zip(orders, lines)
+                    for product_id, (price, quantity) in items.items()
+                )
+
+    def plan_reviews(self, count, products, users):
+        """[(номер товару, id користувача, оцінка, схвалено), ...]; пара товар-користувач унікальна"""
+        planned = {}
+        for _ in range(count):
+            pair = (self.pick(products), self.rng.choice(users))
+            if pair not in planned:
+                planned[pair] = (self.rng.choices((1, 2, 3, 4, 5), (5, 5, 10, 30, 50))[0], self.rng.random() < 0.9)
+        return [(number, user_id, rating, approved) for (number, user_id), (rating, approved) in planned.items()]
+
+    def seed_reviews(self, reviews, products):
+        for numbers in self.batches(len(reviews)):
+            Review.objects.bulk_create(
+                Review(
+                    product_id=products[reviews[i][0]][0], user_id=reviews[i][1], rating=reviews[i][2],
+                    title=self.rng.choice(('Добре', 'Чудово', 'Так собі', 'Рекомендую', 'Не сподобалось')),
+                    comment=' '.join(self.rng.choices(WORDS, k=self.rng.randint(5, 30))),
+                    is_approved=reviews[i][3],
+                )
+                for i in numbers
+            )
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.6 on 2026-10-17 02:01
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='reserved',
+            field=models.PositiveIntegerField(default=0, verbose_name='Зарезервовано в кошиках'),
+        ),
+        migrations.CreateModel(
+            name='StockReservation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('quantity', models.PositiveIntegerField(verbose_name='Кількість')),
+                ('expires_at', models.DateTimeField(db_index=True, verbose_name='Діє до')),
+                ('cart', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reservations', to='shop.cart', verbose_name='Кошик')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reservations', to='shop.product', verbose_name='Товар')),
+            ],
+            options={
+                'verbose_name': 'Резерв товару',
+                'verbose_name_plural': 'Резерви товарів',
+                'unique_together': {('cart', 'product')},
+            },
+        ),
+    ]
@@ -0,0 +1,57 @@
+# Повнотекстовий індекс товарів (SQLite FTS5)
+
+import re
+import unicodedata
+
+from django.db import migrations
+
+# Копія з shop/search.py на момент міграції: пізніші зміни модуля не повинні змінювати історичну міграцію
+FTS_TABLE = 'shop_product_fts'
+CREATE_SQL = (
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+    "name, category, description, "
+    "tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3 4')"
+)
+DROP_SQL = f'DROP TABLE IF EXISTS {FTS_TABLE}'
+APOSTROPHES = re.compile("['’ʼ`´]")
+FOLD = str.maketrans({'ґ': 'г', 'ё': 'е'})
+
+
+def normalize(text):
+    text = unicodedata.normalize('NFKC', text or '').casefold()
+    return APOSTROPHES.sub('', text).translate(FOLD)
+
+
+def create_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    Product = apps.get_model('shop', 'Product')
+    schema_editor.execute(CREATE_SQL)
+    insert_sql = f'INSERT INTO {FTS_TABLE} (rowid, name, category, description) VALUES (%s, %s, %s, %s)'
+    rows = []
+    with schema_editor.connection.cursor() as cursor:
+        for product in Product.objects.select_related('category').iterator(chunk_size=5000):
+            rows.append((
+                product.pk, normalize(product.name), normalize(product.category.name), normalize(product.description)
+            ))
+            if len(rows) >= 5000:
+                cursor.executemany(insert_sql, rows)
+                rows = []
+        if rows:
+            cursor.executemany(insert_sql, rows)
+
+
+def drop_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        schema_editor.execute(DROP_SQL)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0002_product_reserved_stockreservation'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_index, drop_index),
+    ]
@@ -0,0 +1,94 @@
+# Generated by Django 5.2.6 on 2026-10-17 02:27
+
+import django.db.models.expressions
+import django.db.models.functions.comparison
+import django.db.models.functions.math
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def fill_ratings(apps, schema_editor):
+    """Заповнює гістограми оцінок з уже схвалених відгуків"""
+    Product = apps.get_model('shop', 'Product')
+    Review = apps.get_model('shop', 'Review')
+    histograms = {}
+    rows = Review.objects.filter(is_approved=True).values_list('product_id', 'rating').annotate(total=Count('id'))
+    for product_id, rating, total in rows.order_by():
+        histograms.setdefault(product_id, {})[f'rating_{rating}'] = total
+    for product_id, values in histograms.items():
+        Product.objects.filter(pk=product_id).update(**values)
+
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0004_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='product',
+            name='product_active_created_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='product',
+            name='product_active_price_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='product',
+            name='product_active_name_idx',
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='rating_1',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Оцінок 1'),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='rating_2',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Оцінок 2'),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='rating_3',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Оцінок 3'),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='rating_4',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Оцінок 4'),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='rating_5',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Оцінок 5'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['-created_at', '-id'], name='product_active_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['price', 'id'], name='product_active_price_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['name', 'id'], name='product_active_name_idx'),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='rating_avg',
+            field=models.GeneratedField(db_persist=True, expression=models.Case(models.When(rating_1=0, rating_2=0, rating_3=0, rating_4=0, rating_5=0, then=models.Value(0.0)), default=django.db.models.functions.math.Round(django.db.models.expressions.CombinedExpression(django.db.models.functions.comparison.Cast(django.db.models.expressions.CombinedExpression(django.db.models.expressions.CombinedExpression(django.db.models.expressions.CombinedExpression(django.db.models.expressions.CombinedExpression(models.F('rating_1'), '+', django.db.models.expressions.CombinedExpression(models.Value(2), '*', models.F('rating_2'))), '+', django.db.models.expressions.CombinedExpression(models.Value(3), '*', models.F('rating_3'))), '+', django.db.models.expressions.CombinedExpression(models.Value(4), '*', models.F('rating_4'))), '+', django.db.models.expressions.CombinedExpression(models.Value(5), '*', models.F('rating_5'))), models.FloatField()), '/', django.db.models.expressions.CombinedExpression(django.db.models.expressions.CombinedExpression(django.db.models.expressions.CombinedExpression(django.db.models.expressions.CombinedExpression(models.F('rating_1'), '+', models.F('rating_2')), '+', models.F('rating_3')), '+', models.F('rating_4')), '+', models.F('rating_5'))), 2), output_field=models.FloatField()), output_field=models.FloatField(), verbose_name='Середня оцінка'),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='rating_count',
+            field=models.GeneratedField(db_persist=True, expression=django.db.models.expressions.CombinedExpression(django.db.models.expressions.CombinedExpression(django.db.models.expressions.CombinedExpression(django.db.models.expressions.CombinedExpression(models.F('rating_1'), '+', models.F('rating_2')), '+', models.F('rating_3')), '+', models.F('rating_4')), '+', models.F('rating_5')), output_field=models.PositiveIntegerField(), verbose_name='Кількість відгуків'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['-rating_avg', '-rating_count', '-id'], name='product_active_rating_idx'),
+        ),
+        migrations.RunPython(fill_ratings, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.2.6 on 2026-10-17 02:28
+
+import django.db.models.expressions
+import django.db.models.functions.comparison
+from decimal import Decimal
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0005_product_ratings'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='product',
+            name='product_active_price_idx',
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='discount_percent',
+            field=models.GeneratedField(db_persist=True, expression=models.Case(models.When(discount_price__gt=0, discount_price__lt=models.F('price'), then=django.db.models.functions.comparison.Cast(models.ExpressionWrapper(django.db.models.expressions.CombinedExpression(django.db.models.expressions.CombinedExpression(django.db.models.expressions.CombinedExpression(django.db.models.expressions.CombinedExpression(models.F('price'), '-', models.F('discount_price')), '*', models.Value(100)), '/', models.F('price')), '+', models.Value(Decimal('0.000001'))), output_field=models.DecimalField(decimal_places=6, max_digits=12)), models.IntegerField())), default=models.Value(0), output_field=models.IntegerField()), output_field=models.PositiveSmallIntegerField(), verbose_name='Знижка, %'),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='effective_price',
+            field=models.GeneratedField(db_persist=True, expression=models.Case(models.When(discount_price__gt=0, then=models.F('discount_price')), default=models.F('price'), output_field=models.DecimalField(decimal_places=2, max_digits=10)), output_field=models.DecimalField(decimal_places=2, max_digits=10), verbose_name='Фінальна ціна'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['effective_price', 'id'], name='product_active_price_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['-discount_percent', '-id'], name='product_active_discount_idx'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.6 on 2026-10-17 02:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0006_effective_price'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['category', 'effective_price', 'discount_percent', 'rating_avg', 'is_featured', 'stock', 'reserved'], name='product_active_facets_idx'),
+        ),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 5.2.6 on 2026-10-17 02:50
+
+import django.db.models.functions.text
+import django.db.models.lookups
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0008_image_variants'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='short_description',
+            field=models.GeneratedField(db_persist=True, expression=models.Case(models.When(django.db.models.lookups.GreaterThan(django.db.models.functions.text.Length('description'), 80), then=django.db.models.functions.text.Concat(django.db.models.functions.text.Substr('description', 1, 79), models.Value('…'))), default=models.F('description'), output_field=models.CharField(max_length=80)), output_field=models.CharField(max_length=80), verbose_name='Короткий опис'),
+        ),
+    ]
@@ -0,0 +1,56 @@
+# Generated by Django 5.2.6 on 2026-10-17 03:27
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0010_admin_list_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecommendationState',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('last_order_id', models.PositiveBigIntegerField(default=0, verbose_name='Останнє враховане замовлення')),
+                ('orders', models.PositiveIntegerField(default=0, verbose_name='Враховано замовлень')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Дата оновлення')),
+            ],
+            options={
+                'verbose_name': 'Стан рекомендацій',
+                'verbose_name_plural': 'Стан рекомендацій',
+            },
+        ),
+        migrations.CreateModel(
+            name='ProductPair',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('orders', models.PositiveIntegerField(verbose_name='Замовлень')),
+                ('other', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='shop.product', verbose_name='Інший товар')),
+                ('product', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='shop.product', verbose_name='Товар')),
+            ],
+            options={
+                'verbose_name': 'Пара товарів у замовленнях',
+                'verbose_name_plural': 'Пари товарів у замовленнях',
+                'constraints': [models.UniqueConstraint(fields=('product', 'other'), name='product_pair_unique')],
+            },
+        ),
+        migrations.CreateModel(
+            name='ProductRecommendation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('rank', models.PositiveSmallIntegerField(verbose_name='Позиція')),
+                ('score', models.FloatField(verbose_name='Оцінка')),
+                ('product', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='recommendations', to='shop.product', verbose_name='Товар')),
+                ('recommended', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='recommended_in', to='shop.product', verbose_name='Рекомендований товар')),
+            ],
+            options={
+                'verbose_name': 'Рекомендація',
+                'verbose_name_plural': 'Рекомендації',
+                'constraints': [models.UniqueConstraint(fields=('product', 'rank'), name='recommendation_product_rank_unique')],
+            },
+        ),
+    ]
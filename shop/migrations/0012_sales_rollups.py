@@ -0,0 +1,104 @@
+# Generated by Django 5.2.6 on 2026-10-17 03:31
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0011_recommendations'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyCategorySales',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField(verbose_name='День')),
+                ('orders', models.PositiveIntegerField(default=0, verbose_name='Замовлень')),
+                ('units', models.PositiveIntegerField(default=0, verbose_name='Одиниць')),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name='Виручка')),
+            ],
+            options={
+                'verbose_name': 'Продажі категорії за день',
+                'verbose_name_plural': 'Продажі категорій за днями',
+                'ordering': ['-day'],
+                'abstract': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='DailyProductSales',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField(verbose_name='День')),
+                ('orders', models.PositiveIntegerField(default=0, verbose_name='Замовлень')),
+                ('units', models.PositiveIntegerField(default=0, verbose_name='Одиниць')),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name='Виручка')),
+            ],
+            options={
+                'verbose_name': 'Продажі товару за день',
+                'verbose_name_plural': 'Продажі товарів за днями',
+                'ordering': ['-day'],
+                'abstract': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='DailySales',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField(verbose_name='День')),
+                ('orders', models.PositiveIntegerField(default=0, verbose_name='Замовлень')),
+                ('units', models.PositiveIntegerField(default=0, verbose_name='Одиниць')),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name='Виручка')),
+                ('dirty', models.BooleanField(default=False, verbose_name='Потребує перерахунку')),
+            ],
+            options={
+                'verbose_name': 'Продажі за день',
+                'verbose_name_plural': 'Продажі за днями',
+                'ordering': ['-day'],
+                'abstract': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='SalesRollupState',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('last_order_id', models.PositiveBigIntegerField(default=0, verbose_name='Останнє враховане замовлення')),
+                ('changed_since', models.DateTimeField(blank=True, null=True, verbose_name='Зміни перевірено з')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Дата оновлення')),
+            ],
+            options={
+                'verbose_name': 'Стан зведень продажів',
+                'verbose_name_plural': 'Стан зведень продажів',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['updated_at'], name='order_updated_idx'),
+        ),
+        migrations.AddField(
+            model_name='dailycategorysales',
+            name='category',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='shop.category', verbose_name='Категорія'),
+        ),
+        migrations.AddField(
+            model_name='dailyproductsales',
+            name='product',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='shop.product', verbose_name='Товар'),
+        ),
+        migrations.AddConstraint(
+            model_name='dailysales',
+            constraint=models.UniqueConstraint(fields=('day',), name='daily_sales_day_unique'),
+        ),
+        migrations.AddConstraint(
+            model_name='dailycategorysales',
+            constraint=models.UniqueConstraint(fields=('day', 'category'), name='daily_category_sales_unique'),
+        ),
+        migrations.AddConstraint(
+            model_name='dailyproductsales',
+            constraint=models.UniqueConstraint(fields=('day', 'product'), name='daily_product_sales_unique'),
+        ),
+    ]
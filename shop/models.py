@@ -1,15 +1,107 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models import Case, DecimalField, ExpressionWrapper, F, FloatField, Q, Sum, Value, When
+from django.db.models.functions import Cast, Coalesce, Concat, Length, Round, Substr
+from django.db.models.lookups import GreaterThan
 from django.contrib.auth.models import User
+from django.core.exceptions import ValidationError
 from django.core.validators import MinValueValidator, MaxValueValidator
+from django.utils.functional import cached_property
 from decimal import Decimal
 
 
+def final_price_expression(prefix=''):
+    """SQL-вираз фінальної ціни товару (аналог Product.final_price)"""
+    return Case(
+        When(**{f'{prefix}discount_price__gt': 0, 'then': F(f'{prefix}discount_price')}),
+        default=F(f'{prefix}price'),
+        output_field=DecimalField(max_digits=10, decimal_places=2),
+    )
+
+
+def discount_percent_expression():
+    """SQL-вираз відсотка знижки (аналог Product.discount_percentage)"""
+    return Case(
+        When(
+            discount_price__gt=0,
+            discount_price__lt=F('price'),
+            # Зсув на мільйонну частку компенсує похибку дробових чисел перед відкиданням дробу
+            then=Cast(
+                ExpressionWrapper(
+                    (F('price') - F('discount_price')) * 100 / F('price') + Value(Decimal('0.000001')),
+                    output_field=DecimalField(max_digits=12, decimal_places=6),
+                ),
+                models.IntegerField(),
+            ),
+        ),
+        default=Value(0),
+        output_field=models.IntegerField(),
+    )
+
+
+def cart_totals_expressions(prefix=''):
+    """Агрегати кількості та вартості кошика для aggregate()/annotate()"""
+    return {
+        'total_items': Coalesce(Sum(f'{prefix}quantity'), 0),
+        'total_price': Coalesce(
+            Sum(ExpressionWrapper(
+                F(f'{prefix}quantity') * F(f'{prefix}product__effective_price'),
+                output_field=DecimalField(max_digits=12, decimal_places=2),
+            )),
+            Decimal('0'),
+            output_field=DecimalField(max_digits=12, decimal_places=2),
+        ),
+    }
+
+
+# Довжина короткого опису в картці товару (як truncatechars:80)
+CARD_DESCRIPTION_LENGTH = 80
+
+
+def short_description_expression():
+    """SQL-вираз короткого опису: перші символи опису з «…», якщо він довший"""
+    return Case(
+        When(
+            GreaterThan(Length('description'), CARD_DESCRIPTION_LENGTH),
+            then=Concat(Substr('description', 1, CARD_DESCRIPTION_LENGTH - 1), Value('…')),
+        ),
+        default=F('description'),
+        output_field=models.CharField(max_length=CARD_DESCRIPTION_LENGTH),
+    )
+
+
+# Поля, які показує картка товару у списках; решта (зокрема повний опис) не завантажується.
+# Поля сортування каталогу теж потрібні — з них будується курсор наступної сторінки
+CARD_FIELDS = (
+    'id', 'name', 'slug', 'short_description', 'price', 'discount_price', 'effective_price', 'discount_percent',
+    'stock', 'reserved', 'image', 'image_variants', 'is_featured', 'rating_avg', 'rating_count', 'created_at',
+)
+
+
+# Гістограма оцінок товару: кількість схвалених відгуків з 1..5 зірками
+RATING_FIELDS = tuple(f'rating_{stars}' for stars in range(1, 6))
+
+
+def _rating_count_expression():
+    return sum((F(name) for name in RATING_FIELDS[1:]), F(RATING_FIELDS[0]))
+
+
+def _rating_avg_expression():
+    weighted = sum((stars * F(name) for stars, name in enumerate(RATING_FIELDS[1:], start=2)), F(RATING_FIELDS[0]))
+    return Case(
+        When(**{name: 0 for name in RATING_FIELDS}, then=Value(0.0)),
+        default=Round(Cast(weighted, FloatField()) / _rating_count_expression(), 2),
+        output_field=FloatField(),
+    )
+
+
 class Category(models.Model):
     """Модель категорії товарів"""
     name = models.CharField(max_length=100, verbose_name="Назва категорії")
     slug = models.SlugField(max_length=100, unique=True, verbose_name="URL")
     description = models.TextField(blank=True, verbose_name="Опис")
     image = models.ImageField(upload_to='categories/', blank=True, null=True, verbose_name="Зображення")
+    # Зменшені копії зображення (див. shop/images.py)
+    image_variants = models.JSONField(default=dict, blank=True, editable=False, verbose_name="Варіанти зображення")
     created_at = models.DateTimeField(auto_now_add=True, verbose_name="Дата створення")
     updated_at = models.DateTimeField(auto_now=True, verbose_name="Дата оновлення")
 
@@ -22,25 +114,92 @@ class Category(models.Model):
         return self.name
 
 
+class ProductQuerySet(models.QuerySet):
+    def cards(self):
+        """Модель читання для карток: лише поля CARD_FIELDS"""
+        return self.only(*CARD_FIELDS)
+
+
 class Product(models.Model):
     """Модель товару"""
     name = models.CharField(max_length=200, verbose_name="Назва товару")
     slug = models.SlugField(max_length=200, unique=True, verbose_name="URL")
     description = models.TextField(verbose_name="Опис")
+    short_description = models.GeneratedField(
+        expression=short_description_expression(),
+        output_field=models.CharField(max_length=CARD_DESCRIPTION_LENGTH),
+        db_persist=True,
+        verbose_name="Короткий опис",
+    )
     category = models.ForeignKey(Category, on_delete=models.CASCADE, related_name='products', verbose_name="Категорія")
     price = models.DecimalField(max_digits=10, decimal_places=2, verbose_name="Ціна")
     discount_price = models.DecimalField(max_digits=10, decimal_places=2, blank=True, null=True, verbose_name="Ціна зі знижкою")
     stock = models.PositiveIntegerField(default=0, verbose_name="Кількість на складі")
+    reserved = models.PositiveIntegerField(default=0, verbose_name="Зарезервовано в кошиках")
+    # Ціна з урахуванням знижки та відсоток знижки обчислює база, щоб сортувати й фільтрувати за індексом
+    effective_price = models.GeneratedField(
+        expression=final_price_expression(),
+        output_field=models.DecimalField(max_digits=10, decimal_places=2),
+        db_persist=True,
+        verbose_name="Фінальна ціна",
+    )
+    discount_percent = models.GeneratedField(
+        expression=discount_percent_expression(),
+        output_field=models.PositiveSmallIntegerField(),
+        db_persist=True,
+        verbose_name="Знижка, %",
+    )
     image = models.ImageField(upload_to='products/', verbose_name="Основне зображення")
+    image_variants = models.JSONField(default=dict, blank=True, editable=False, verbose_name="Варіанти зображення")
     is_active = models.BooleanField(default=True, verbose_name="Активний")
     is_featured = models.BooleanField(default=False, verbose_name="Рекомендований")
+    # Оцінки схвалених відгуків оновлюються інкрементально (див. shop/ratings.py),
+    # а кількість і середнє обчислює сама база з гістограми
+    rating_1 = models.PositiveIntegerField(default=0, editable=False, verbose_name="Оцінок 1")
+    rating_2 = models.PositiveIntegerField(default=0, editable=False, verbose_name="Оцінок 2")
+    rating_3 = models.PositiveIntegerField(default=0, editable=False, verbose_name="Оцінок 3")
+    rating_4 = models.PositiveIntegerField(default=0, editable=False, verbose_name="Оцінок 4")
+    rating_5 = models.PositiveIntegerField(default=0, editable=False, verbose_name="Оцінок 5")
+    rating_count = models.GeneratedField(
+        expression=_rating_count_expression(),
+        output_field=models.PositiveIntegerField(),
+        db_persist=True,
+        verbose_name="Кількість відгуків",
+    )
+    rating_avg = models.GeneratedField(
+        expression=_rating_avg_expression(),
+        output_field=models.FloatField(),
+        db_persist=True,
+        verbose_name="Середня оцінка",
+    )
     created_at = models.DateTimeField(auto_now_add=True, verbose_name="Дата створення")
     updated_at = models.DateTimeField(auto_now=True, verbose_name="Дата оновлення")
 
+    objects = ProductQuerySet.as_manager()
+
     class Meta:
         verbose_name = "Товар"
         verbose_name_plural = "Товари"
         ordering = ['-created_at']
+        # Індекси під сортування каталогу з пагінацією за ключем. Часткові (лише активні
+        # товари): SQLite не використовує індекс для умови WHERE "is_active" без порівняння
+        indexes = [
+            models.Index(fields=['-created_at', '-id'], name='product_active_created_idx', condition=Q(is_active=True)),
+            models.Index(fields=['effective_price', 'id'], name='product_active_price_idx', condition=Q(is_active=True)),
+            models.Index(fields=['-discount_percent', '-id'], name='product_active_discount_idx',
+                         condition=Q(is_active=True)),
+            models.Index(fields=['name', 'id'], name='product_active_name_idx', condition=Q(is_active=True)),
+            models.Index(fields=['-rating_avg', '-rating_count', '-id'], name='product_active_rating_idx',
+                         condition=Q(is_active=True)),
+            # Покриває всі колонки фасетів: лічильники категорії рахуються лише з індексу
+            models.Index(
+                fields=['category', 'effective_price', 'discount_percent', 'rating_avg', 'is_featured', 'stock', 'reserved'],
+                name='product_active_facets_idx',
+                condition=Q(is_active=True),
+            ),
+            # Список в адмінці показує й неактивні товари
+            models.Index(fields=['-created_at', '-id'], name='product_created_idx'),
+        ]
 
     def __str__(self):
         return self.name
@@ -50,6 +209,16 @@ class Product(models.Model):
         """Повертає фінальну ціну (з урахуванням знижки)"""
         return self.discount_price if self.discount_price else self.price
 
+    @property
+    def available_stock(self):
+        """Повертає кількість, доступну для покупки (без резервів у кошиках)"""
+        return max(self.stock - self.reserved, 0)
+
+    @property
+    def rating_histogram(self):
+        """[(зірки, кількість), ...] від 5 до 1"""
+        return [(stars, getattr(self, f'rating_{stars}')) for stars in range(5, 0, -1)]
+
     @property
     def discount_percentage(self):
         """Повертає відсоток знижки"""
@@ -62,6 +231,7 @@ class ProductImage(models.Model):
     """Модель додаткових зображень товару"""
     product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='images', verbose_name="Товар")
     image = models.ImageField(upload_to='products/gallery/', verbose_name="Зображення")
+    image_variants = models.JSONField(default=dict, blank=True, editable=False, verbose_name="Варіанти зображення")
     alt_text = models.CharField(max_length=200, blank=True, verbose_name="Альтернативний текст")
     is_main = models.BooleanField(default=False, verbose_name="Основне зображення")
 
@@ -86,15 +256,26 @@ class Cart(models.Model):
     def __str__(self):
         return f"Кошик користувача {self.user.username}"
 
+    @cached_property
+    def summary(self):
+        """Кількість товарів та вартість кошика, обчислені одним агрегатним запитом"""
+        totals = CartItem.objects.filter(cart=self).aggregate(**cart_totals_expressions())
+        totals['total_price'] = Decimal(totals['total_price']).quantize(Decimal('0.01'))
+        return totals
+
+    def refresh_summary(self):
+        """Скидає закешовані підсумки після зміни вмісту кошика"""
+        self.__dict__.pop('summary', None)
+
     @property
     def total_items(self):
         """Повертає загальну кількість товарів в кошику"""
-        return sum(item.quantity for item in self.items.all())
+        return self.summary['total_items']
 
     @property
     def total_price(self):
         """Повертає загальну вартість кошика"""
-        return sum(item.total_price for item in self.items.all())
+        return self.summary['total_price']
 
 
 class CartItem(models.Model):
@@ -118,6 +299,22 @@ class CartItem(models.Model):
         return self.product.final_price * self.quantity
 
 
+class StockReservation(models.Model):
+    """Модель тимчасового резерву товару в кошику"""
+    cart = models.ForeignKey(Cart, on_delete=models.CASCADE, related_name='reservations', verbose_name="Кошик")
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='reservations', verbose_name="Товар")
+    quantity = models.PositiveIntegerField(verbose_name="Кількість")
+    expires_at = models.DateTimeField(db_index=True, verbose_name="Діє до")
+
+    class Meta:
+        verbose_name = "Резерв товару"
+        verbose_name_plural = "Резерви товарів"
+        unique_together = ['cart', 'product']
+
+    def __str__(self):
+        return f"{self.product_id} x {self.quantity} до {self.expires_at:%d.%m.%Y %H:%M}"
+
+
 class Order(models.Model):
     """Модель замовлення"""
     STATUS_CHOICES = [
@@ -149,6 +346,13 @@ class Order(models.Model):
         verbose_name = "Замовлення"
         verbose_name_plural = "Замовлення"
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['user', '-created_at', '-id'], name='order_user_created_idx'),
+            # Сортування списку в адмінці (-created_at, -pk) без сортування всієї таблиці
+            models.Index(fields=['-created_at', '-id'], name='order_created_idx'),
+            # Змінені замовлення для перерахунку зведень продажів (shop/sales.py)
+            models.Index(fields=['updated_at'], name='order_updated_idx'),
+        ]
 
     def __str__(self):
         return f"Замовлення #{self.order_number}"
@@ -157,7 +361,43 @@ class Order(models.Model):
         if not self.order_number:
             import uuid
             self.order_number = str(uuid.uuid4())[:8].upper()
-        super().save(*args, **kwargs)
+        if not self.pk:
+            super().save(*args, **kwargs)
+            return
+        from .inventory import allocate, restock
+        from .recommendations import order_status_changed
+
+        with transaction.atomic():
+            # Склад змінює лише той, хто фактично змінив статус: повторне збереження нічого не подвоює,
+            # а повернення зі скасованих знову списує товари (нестача — OutOfStockError і відкат)
+            if self.status == 'cancelled':
+                changed = Order.objects.filter(pk=self.pk).exclude(status='cancelled').update(status='cancelled')
+            else:
+                changed = Order.objects.filter(pk=self.pk, status='cancelled').update(status=self.status)
+            super().save(*args, **kwargs)
+            if changed:
+                lines = self.items.values_list('product_id').annotate(quantity=Sum('quantity')).order_by()
+                if self.status == 'cancelled':
+                    restock(lines)
+                else:
+                    allocate(lines)
+                order_status_changed(self.pk, cancelled=self.status == 'cancelled')
+
+    def clean(self):
+        # Форма (адмінка) показує нестачу як помилку; остаточна перевірка — умовні UPDATE у save()
+        if not self.pk or self.status == 'cancelled':
+            return
+        if not Order.objects.filter(pk=self.pk, status='cancelled').exists():
+            return
+        short = (
+            self.items.values('product', 'product__name', 'product__stock', 'product__reserved')
+            .annotate(quantity=Sum('quantity'))
+            .filter(quantity__gt=F('product__stock') - F('product__reserved'))
+            .order_by()
+            .values_list('product__name', flat=True)
+        )
+        if short:
+            raise ValidationError({'status': f'Недостатньо товару на складі: {", ".join(short)}'})
 
 
 class OrderItem(models.Model):
@@ -203,6 +443,138 @@ class Review(models.Model):
         verbose_name_plural = "Відгуки"
         ordering = ['-created_at']
         unique_together = ['product', 'user']
+        indexes = [
+            # Сортування списку в адмінці (-created_at, -pk) без сортування всієї таблиці
+            models.Index(fields=['-created_at', '-id'], name='review_created_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.product.name} - {self.user.username} ({self.rating} зірок)"
+
+
+class ProductPair(models.Model):
+    """Скільки замовлень містять обидва товари; рядок product = other — скільки замовлень містять товар.
+
+    Кожна пара зберігається в обох напрямках, тож усі сусіди товару читаються одним діапазоном індексу.
+    """
+    # Окремий індекс не потрібен: product — перша колонка унікального обмеження
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='+', db_index=False,
+                                verbose_name="Товар")
+    other = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='+', verbose_name="Інший товар")
+    orders = models.PositiveIntegerField(verbose_name="Замовлень")
+
+    class Meta:
+        verbose_name = "Пара товарів у замовленнях"
+        verbose_name_plural = "Пари товарів у замовленнях"
+        constraints = [
+            models.UniqueConstraint(fields=['product', 'other'], name='product_pair_unique'),
+        ]
+
+    def __str__(self):
+        return f"{self.product_id} + {self.other_id}: {self.orders}"
+
+
+class ProductRecommendation(models.Model):
+    """Товар з найкращих K «часто купують разом» для product (rank 0 — найкращий)"""
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='recommendations', db_index=False,
+                                verbose_name="Товар")
+    rank = models.PositiveSmallIntegerField(verbose_name="Позиція")
+    recommended = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='recommended_in',
+                                    verbose_name="Рекомендований товар")
+    score = models.FloatField(verbose_name="Оцінка")
+
+    class Meta:
+        verbose_name = "Рекомендація"
+        verbose_name_plural = "Рекомендації"
+        constraints = [
+            models.UniqueConstraint(fields=['product', 'rank'], name='recommendation_product_rank_unique'),
+        ]
+
+    def __str__(self):
+        return f"{self.product_id} → {self.recommended_id} ({self.score:.3f})"
+
+
+class RecommendationState(models.Model):
+    """Стан перерахунку рекомендацій: до якого замовлення враховано пари (один рядок)"""
+    last_order_id = models.PositiveBigIntegerField(default=0, verbose_name="Останнє враховане замовлення")
+    orders = models.PositiveIntegerField(default=0, verbose_name="Враховано замовлень")
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="Дата оновлення")
+
+    class Meta:
+        verbose_name = "Стан рекомендацій"
+        verbose_name_plural = "Стан рекомендацій"
+
+    def __str__(self):
+        return f"До замовлення {self.last_order_id} ({self.orders})"
+
+
+class SalesRollup(models.Model):
+    """Підсумки продажів без скасованих замовлень за день місцевого часу"""
+    day = models.DateField(verbose_name="День")
+    orders = models.PositiveIntegerField(default=0, verbose_name="Замовлень")
+    units = models.PositiveIntegerField(default=0, verbose_name="Одиниць")
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0, verbose_name="Виручка")
+
+    class Meta:
+        abstract = True
+        ordering = ['-day']
+
+
+class DailySales(SalesRollup):
+    """Продажі магазину за день"""
+    # Позначка для перерахунку: замовлення цього дня видалено
+    dirty = models.BooleanField(default=False, verbose_name="Потребує перерахунку")
+
+    class Meta(SalesRollup.Meta):
+        verbose_name = "Продажі за день"
+        verbose_name_plural = "Продажі за днями"
+        constraints = [
+            models.UniqueConstraint(fields=['day'], name='daily_sales_day_unique'),
+        ]
+
+    def __str__(self):
+        return f"{self.day:%d.%m.%Y}: {self.revenue}"
+
+
+class DailyProductSales(SalesRollup):
+    """Продажі товару за день"""
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='+', verbose_name="Товар")
+
+    class Meta(SalesRollup.Meta):
+        verbose_name = "Продажі товару за день"
+        verbose_name_plural = "Продажі товарів за днями"
+        constraints = [
+            models.UniqueConstraint(fields=['day', 'product'], name='daily_product_sales_unique'),
+        ]
+
+    def __str__(self):
+        return f"{self.day:%d.%m.%Y} {self.product_id}: {self.revenue}"
+
+
+class DailyCategorySales(SalesRollup):
+    """Продажі категорії за день (за категорією товару на момент перерахунку)"""
+    category = models.ForeignKey(Category, on_delete=models.CASCADE, related_name='+', verbose_name="Категорія")
+
+    class Meta(SalesRollup.Meta):
+        verbose_name = "Продажі категорії за день"
+        verbose_name_plural = "Продажі категорій за днями"
+        constraints = [
+            models.UniqueConstraint(fields=['day', 'category'], name='daily_category_sales_unique'),
+        ]
+
+    def __str__(self):
+        return f"{self.day:%d.%m.%Y} {self.category_id}: {self.revenue}"
+
+
+class SalesRollupState(models.Model):
+    """Стан зведень продажів: останнє враховане замовлення та час останньої перевірки змін (один рядок)"""
+    last_order_id = models.PositiveBigIntegerField(default=0, verbose_name="Останнє враховане замовлення")
+    changed_since = models.DateTimeField(null=True, blank=True, verbose_name="Зміни перевірено з")
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="Дата оновлення")
+
+    class Meta:
+        verbose_name = "Стан зведень продажів"
+        verbose_name_plural = "Стан зведень продажів"
 
     def __str__(self):
-        return f"{self.product.name} - {self.user.username} ({self.rating} зірок)"
\ No newline at end of file
+        return f"До замовлення {self.last_order_id}"
@@ -0,0 +1,222 @@
+import hashlib
+from functools import reduce
+
+from django.conf import settings
+from django.core import signing
+from django.core.cache import cache
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Q, QuerySet
+from django.utils.functional import cached_property
+
+CURSOR_SALT = 'shop.pagination.cursor'
+
+
+class InvalidCursor(Exception):
+    """Курсор пошкоджено або підписано іншим ключем"""
+
+
+class CursorPage:
+    """Сторінка пагінації за курсором"""
+
+    def __init__(self, object_list, paginator, next_cursor=None, previous_cursor=None):
+        self.object_list = object_list
+        self.paginator = paginator
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __bool__(self):
+        return bool(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+class CursorPaginator:
+    """Пагінація за ключем (keyset) замість OFFSET.
+
+    ordering — поля сортування, останнім має бути унікальне поле (id),
+    яке розв'язує рівні значення. Сторінка вибирається умовою
+    WHERE (поля) > (значення з курсору), тому глибина сторінки не впливає
+    на час запиту. Курсори непрозорі та підписані SECRET_KEY.
+
+    Для списків, які не є QuerySet (наприклад, результати пошуку за
+    релевантністю), курсор зберігає позицію у списку.
+    """
+
+    def __init__(self, object_list, ordering, per_page):
+        self.object_list = object_list
+        self.ordering = tuple(ordering)
+        self.per_page = per_page
+        self.is_queryset = isinstance(object_list, QuerySet)
+        if self.is_queryset:
+            self.object_list = object_list.order_by(*self.ordering)
+
+    @cached_property
+    def count(self):
+        """Загальна кількість; для QuerySet кешується на SHOP_PAGINATION_COUNT_TTL секунд"""
+        if not self.is_queryset:
+            return len(self.object_list)
+        query = str(self.object_list.order_by().query).encode()
+        key = 'shop:pagination:count:' + hashlib.md5(query).hexdigest()
+        return cache.get_or_set(
+            key, self.object_list.count, getattr(settings, 'SHOP_PAGINATION_COUNT_TTL', 300)
+        )
+
+    def _encode(self, direction, values):
+        data = {'d': direction, 'o': ','.join(self.ordering), 'v': values}
+        return signing.dumps(data, salt=CURSOR_SALT, compress=True)
+
+    def _decode(self, cursor):
+        try:
+            data = signing.loads(cursor, salt=CURSOR_SALT)
+            direction, ordering, values = data['d'], data['o'], data['v']
+        except (signing.BadSignature, KeyError, TypeError) as error:
+            raise InvalidCursor from error
+        # Курсор від іншого сортування не можна застосувати до цього
+        if direction not in ('n', 'p') or ordering != ','.join(self.ordering):
+            raise InvalidCursor
+        if self.is_queryset:
+            if not isinstance(values, list) or len(values) != len(self.ordering):
+                raise InvalidCursor
+            model = self.object_list.model
+            try:
+                values = [
+                    model._meta.get_field(name.lstrip('-')).to_python(value)
+                    for name, value in zip(self.ordering, values)
+                ]
+            except Exception as error:
+                raise InvalidCursor from error
+        elif not isinstance(values, int) or values < 0:
+            raise InvalidCursor
+        return direction, values
+
+    def _position(self, obj):
+        values = []
+        for name in self.ordering:
+            value = getattr(obj, name.lstrip('-'))
+            values.append(value if isinstance(value, (int, str)) or value is None else str(value))
+        return values
+
+    def _after(self, values, reverse=False):
+        """Умова «рядки після values» для сортування (або перед ним, якщо reverse)"""
+        conditions = []
+        for i, name in enumerate(self.ordering):
+            field = name.lstrip('-')
+            descending = name.startswith('-') != reverse
+            equal = {self.ordering[j].lstrip('-'): values[j] for j in range(i)}
+            conditions.append(Q(**equal, **{f'{field}__{"lt" if descending else "gt"}': values[i]}))
+        return reduce(lambda a, b: a | b, conditions)
+
+    def page(self, cursor=None):
+        """Повертає сторінку для курсору (None — перша сторінка)"""
+        direction, values = self._decode(cursor) if cursor else ('n', None)
+        if not self.is_queryset:
+            return self._list_page(direction, values or 0)
+
+        queryset = self.object_list
+        if direction == 'p':
+            reversed_ordering = [name[1:] if name.startswith('-') else f'-{name}' for name in self.ordering]
+            queryset = queryset.filter(self._after(values, reverse=True)).order_by(*reversed_ordering)
+        elif values is not None:
+            queryset = queryset.filter(self._after(values))
+
+        # Зайвий рядок показує, чи є ще одна сторінка в цьому напрямку
+        rows = list(queryset[:self.per_page + 1])
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if direction == 'p':
+            rows.reverse()
+            has_next, has_previous = True, has_more
+        else:
+            has_next, has_previous = has_more, values is not None
+
+        return CursorPage(
+            rows,
+            self,
+            next_cursor=self._encode('n', self._position(rows[-1])) if rows and has_next else None,
+            previous_cursor=self._encode('p', self._position(rows[0])) if rows and has_previous else None,
+        )
+
+    def _list_page(self, direction, position):
+        start = max(position - self.per_page, 0) if direction == 'p' else position
+        rows = list(self.object_list[start:start + self.per_page + 1])
+        has_next = len(rows) > self.per_page
+        return CursorPage(
+            rows[:self.per_page],
+            self,
+            next_cursor=self._encode('n', start + self.per_page) if has_next else None,
+            previous_cursor=self._encode('p', start) if start > 0 else None,
+        )
+
+
+def estimate_rows(model, using='default'):
+    """Приблизна кількість рядків таблиці без повного COUNT(*)"""
+    connection = connections[using]
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass', [model._meta.db_table])
+            row = cursor.fetchone()
+        if row and row[0] > 0:
+            return row[0]
+    # Межі первинного ключа читаються з індексу (окремі підзапити, щоб кожен був одним пошуком);
+    # видалені рядки дають завищену оцінку
+    table = connection.ops.quote_name(model._meta.db_table)
+    column = connection.ops.quote_name(model._meta.pk.column)
+    with connection.cursor() as cursor:
+        cursor.execute(f'SELECT (SELECT MIN({column}) FROM {table}), (SELECT MAX({column}) FROM {table})')
+        low, high = cursor.fetchone()
+    return high - low + 1 if high is not None else 0
+
+
+class EstimatedCountPaginator(Paginator):
+    """Paginator для великих таблиць (адмінка).
+
+    Точна кількість рахується лише до SHOP_ADMIN_EXACT_COUNT_LIMIT рядків:
+    COUNT над підзапитом з LIMIT читає не більше limit + 1 рядків. Для
+    більшої нефільтрованої таблиці береться оцінка estimate_rows(), а
+    для фільтрованої — точний COUNT, кешований на SHOP_PAGINATION_COUNT_TTL.
+    """
+
+    @cached_property
+    def count(self):
+        if not isinstance(self.object_list, QuerySet):
+            return super().count
+        queryset = self.object_list.order_by()
+        limit = getattr(settings, 'SHOP_ADMIN_EXACT_COUNT_LIMIT', 10000)
+        exact = queryset[:limit + 1].count()
+        if exact <= limit:
+            return exact
+        if not queryset.query.where:
+            return max(estimate_rows(queryset.model, queryset.db), exact)
+        key = 'shop:pagination:count:' + hashlib.md5(str(queryset.query).encode()).hexdigest()
+        return cache.get_or_set(key, queryset.count, getattr(settings, 'SHOP_PAGINATION_COUNT_TTL', 300))
+
+
+def paginate(request, object_list, ordering, per_page):
+    """Сторінка для запиту: за курсором (?cursor=), або за номером (?page=) для старих посилань"""
+    if 'page' in request.GET and 'cursor' not in request.GET:
+        if isinstance(object_list, QuerySet):
+            object_list = object_list.order_by(*ordering)
+        return Paginator(object_list, per_page).get_page(request.GET.get('page'))
+
+    paginator = CursorPaginator(object_list, ordering, per_page)
+    try:
+        return paginator.page(request.GET.get('cursor'))
+    except InvalidCursor:
+        return paginator.page()
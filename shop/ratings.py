@@ -0,0 +1,96 @@
+"""Агрегати оцінок товарів (гістограма rating_1..rating_5 у Product).
+
+Гістограма змінюється приростами через F-вирази, коли відгук схвалюють,
+знімають зі схвалення, редагують чи видаляють, тож на сторінках каталогу
+ніщо не агрегується. Кількість і середню оцінку база обчислює сама
+(GeneratedField). recompute() звіряє гістограми з відгуками пакетами.
+"""
+from collections import Counter
+
+from django.db import transaction
+from django.db.models import Count, F
+from django.db.models.functions import Greatest
+
+from .cache import bump_catalog_version
+from .models import RATING_FIELDS, Product, Review
+
+
+def review_state(review):
+    """Внесок відгуку в гістограму: (product_id, оцінка) або None, якщо не схвалено"""
+    if review is None or not review.is_approved:
+        return None
+    return (review.product_id, review.rating)
+
+
+def apply_changes(changes):
+    """Застосовує {(product_id, оцінка): зміна кількості} одним UPDATE на товар"""
+    per_product = {}
+    for (product_id, rating), delta in changes.items():
+        if not delta:
+            continue
+        field = f'rating_{rating}'
+        # Менше нуля не опускаємося навіть після ручних змін у базі; розбіжність виправить recompute()
+        value = F(field) + delta if delta > 0 else Greatest(F(field) + delta, 0)
+        per_product.setdefault(product_id, {})[field] = value
+    for product_id in sorted(per_product):
+        Product.objects.filter(pk=product_id).update(**per_product[product_id])
+    return bool(per_product)
+
+
+def review_changed(previous, current):
+    """Оновлює гістограму після зміни відгуку; previous/current — результат review_state()"""
+    if previous == current:
+        return False
+    changes = Counter()
+    if previous:
+        changes[previous] -= 1
+    if current:
+        changes[current] += 1
+    return apply_changes(changes)
+
+
+def set_approval(queryset, approved):
+    """Масово схвалює або знімає схвалення відгуків, повертає кількість змінених"""
+    with transaction.atomic():
+        rows = list(queryset.exclude(is_approved=approved).values_list('pk', 'product_id', 'rating'))
+        if not rows:
+            return 0
+        Review.objects.filter(pk__in=[pk for pk, _, _ in rows]).update(is_approved=approved)
+        sign = 1 if approved else -1
+        apply_changes(Counter({
+            key: sign * total for key, total in Counter((product_id, rating) for _, product_id, rating in rows).items()
+        }))
+    bump_catalog_version()
+    return len(rows)
+
+
+def recompute(chunk_size=1000):
+    """Перераховує гістограми з відгуків пакетами по chunk_size товарів, повертає кількість виправлених"""
+    fixed = 0
+    last_id = 0
+    while True:
+        chunk = list(
+            Product.objects.filter(pk__gt=last_id).order_by('pk').values_list('pk', *RATING_FIELDS)[:chunk_size]
+        )
+        if not chunk:
+            break
+        last_id = chunk[-1][0]
+        actual = {}
+        counts = Review.objects.filter(
+            is_approved=True, product_id__gte=chunk[0][0], product_id__lte=last_id
+        ).values_list('product_id', 'rating').annotate(total=Count('id')).order_by()
+        for product_id, rating, total in counts:
+            actual.setdefault(product_id, [0] * len(RATING_FIELDS))[rating - 1] = total
+
+        stale = []
+        for pk, *stored in chunk:
+            expected = actual.get(pk, [0] * len(RATING_FIELDS))
+            if stored != expected:
+                stale.append(Product(pk=pk, **dict(zip(RATING_FIELDS, expected))))
+        if stale:
+            with transaction.atomic():
+                Product.objects.bulk_update(stale, RATING_FIELDS)
+            fixed += len(stale)
+    if fixed:
+        bump_catalog_version()
+    return fixed
@@ -0,0 +1,235 @@
+"""Рекомендації «часто купують разом» зі спільних покупок.
+
+Builder читає рядки замовлень курсором у порядку order_id і для кожного
+замовлення рахує пари товарів у розрідженому лічильнику в пам'яті (ключ —
+одне ціле число на пару). Коли лічильник сягає max_pairs записів, він
+додається до ProductPair upsert-ом orders = orders + excluded.orders в
+одній транзакції з відміткою останнього врахованого замовлення: пам'ять
+обмежена, а перерваний запуск продовжується без подвійного підрахунку.
+
+Оцінка пари — коефіцієнт Жаккара n(a,b) / (n(a) + n(b) - n(a,b)) або lift
+n(a,b)·N / (n(a)·n(b)) (SHOP_RECOMMENDATIONS_MEASURE); пари з меншою за
+SHOP_RECOMMENDATIONS_MIN_SUPPORT кількістю замовлень відкидаються. Для
+кожного товару зберігаються SHOP_RECOMMENDATIONS_TOP_K найкращих сусідів у
+ProductRecommendation, звідки сторінка товару бере їх одним запитом за
+індексом (product, rank).
+
+Без rebuild враховуються лише нові замовлення й перераховуються списки
+товарів з них; списки їхніх сусідів уточнить наступний повний перерахунок.
+Скасування вже врахованого замовлення віднімає його пари одразу
+(order_status_changed), а відновлення — додає знову. Замовлення, скасоване
+саме під час перерахунку, може лишитися врахованим, тож повний перерахунок
+(build_recommendations --rebuild) варто запускати періодично, наприклад щотижня.
+"""
+import heapq
+from itertools import combinations, groupby
+from operator import itemgetter
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F
+from django.db.models.functions import Greatest
+
+from .models import Order, OrderItem, Product, ProductPair, ProductRecommendation, RecommendationState
+
+# Ключ лічильника пар: product_id * SHIFT + other_id
+SHIFT = 1 << 32
+# Скільки товарів перераховується одним запитом сусідів
+RESCORE_CHUNK = 500
+# Оптові замовлення дають квадратичну кількість пар і майже нічого не кажуть про схожість товарів
+MAX_ORDER_PRODUCTS = 50
+
+MEASURES = {
+    'jaccard': lambda both, first, second, total: both / (first + second - both),
+    'lift': lambda both, first, second, total: both * total / (first * second),
+}
+
+
+def related_products(product, limit=4):
+    """Картки «часто купують разом» одним запитом за індексом; бракує даних — доповнюються товарами категорії"""
+    products = list(
+        Product.objects.cards()
+        .filter(recommended_in__product=product, is_active=True)
+        .order_by('recommended_in__rank')[:limit]
+    )
+    if len(products) < limit:
+        products += Product.objects.cards().filter(
+            category_id=product.category_id, is_active=True,
+        ).exclude(pk__in=[product.pk, *(item.pk for item in products)])[:limit - len(products)]
+    return products
+
+
+def _table():
+    quote = connection.ops.quote_name
+    product, other, orders = (
+        quote(ProductPair._meta.get_field(name).column) for name in ('product', 'other', 'orders')
+    )
+    return quote(ProductPair._meta.db_table), product, other, orders
+
+
+def _upsert_sql():
+    table, product, other, orders = _table()
+    return (
+        f'INSERT INTO {table} ({product}, {other}, {orders}) VALUES (%s, %s, %s) '
+        f'ON CONFLICT ({product}, {other}) DO UPDATE SET {orders} = {table}.{orders} + excluded.{orders}'
+    )
+
+
+def _neighbours_sql(products):
+    """(товар, сусід, n(товар, сусід), n(товар), n(сусід)) для пар із достатньою підтримкою"""
+    table, product, other, orders = _table()
+    return (
+        f'SELECT pair.{product}, pair.{other}, pair.{orders}, own.{orders}, neighbour.{orders} '
+        f'FROM {table} pair '
+        f'JOIN {table} own ON own.{product} = pair.{product} AND own.{other} = pair.{product} '
+        f'JOIN {table} neighbour ON neighbour.{product} = pair.{other} AND neighbour.{other} = pair.{other} '
+        f'WHERE pair.{product} IN ({", ".join(["%s"] * products)}) '
+        f'AND pair.{other} <> pair.{product} AND pair.{orders} >= %s'
+    )
+
+
+def order_status_changed(order_id, cancelled):
+    """Віднімає скасоване (або знову додає відновлене) замовлення з уже врахованих пар і перераховує його товари.
+
+    Замовлення, до яких перерахунок ще не дійшов, не змінюються: Builder сам пропустить скасовані.
+    """
+    state = RecommendationState.objects.first()
+    if state is None or order_id > state.last_order_id:
+        return
+    products = sorted(set(OrderItem.objects.filter(order_id=order_id).values_list('product_id', flat=True)))
+    if not products:
+        return
+    # Оптові замовлення, як і в Builder.count(), враховані лише в лічильниках самих товарів
+    counted = len(products) <= MAX_ORDER_PRODUCTS
+    if cancelled:
+        rows = ProductPair.objects.filter(product__in=products)
+        rows = rows.filter(other__in=products) if counted else rows.filter(other=F('product'))
+        rows.update(orders=Greatest(F('orders') - 1, 0))
+        # Як і після повного перерахунку, пар без спільних замовлень немає
+        rows.filter(orders=0).delete()
+    else:
+        pairs = [(product_id, product_id) for product_id in products]
+        if counted:
+            pairs += [
+                pair for first, second in combinations(products, 2) for pair in ((first, second), (second, first))
+            ]
+        with connection.cursor() as cursor:
+            cursor.executemany(_upsert_sql(), [(first, second, 1) for first, second in pairs])
+    RecommendationState.objects.filter(pk=state.pk).update(orders=Greatest(F('orders') + (-1 if cancelled else 1), 0))
+    builder = Builder()
+    builder.state = state
+    builder.rescore(products)
+
+
+class Builder:
+    """Перерахунок пар і рекомендацій; лічильники orders, pairs і products — для звіту"""
+
+    def __init__(self, chunk_size=2000, max_pairs=200000, progress=None):
+        self.chunk_size = chunk_size
+        self.max_pairs = max_pairs
+        self.progress = progress
+        self.top_k = getattr(settings, 'SHOP_RECOMMENDATIONS_TOP_K', 8)
+        self.min_support = getattr(settings, 'SHOP_RECOMMENDATIONS_MIN_SUPPORT', 2)
+        self.measure = MEASURES[getattr(settings, 'SHOP_RECOMMENDATIONS_MEASURE', 'jaccard')]
+        self.orders = self.pairs = self.products = 0
+
+    def run(self, rebuild=False):
+        """Враховує нові замовлення (з rebuild — усі заново) і оновлює рекомендації"""
+        with transaction.atomic():
+            state = RecommendationState.objects.first() or RecommendationState.objects.create()
+            if rebuild:
+                # Старі рекомендації лишаються на сторінках, доки їх не замінить перерахунок
+                ProductPair.objects.all().delete()
+                state.last_order_id = state.orders = 0
+                state.save()
+        self.state = state
+        until = Order.objects.order_by('-pk').values_list('pk', flat=True).first() or 0
+        self.count(state.last_order_id, until, rescore=not rebuild)
+        if rebuild:
+            self.rescore_all()
+        return self
+
+    def count(self, since, until, rescore=True):
+        items = (
+            OrderItem.objects.filter(order_id__gt=since, order_id__lte=until)
+            .exclude(order__status='cancelled')
+            .order_by('order_id')
+            .values_list('order_id', 'product_id')
+            .iterator(chunk_size=self.chunk_size)
+        )
+        pairs, orders = {}, 0
+        for order_id, rows in groupby(items, key=itemgetter(0)):
+            products = sorted({product_id for _, product_id in rows})
+            for product_id in products:
+                key = product_id * SHIFT + product_id
+                pairs[key] = pairs.get(key, 0) + 1
+            if len(products) <= MAX_ORDER_PRODUCTS:
+                for first, second in combinations(products, 2):
+                    key = first * SHIFT + second
+                    pairs[key] = pairs.get(key, 0) + 1
+            orders += 1
+            if len(pairs) >= self.max_pairs:
+                self.flush(pairs, order_id, orders, rescore)
+                pairs, orders = {}, 0
+        # Відмітка сягає until, навіть якщо останні замовлення скасовані чи порожні
+        self.flush(pairs, until, orders, rescore)
+
+    def flush(self, pairs, last_order_id, orders, rescore):
+        rows = []
+        for key, total in pairs.items():
+            first, second = divmod(key, SHIFT)
+            rows.append((first, second, total))
+            if first != second:
+                rows.append((second, first, total))
+        with transaction.atomic():
+            if rows:
+                with connection.cursor() as cursor:
+                    cursor.executemany(_upsert_sql(), rows)
+            RecommendationState.objects.filter(pk=self.state.pk).update(
+                last_order_id=last_order_id, orders=F('orders') + orders,
+            )
+        self.orders += orders
+        self.pairs += len(rows)
+        if rescore:
+            self.rescore(sorted({first for first, _, _ in rows}))
+        if self.progress:
+            self.progress(self)
+
+    def rescore_all(self):
+        products = ProductPair.objects.filter(product=F('other')).order_by('product').values_list('product', flat=True)
+        chunk = []
+        for product_id in products.iterator(chunk_size=self.chunk_size):
+            chunk.append(product_id)
+            if len(chunk) >= RESCORE_CHUNK:
+                self.rescore(chunk)
+                chunk = []
+        self.rescore(chunk)
+        # Товари, яких більше немає в жодному замовленні
+        ProductRecommendation.objects.exclude(
+            product__in=ProductPair.objects.values('product')
+        ).delete()
+
+    def rescore(self, product_ids):
+        """Перераховує найкращих сусідів для product_ids пакетами по RESCORE_CHUNK"""
+        if not product_ids:
+            return
+        total = RecommendationState.objects.filter(pk=self.state.pk).values_list('orders', flat=True).get()
+        for start in range(0, len(product_ids), RESCORE_CHUNK):
+            chunk = product_ids[start:start + RESCORE_CHUNK]
+            with connection.cursor() as cursor:
+                cursor.execute(_neighbours_sql(len(chunk)), [*chunk, self.min_support])
+                neighbours = sorted(cursor.fetchall())
+            recommendations = []
+            for product_id, rows in groupby(neighbours, key=itemgetter(0)):
+                best = heapq.nlargest(self.top_k, (
+                    (self.measure(both, own, other, total), both, -other_id)
+                    for _, other_id, both, own, other in rows
+                ))
+                recommendations += [
+                    ProductRecommendation(product_id=product_id, rank=rank, recommended_id=-other_id, score=score)
+                    for rank, (score, _, other_id) in enumerate(best)
+                ]
+            with transaction.atomic():
+                ProductRecommendation.objects.filter(product_id__in=chunk).delete()
+                ProductRecommendation.objects.bulk_create(recommendations, batch_size=self.chunk_size)
+            self.products += len(chunk)
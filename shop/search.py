@@ -0,0 +1,244 @@
+import re
+import unicodedata
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+from django.utils.functional import cached_property
+
+FTS_TABLE = 'shop_product_fts'
+
+# Апострофи різних видів прибираємо, щоб «м'ясо», «мʼясо» і «мясо» збігалися
+APOSTROPHES = re.compile("['’ʼ`´]")
+TOKEN = re.compile(r'\w+')
+FOLD = str.maketrans({'ґ': 'г', 'ё': 'е'})
+
+CREATE_SQL = (
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+    "name, category, description, "
+    "tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3 4')"
+)
+DROP_SQL = f'DROP TABLE IF EXISTS {FTS_TABLE}'
+
+# Вага колонок для BM25: збіг у назві важить більше, ніж в описі
+RANK = f'bm25({FTS_TABLE}, 10.0, 4.0, 1.0)'
+MATCH_SQL = f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s'
+
+
+def fts_enabled():
+    """Повнотекстовий індекс доступний лише на SQLite (FTS5)"""
+    return connection.vendor == 'sqlite'
+
+
+def normalize(text):
+    """Нормалізує текст для індексу та запиту (українська та англійська)"""
+    text = unicodedata.normalize('NFKC', text or '').casefold()
+    return APOSTROPHES.sub('', text).translate(FOLD)
+
+
+def build_match(query):
+    """Перетворює запит користувача на вираз FTS5 MATCH з пошуком за префіксом"""
+    tokens = TOKEN.findall(normalize(query))
+    return ' '.join(f'"{token}"*' for token in tokens)
+
+
+def _row(product, category_name):
+    return (product.pk, normalize(product.name), normalize(category_name), normalize(product.description))
+
+
+def index_product(product):
+    """Додає або оновлює товар в індексі"""
+    if not fts_enabled():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [product.pk])
+        cursor.execute(
+            f'INSERT INTO {FTS_TABLE} (rowid, name, category, description) VALUES (%s, %s, %s, %s)',
+            _row(product, product.category.name),
+        )
+
+
+def remove_product(product_id):
+    """Видаляє товар з індексу"""
+    if not fts_enabled():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [product_id])
+
+
+def reindex_category(category):
+    """Оновлює назву категорії в індексі для всіх її товарів"""
+    if not fts_enabled():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'UPDATE {FTS_TABLE} SET category = %s '
+            f'WHERE rowid IN (SELECT id FROM shop_product WHERE category_id = %s)',
+            [normalize(category.name), category.pk],
+        )
+
+
+def rebuild_index(chunk_size=5000):
+    """Повністю перебудовує індекс пакетними вставками, повертає кількість товарів"""
+    from .models import Product
+
+    if not fts_enabled():
+        return 0
+    total = 0
+    with connection.cursor() as cursor:
+        cursor.execute(DROP_SQL)
+        cursor.execute(CREATE_SQL)
+        products = Product.objects.select_related('category').only(
+            'name', 'description', 'category__name'
+        ).order_by('pk')
+        batch = []
+        for product in products.iterator(chunk_size=chunk_size):
+            batch.append(_row(product, product.category.name))
+            if len(batch) >= chunk_size:
+                total += _insert(cursor, batch)
+                batch = []
+        total += _insert(cursor, batch)
+        cursor.execute(f"INSERT INTO {FTS_TABLE} ({FTS_TABLE}) VALUES ('optimize')")
+    return total
+
+
+def index_products(product_ids):
+    """Оновлює в індексі товари з product_ids кількома запитами (масові зміни в обхід сигналів)"""
+    from .models import Product
+
+    product_ids = list(product_ids)
+    if not fts_enabled() or not product_ids:
+        return 0
+    products = Product.objects.filter(pk__in=product_ids).select_related('category').only(
+        'name', 'description', 'category__name'
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {FTS_TABLE} WHERE rowid IN ({", ".join(["%s"] * len(product_ids))})', product_ids
+        )
+        return _insert(cursor, [_row(product, product.category.name) for product in products])
+
+
+def matching_products(query, column=None, limit=None):
+    """Товари, що відповідають запиту, як queryset для підзапитів (наприклад, в адмінці).
+
+    column обмежує пошук однією колонкою індексу: name, category або description;
+    limit лишає лише стільки найрелевантніших збігів.
+    """
+    from .models import Product
+
+    if not fts_enabled():
+        if column is None:
+            return search_products(Product.objects.all(), query, ranked=False)
+        lookup = 'category__name' if column == 'category' else column
+        return Product.objects.filter(**{f'{lookup}__icontains': query})
+    match = build_match(query)
+    if not match:
+        return Product.objects.none()
+    if column:
+        match = f'{column} : ({match})'
+    sql, params = MATCH_SQL, [match]
+    if limit:
+        sql, params = f'{sql} ORDER BY {RANK} LIMIT %s', [match, limit]
+    return Product.objects.filter(pk__in=RawSQL(sql, params))
+
+
+def _insert(cursor, rows):
+    if rows:
+        cursor.executemany(
+            f'INSERT INTO {FTS_TABLE} (rowid, name, category, description) VALUES (%s, %s, %s, %s)', rows
+        )
+    return len(rows)
+
+
+def ranked_ids(query, queryset=None, limit=None):
+    """id товарів queryset, що відповідають запиту, від найрелевантніших.
+
+    Фільтри queryset працюють у тому ж запиті, що й MATCH, тож обмеження
+    limit (SHOP_SEARCH_MAX_RESULTS) відкидає лише найменш релевантні з
+    відфільтрованих товарів.
+    """
+    match = build_match(query)
+    if not match:
+        return []
+    limit = limit or getattr(settings, 'SHOP_SEARCH_MAX_RESULTS', 1000)
+    sql, params = MATCH_SQL, [match]
+    if queryset is not None:
+        # Підзапит — лише відфільтровані збіги (а не всі товари queryset). Унарний плюс не дає FTS5 взяти
+        # rowid IN (...) за обмеження індексу, інакше MATCH виконувався б окремо для кожного id
+        allowed, allowed_params = _matching(queryset, query).order_by().values('pk').query.sql_with_params()
+        sql, params = f'{sql} AND +rowid IN ({allowed})', [*params, *allowed_params]
+    with connection.cursor() as cursor:
+        cursor.execute(f'{sql} ORDER BY {RANK} LIMIT %s', [*params, limit])
+        return [row[0] for row in cursor.fetchall()]
+
+
+def _matching(queryset, query):
+    match = build_match(query)
+    if not match:
+        return queryset.none()
+    return queryset.filter(pk__in=RawSQL(MATCH_SQL, [match]))
+
+
+class RankedResults:
+    """Результати пошуку в порядку релевантності, придатні для Paginator.
+
+    id найрелевантніших товарів із урахуванням фільтрів queryset читаються
+    одним запитом, а товари завантажуються лише для запитаного зрізу (сторінки).
+    """
+
+    def __init__(self, queryset, query):
+        self.queryset = queryset
+        self.query = query
+
+    @cached_property
+    def matched_ids(self):
+        return ranked_ids(self.query, self.queryset)
+
+    def count(self):
+        return len(self.matched_ids)
+
+    def filter(self, *args, **kwargs):
+        """Звужує результати, зберігаючи порядок релевантності"""
+        return RankedResults(self.queryset.filter(*args, **kwargs), self.query)
+
+    def unranked(self):
+        """Усі збіги без обмеження кількості як звичайний queryset (для агрегатів і явного сортування)"""
+        return _matching(self.queryset, self.query)
+
+    def __len__(self):
+        return self.count()
+
+    def __iter__(self):
+        return iter(self[:])
+
+    def __bool__(self):
+        return bool(self.matched_ids)
+
+    def __getitem__(self, key):
+        if not isinstance(key, slice):
+            return self[key:key + 1][0]
+        ids = self.matched_ids[key]
+        products = self.queryset.order_by().in_bulk(ids)
+        return [products[pk] for pk in ids if pk in products]
+
+
+def search_products(queryset, query, ranked=True):
+    """Фільтрує товари за пошуковим запитом (назва, категорія, опис).
+
+    На SQLite використовує індекс FTS5; з ranked=True повертає
+    RankedResults у порядку BM25 (не більше SHOP_SEARCH_MAX_RESULTS),
+    інакше — queryset з усіма збігами без обмеження кількості.
+    На інших базах — запасний шлях через icontains.
+    """
+    if not fts_enabled():
+        return queryset.filter(
+            Q(name__icontains=query) |
+            Q(description__icontains=query) |
+            Q(category__name__icontains=query)
+        )
+
+    if ranked:
+        return RankedResults(queryset, query)
+    return _matching(queryset, query)
@@ -0,0 +1,123 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from . import autocomplete, images, ratings, sales, search
+from .cache import bump_catalog_version, invalidate_categories
+from .inventory import restock
+from .models import Category, Order, OrderItem, Product, ProductImage, Review
+
+
+@receiver(post_save, sender=Product)
+def index_product(sender, instance, raw=False, **kwargs):
+    """Оновлює пошуковий індекс після збереження товару"""
+    if not raw:
+        search.index_product(instance)
+        autocomplete.update_product(instance)
+
+
+@receiver(post_delete, sender=Product)
+def unindex_product(sender, instance, **kwargs):
+    """Видаляє товар з пошукового індексу"""
+    search.remove_product(instance.pk)
+    autocomplete.remove_product(instance.pk)
+
+
+@receiver(post_save, sender=Category)
+def reindex_category(sender, instance, created=False, raw=False, **kwargs):
+    """Оновлює назву категорії в пошуковому індексі її товарів"""
+    if raw:
+        return
+    if not created:
+        search.reindex_category(instance)
+    autocomplete.update_category(instance)
+
+
+@receiver(post_delete, sender=Category)
+def unindex_category(sender, instance, **kwargs):
+    autocomplete.remove_category(instance.pk)
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+@receiver(post_save, sender=ProductImage)
+@receiver(post_delete, sender=ProductImage)
+def invalidate_catalog(sender, **kwargs):
+    """Будь-яка зміна каталогу робить недійсним кеш сторінок і фрагментів"""
+    bump_catalog_version()
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def invalidate_category_navigation(sender, **kwargs):
+    invalidate_categories()
+
+
+@receiver(pre_save, sender=Review)
+def remember_review_state(sender, instance, raw=False, **kwargs):
+    """Запам'ятовує внесок відгуку в рейтинг до збереження"""
+    previous = None
+    if not raw and instance.pk is not None:
+        previous = Review.objects.filter(pk=instance.pk).only('product_id', 'rating', 'is_approved').first()
+    instance._previous_rating_state = ratings.review_state(previous)
+
+
+@receiver(post_save, sender=Review)
+def update_product_rating(sender, instance, raw=False, **kwargs):
+    """Оновлює рейтинг товару; відгуки видно на сайті лише після схвалення, тому кеш залежить тільки від схвалених"""
+    if raw:
+        return
+    previous = getattr(instance, '_previous_rating_state', None)
+    current = ratings.review_state(instance)
+    ratings.review_changed(previous, current)
+    if previous or current:
+        bump_catalog_version()
+
+
+@receiver(pre_delete, sender=Review)
+def remember_deleted_review_state(sender, instance, **kwargs):
+    # Екземпляр у пам'яті міг застаріти (наприклад, після масового схвалення)
+    stored = Review.objects.filter(pk=instance.pk).only('product_id', 'rating', 'is_approved').first()
+    instance._previous_rating_state = ratings.review_state(stored)
+
+
+@receiver(post_delete, sender=Review)
+def remove_product_rating(sender, instance, **kwargs):
+    previous = getattr(instance, '_previous_rating_state', None)
+    if previous:
+        ratings.review_changed(previous, None)
+        bump_catalog_version()
+
+
+@receiver(pre_save, sender=Product)
+@receiver(pre_save, sender=Category)
+@receiver(pre_save, sender=ProductImage)
+def reset_image_variants(sender, instance, raw=False, **kwargs):
+    """Після заміни зображення старі варіанти не показуються, доки не створено нові, а їхні файли видаляються"""
+    if not raw and instance.image_variants and instance.image_variants.get('name') != instance.image.name:
+        old, pk = instance.image_variants, instance.pk
+        instance.image_variants = {}
+        transaction.on_commit(lambda: images.delete_stale_variants(sender, pk, old))
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_save, sender=Category)
+@receiver(post_save, sender=ProductImage)
+def generate_image_variants(sender, instance, raw=False, **kwargs):
+    if not raw and images.needs_variants(instance):
+        images.schedule(instance)
+
+
+@receiver(post_delete, sender=Order)
+def mark_sales_day_dirty(sender, instance, **kwargs):
+    """Видалене замовлення не помітне за відмітками зведень — день перерахується при наступному update"""
+    sales.mark_dirty(instance.created_at)
+
+
+@receiver(pre_delete, sender=OrderItem)
+def restock_deleted_line(sender, instance, **kwargs):
+    """Видалений рядок (окремо чи разом із замовленням) повертає товар на склад, якщо замовлення не скасоване"""
+    if Order.objects.filter(pk=instance.order_id).exclude(status='cancelled').exists():
+        restock([(instance.product_id, instance.quantity)])
@@ -0,0 +1,41 @@
+from django import template
+from django.core.cache import cache
+
+from shop.cache import cache_enabled, cache_timeout, fragment_key, record
+
+register = template.Library()
+
+
+class CatalogCacheNode(template.Node):
+    def __init__(self, nodelist, name, vary_on):
+        self.nodelist = nodelist
+        self.name = name
+        self.vary_on = vary_on
+
+    def render(self, context):
+        if not cache_enabled():
+            return self.nodelist.render(context)
+        parts = [var.resolve(context) for var in self.vary_on]
+        key = fragment_key(context.get('request'), self.name, *parts)
+        content = cache.get(key)
+        record('fragment', hit=content is not None)
+        if content is None:
+            content = self.nodelist.render(context)
+            cache.set(key, content, cache_timeout())
+        return content
+
+
+@register.tag
+def catalogcache(parser, token):
+    """Кешує фрагмент шаблону до наступної зміни каталогу.
+
+    {% catalogcache product_card product.pk %} ... {% endcatalogcache %}
+
+    Всередині не повинно бути нічого персонального (користувач, кошик, CSRF).
+    """
+    bits = token.split_contents()
+    if len(bits) < 2:
+        raise template.TemplateSyntaxError(f'{bits[0]} потребує назви фрагмента')
+    nodelist = parser.parse(('endcatalogcache',))
+    parser.delete_first_token()
+    return CatalogCacheNode(nodelist, bits[1], [parser.compile_filter(bit) for bit in bits[2:]])
@@ -0,0 +1,36 @@
+from django import template
+from django.utils.html import format_html
+
+from shop import images
+
+register = template.Library()
+
+
+@register.simple_tag
+def picture(instance, variant, alt='', sizes=None, **attrs):
+    """Зображення з варіантами WebP/JPEG для srcset; без варіантів — оригінал.
+
+    {% picture product 'card' alt=product.name sizes='(min-width: 768px) 25vw, 50vw' class='card-img-top' %}
+
+    Решта аргументів стає атрибутами <img> (data_url -> data-url).
+    """
+    extra = format_html(
+        ''.join(f' {name.replace("_", "-")}="{{}}"' for name in attrs), *attrs.values()
+    ) if attrs else ''
+    data = instance.image_variants.get(variant) if instance.image_variants else None
+    if not data:
+        return format_html('<img src="{}" alt="{}" loading="lazy"{}>', instance.image.url, alt, extra)
+    sizes = sizes or f'{data["width"]}px'
+    return format_html(
+        '<picture><source type="image/webp" srcset="{}" sizes="{}">'
+        '<img src="{}" srcset="{}" sizes="{}" width="{}" height="{}" alt="{}" loading="lazy"{}></picture>',
+        images.srcset(instance.image_variants, 'webp'), sizes,
+        images.variant_url(instance, variant), images.srcset(instance.image_variants, 'jpeg'), sizes,
+        data['width'], data['height'], alt, extra,
+    )
+
+
+@register.filter
+def variant_url(instance, variant):
+    """{{ image|variant_url:'detail' }} — URL варіанту JPEG або оригіналу"""
+    return images.variant_url(instance, variant)
@@ -1,3 +1,1638 @@
-from django.test import TestCase
+import io
+import shutil
+import tempfile
+import threading
+import time
+from collections import Counter
+from concurrent.futures import Future
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import AnonymousUser, User
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.db import DatabaseError, close_old_connections, connection, transaction
+from django.db.models import F, Sum
+from django.http import HttpResponse
+from django.template.loader import render_to_string
+from django.test import Client, RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from django.utils.http import parse_http_date
+
+from . import autocomplete, cache as catalog_cache, facets, images, ratings, sales
+from .carts import add_items, cart_for, set_quantities
+from .catalog_io import Importer, export_rows, read_rows, write_rows
+from .checkout import place_order
+from .guest_cart import COOKIE_SALT, GuestCart, cookie_name
+from .images import variant_files
+from .instrumentation import query_budget
+from .inventory import OutOfStockError, allocate, release_expired, reserve, reserve_many, restock, unreserve
+from .models import (
+    CARD_DESCRIPTION_LENGTH, CARD_FIELDS, RATING_FIELDS, Cart, CartItem, Category, DailyCategorySales,
+    DailyProductSales, DailySales, Order, OrderItem, Product, ProductImage, ProductPair, ProductRecommendation,
+    Review, StockReservation, cart_totals_expressions,
+)
+from .pagination import CursorPaginator, InvalidCursor, paginate
+from .recommendations import Builder, related_products
+from .search import search_products
+
+SHIPPING = {
+    'shipping_address': 'вул. Тестова, 1',
+    'shipping_city': 'Київ',
+    'shipping_zip_code': '01001',
+    'shipping_phone': '+380000000000',
+}
+
+
+class InventoryConcurrencyTest(TransactionTestCase):
+    """Паралельні оформлення замовлень не продають більше, ніж є на складі"""
+
+    workers = 100
+    stock = 7
+
+    def setUp(self):
+        category = Category.objects.create(name='Тест', slug='test')
+        self.product = Product.objects.create(
+            name='Останній товар', slug='last', description='', category=category,
+            price=Decimal('10.00'), stock=self.stock, image='products/test.jpg',
+        )
+        self.carts = []
+        for i in range(self.workers):
+            cart = Cart.objects.create(user=User.objects.create(username=f'buyer{i}'))
+            CartItem.objects.create(cart=cart, product=self.product, quantity=1)
+            self.carts.append(cart)
+
+    def test_no_oversell(self):
+        results = []
+        barrier = threading.Barrier(self.workers)
+
+        def buy(cart):
+            try:
+                barrier.wait()
+                place_order(cart, **SHIPPING)
+                results.append('ok')
+            except OutOfStockError:
+                results.append('rejected')
+            finally:
+                close_old_connections()
+
+        threads = [threading.Thread(target=buy, args=(cart,)) for cart in self.carts]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.product.refresh_from_db()
+        self.assertEqual(results.count('ok'), self.stock)
+        self.assertEqual(results.count('rejected'), self.workers - self.stock)
+        self.assertEqual(self.product.stock, 0)
+        self.assertEqual(Order.objects.count(), self.stock)
+
+    def test_cancel_restores_stock_once(self):
+        order = place_order(self.carts[0], **SHIPPING)
+        order.status = 'cancelled'
+        order.save()
+        order.save()
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock, self.stock)
+
+    def test_reopen_allocates_again(self):
+        order = place_order(self.carts[0], **SHIPPING)
+        quantity = self.stock - Product.objects.get(pk=self.product.pk).stock
+        for status, stock in (('cancelled', self.stock), ('pending', self.stock - quantity),
+                              ('cancelled', self.stock), ('confirmed', self.stock - quantity)):
+            order.status = status
+            order.save()
+            self.product.refresh_from_db()
+            self.assertEqual(self.product.stock, stock)
+        # Повернути скасоване замовлення можна лише за наявності товару
+        order.status = 'cancelled'
+        order.save()
+        Product.objects.filter(pk=self.product.pk).update(stock=quantity - 1)
+        order.status = 'pending'
+        with self.assertRaises(ValidationError):
+            order.clean()
+        with self.assertRaises(OutOfStockError):
+            order.save()
+        self.assertEqual(Order.objects.get(pk=order.pk).status, 'cancelled')
+        self.assertEqual(Product.objects.get(pk=self.product.pk).stock, quantity - 1)
+
+
+class PlaceOrderTest(TestCase):
+    """Рядки замовлення пишуться з правильними сумами, а збій не лишає часткового замовлення"""
+
+    def setUp(self):
+        category = Category.objects.create(name='Тест', slug='test')
+        self.discounted = Product.objects.create(name='Зі знижкою', slug='discounted', category=category,
+                                                 price=Decimal('100.00'), discount_price=Decimal('89.99'), stock=5)
+        self.regular = Product.objects.create(name='Без знижки', slug='regular', category=category,
+                                              price=Decimal('50.50'), stock=5)
+        self.cart = cart_for(User.objects.create(username='buyer'))
+        add_items(self.cart, {self.discounted.pk: 2, self.regular.pk: 3})
+
+    def test_line_totals(self):
+        order = place_order(self.cart, **SHIPPING)
+        lines = {item.product_id: item for item in order.items.all()}
+        self.assertEqual(
+            {pk: (item.quantity, item.price, item.total_price) for pk, item in lines.items()},
+            {self.discounted.pk: (2, Decimal('89.99'), Decimal('179.98')),
+             self.regular.pk: (3, Decimal('50.50'), Decimal('151.50'))},
+        )
+        self.assertEqual(Order.objects.get(pk=order.pk).total_amount, Decimal('331.48'))
+        self.assertFalse(CartItem.objects.filter(cart=self.cart).exists())
+
+    def test_failure_leaves_nothing(self):
+        with mock.patch.object(OrderItem.objects, 'bulk_create', side_effect=DatabaseError('збій')), \
+                self.assertRaises(DatabaseError):
+            place_order(self.cart, **SHIPPING)
+        self.assertFalse(Order.objects.exists())
+        self.assertFalse(OrderItem.objects.exists())
+        self.assertEqual(list(Product.objects.order_by('pk').values_list('stock', flat=True)), [5, 5])
+        self.assertEqual(CartItem.objects.filter(cart=self.cart).count(), 2)
+
+
+class OrderStockTest(TestCase):
+    """Скасування, видалення й адмінка замовлення узгоджені зі складом"""
+
+    def setUp(self):
+        category = Category.objects.create(name='Тест', slug='test')
+        self.products = [
+            Product.objects.create(
+                name=f'Товар {i}', slug=f'item-{i}', description='', category=category,
+                price=Decimal('10.00'), stock=5, image='products/test.jpg',
+            )
+            for i in range(3)
+        ]
+        self.user = User.objects.create_superuser('admin', 'admin@example.com', 'password')
+        cart = cart_for(self.user)
+        for quantity, product in enumerate(self.products, start=1):
+            CartItem.objects.create(cart=cart, product=product, quantity=quantity)
+        self.order = place_order(cart, **SHIPPING)
+
+    def stocks(self):
+        return list(Product.objects.order_by('pk').values_list('stock', flat=True))
+
+    def test_restock_and_unreserve_in_one_statement(self):
+        lines = [(product.pk, 2) for product in self.products] + [(self.products[0].pk, 1)]
+        with self.assertNumQueries(1):
+            restock(lines)
+        self.assertEqual(self.stocks(), [7, 5, 4])
+        Product.objects.update(reserved=3)
+        with self.assertNumQueries(1):
+            unreserve(lines)
+        self.assertEqual(list(Product.objects.order_by('pk').values_list('reserved', flat=True)), [0, 1, 1])
+
+    def test_delete_returns_stock(self):
+        self.assertEqual(self.stocks(), [4, 3, 2])
+        self.order.items.get(product=self.products[0]).delete()
+        self.assertEqual(self.stocks(), [5, 3, 2])
+        self.order.delete()
+        self.assertEqual(self.stocks(), [5, 5, 5])
+
+    def test_delete_cancelled_keeps_stock(self):
+        self.order.status = 'cancelled'
+        self.order.save()
+        self.assertEqual(self.stocks(), [5, 5, 5])
+        Order.objects.filter(pk=self.order.pk).delete()
+        self.assertEqual(self.stocks(), [5, 5, 5])
+
+    def test_admin_lines_read_only(self):
+        self.client.force_login(self.user)
+        response = self.client.get(f'/admin/shop/order/{self.order.pk}/change/')
+        self.assertNotContains(response, 'name="items-0-quantity"')
+        self.assertContains(response, 'name="items-0-DELETE"')
+        self.assertEqual(self.client.get('/admin/shop/orderitem/add/').status_code, 403)
+        item = self.order.items.first()
+        response = self.client.get(f'/admin/shop/orderitem/{item.pk}/change/')
+        self.assertNotContains(response, 'name="quantity"')
+
+
+@override_settings(SHOP_STOCK_RESERVATIONS=True)
+class StockReservationTest(TestCase):
+    """Резерви кошика: Product.reserved завжди дорівнює сумі резервів, нестача нічого не змінює"""
+
+    def setUp(self):
+        category = Category.objects.create(name='Тест', slug='test')
+        self.products = [
+            Product.objects.create(
+                name=f'Товар {i}', slug=f'item-{i}', description='', category=category,
+                price=Decimal('10.00'), stock=3, image='products/test.jpg',
+            )
+            for i in range(3)
+        ]
+        self.product = self.products[0]
+        self.user = User.objects.create_user('buyer', password='secret-password')
+        self.client.force_login(self.user)
+
+    def add(self, product):
+        return self.client.post(f'/cart/add/{product.pk}/', HTTP_X_REQUESTED_WITH='XMLHttpRequest').json()
+
+    def assertReserved(self, product, quantity):
+        product.refresh_from_db()
+        self.assertEqual(product.reserved, quantity)
+        self.assertEqual(
+            StockReservation.objects.filter(product=product).aggregate(total=Sum('quantity'))['total'] or 0, quantity,
+        )
+
+    def test_add_update_remove(self):
+        self.assertTrue(self.add(self.product)['success'])
+        self.assertTrue(self.add(self.product)['success'])
+        self.assertReserved(self.product, 2)
+        item = CartItem.objects.get(cart__user=self.user, product=self.product)
+        self.client.post(f'/cart/update/{item.pk}/', {'quantity': 3}, HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+        self.assertReserved(self.product, 3)
+        self.client.post(f'/cart/update/{item.pk}/', {'quantity': 1}, HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+        self.assertReserved(self.product, 1)
+        self.client.post(f'/cart/remove/{item.pk}/', HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+        self.assertReserved(self.product, 0)
+        self.assertFalse(CartItem.objects.filter(pk=item.pk).exists())
+
+    def test_failed_reservation_changes_nothing(self):
+        other = Cart.objects.create(user=User.objects.create(username='other'))
+        reserve(other, self.product.pk, 2)
+        self.assertTrue(self.add(self.product)['success'])
+        response = self.add(self.product)
+        self.assertFalse(response['success'])
+        self.assertEqual(CartItem.objects.get(cart__user=self.user, product=self.product).quantity, 1)
+        self.assertReserved(self.product, 3)
+        with self.assertRaises(OutOfStockError):
+            reserve(other, self.product.pk, 3)
+        self.assertReserved(self.product, 3)
+
+    def test_expired_reservations_released(self):
+        self.add(self.product)
+        self.add(self.products[1])
+        other = Cart.objects.create(user=User.objects.create(username='other'))
+        reserve(other, self.product.pk, 1)
+        StockReservation.objects.filter(cart__user=self.user).update(expires_at=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(release_expired(batch_size=1), 2)
+        self.assertReserved(self.product, 1)
+        self.assertReserved(self.products[1], 0)
+        self.assertEqual(StockReservation.objects.get().cart, other)
+
+    def test_checkout_converts_reservations(self):
+        self.add(self.product)
+        self.add(self.products[1])
+        place_order(cart_for(self.user), **SHIPPING)
+        for product in self.products[:2]:
+            self.assertReserved(product, 0)
+            self.assertEqual(product.stock, 2)
+        self.assertFalse(StockReservation.objects.exists())
+
+    def test_allocate_in_one_statement(self):
+        lines = [(self.products[0].pk, 5), (self.products[1].pk, 1), (self.products[2].pk, 4)]
+        with CaptureQueriesContext(connection) as queries, self.assertRaises(OutOfStockError) as error:
+            with transaction.atomic():
+                allocate(lines)
+        self.assertEqual(set(error.exception.shortages), {self.products[0].pk, self.products[2].pk})
+        self.assertEqual(sum(query['sql'].startswith('UPDATE') for query in queries.captured_queries), 1)
+        # Рядок, якому вистачило, відкочено разом з точкою збереження
+        self.assertEqual(Product.objects.get(pk=self.products[1].pk).stock, 3)
+        with self.settings(SHOP_STOCK_RESERVATIONS=False):
+            self.assertEqual(allocate(lines, allow_partial=True), dict(zip(
+                [pk for pk, _ in lines], [3, 1, 3],
+            )))
+        self.assertEqual(list(Product.objects.filter(pk__in=[pk for pk, _ in lines]).values_list('stock', flat=True)),
+                         [0, 2, 0])
+
+    def test_reserve_many_constant_queries(self):
+        cart = cart_for(self.user)
+        first, second, third = (product.pk for product in self.products)
+        reserve_many(cart, {first: 1})
+        # Читання резервів, UPDATE збільшень, UPDATE зменшень, upsert, DELETE знятих, подовження строку
+        # і дві точки збереження (SAVEPOINT/RELEASE) — незалежно від кількості товарів
+        with self.assertNumQueries(10):
+            self.assertEqual(reserve_many(cart, {first: 0, second: 2, third: 3}), {first: 0, second: 2, third: 3})
+        for product, quantity in zip(self.products, (0, 2, 3)):
+            self.assertReserved(product, quantity)
+        other = Cart.objects.create(user=User.objects.create(username='other'))
+        with self.assertRaises(OutOfStockError) as error:
+            reserve_many(other, {first: 2, second: 2, third: 1})
+        self.assertEqual(error.exception.shortages, {second: (2, 1), third: (1, 0)})
+        self.assertReserved(self.products[0], 0)
+        self.assertEqual(reserve_many(other, {first: 2, second: 2, third: 1}, allow_partial=True),
+                         {first: 2, second: 1, third: 0})
+        for product, quantity in zip(self.products, (2, 3, 3)):
+            self.assertReserved(product, quantity)
+
+
+@override_settings(SHOP_STOCK_RESERVATIONS=True)
+class ReservationConcurrencyTest(TransactionTestCase):
+    """Паралельні зміни резервів одного кошика: лічильник Product.reserved збігається з рядками резервів"""
+
+    workers = 20
+
+    def setUp(self):
+        category = Category.objects.create(name='Тест', slug='test')
+        self.products = [
+            Product.objects.create(
+                name=f'Товар {i}', slug=f'product-{i}', description='', category=category,
+                price=Decimal('10.00'), stock=1000, image='products/test.jpg',
+            )
+            for i in range(2)
+        ]
+        self.cart = Cart.objects.create(user=User.objects.create(username='buyer'))
+
+    def test_parallel_reserve(self):
+        errors = []
+        barrier = threading.Barrier(self.workers)
+
+        def hammer(worker):
+            try:
+                barrier.wait()
+                for step in range(5):
+                    reserve_many(self.cart, {product.pk: (worker + step) % 4 for product in self.products})
+                    reserve(self.cart, self.products[worker % 2].pk, step)
+            except Exception as error:
+                errors.append(error)
+            finally:
+                close_old_connections()
+
+        threads = [threading.Thread(target=hammer, args=(worker,)) for worker in range(self.workers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        held = dict(StockReservation.objects.values_list('product_id', 'quantity'))
+        for product in self.products:
+            product.refresh_from_db()
+            self.assertEqual(product.reserved, held.get(product.pk, 0))
+
+
+class CartUpsertConcurrencyTest(TransactionTestCase):
+    """Паралельні додавання в один кошик не гублять приростів"""
+
+    workers = 40
+    adds = 5
+
+    def setUp(self):
+        category = Category.objects.create(name='Тест', slug='test')
+        self.products = [
+            Product.objects.create(
+                name=f'Товар {i}', slug=f'product-{i}', description='', category=category,
+                price=Decimal('10.00'), stock=1000, image='products/test.jpg',
+            )
+            for i in range(2)
+        ]
+        self.user = User.objects.create(username='buyer')
+
+    def test_parallel_adds(self):
+        errors = []
+        barrier = threading.Barrier(self.workers)
+
+        def hammer(worker):
+            client = Client()
+            client.force_login(self.user)
+            product = self.products[worker % len(self.products)]
+            try:
+                barrier.wait()
+                for _ in range(self.adds):
+                    response = client.post(
+                        f'/cart/add/{product.id}/', HTTP_X_REQUESTED_WITH='XMLHttpRequest'
+                    )
+                    if not response.json()['success']:
+                        errors.append(response.json())
+            except Exception as error:
+                errors.append(error)
+            finally:
+                close_old_connections()
+
+        threads = [threading.Thread(target=hammer, args=(worker,)) for worker in range(self.workers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        self.assertEqual(Cart.objects.filter(user=self.user).count(), 1)
+        quantities = dict(CartItem.objects.values_list('product_id', 'quantity'))
+        per_product = self.workers // len(self.products) * self.adds
+        self.assertEqual(quantities, {product.id: per_product for product in self.products})
+
+    def test_add_is_one_query(self):
+        cart = cart_for(self.user)
+        add_items(cart, {self.products[0].id: 1})
+        with self.assertNumQueries(1):
+            result = add_items(cart, {self.products[0].id: 2, self.products[1].id: 1})
+        self.assertEqual(result, {self.products[0].id: 3, self.products[1].id: 1})
+
+
+class CartSummaryTest(TestCase):
+    """Підсумки кошика рахуються в базі одним запитом за ціною зі знижкою"""
+
+    def setUp(self):
+        category = Category.objects.create(name='Тест', slug='test')
+        discounted = Product.objects.create(name='Зі знижкою', slug='discounted', category=category,
+                                            price=Decimal('100.00'), discount_price=Decimal('89.99'))
+        regular = Product.objects.create(name='Без знижки', slug='regular', category=category,
+                                         price=Decimal('50.50'))
+        self.cart = Cart.objects.create(user=User.objects.create(username='buyer'))
+        CartItem.objects.create(cart=self.cart, product=discounted, quantity=2)
+        CartItem.objects.create(cart=self.cart, product=regular, quantity=3)
+
+    def test_totals_in_one_query(self):
+        cart = Cart.objects.get(pk=self.cart.pk)
+        with self.assertNumQueries(1):
+            self.assertEqual(cart.total_items, 5)
+            self.assertEqual(cart.total_price, Decimal('331.48'))
+        self.assertEqual(str(cart.total_price), '331.48')
+        # Те саме з annotate() для списку кошиків (адмінка)
+        totals = Cart.objects.annotate(**cart_totals_expressions('items__')).values('total_items', 'total_price').get()
+        self.assertEqual((totals['total_items'], totals['total_price']), (5, Decimal('331.48')))
+
+    def test_empty_cart(self):
+        CartItem.objects.all().delete()
+        cart = Cart.objects.get(pk=self.cart.pk)
+        with self.assertNumQueries(1):
+            self.assertEqual((cart.total_items, cart.total_price), (0, Decimal('0.00')))
+
+
+@override_settings(SHOP_GUEST_CART_MAX_LINES=3, SHOP_CART_MAX_QUANTITY=10)
+class GuestCartTest(TestCase):
+    """Кошик гостя в підписаному cookie та його перенесення після входу"""
+
+    def setUp(self):
+        category = Category.objects.create(name='Одяг', slug='odiah')
+        self.products = [
+            Product.objects.create(name=f'Товар {i}', slug=f'tovar-{i}', category=category,
+                                   price=Decimal('10.00'), stock=5)
+            for i in range(4)
+        ]
+        self.user = User.objects.create_user('buyer', password='secret-password')
+
+    def set_cookie(self, value):
+        response = HttpResponse()
+        response.set_signed_cookie(cookie_name(), value, salt=COOKIE_SALT)
+        self.client.cookies[cookie_name()] = response.cookies[cookie_name()].value
+
+    def request(self):
+        request = RequestFactory().get('/')
+        request.COOKIES = {name: morsel.value for name, morsel in self.client.cookies.items()}
+        return request
+
+    def test_signed_cookie(self):
+        for _ in range(2):
+            self.client.post(f'/cart/add/{self.products[0].pk}/')
+        self.client.post(f'/cart/add/{self.products[1].pk}/')
+        self.assertFalse(Cart.objects.exists())
+        self.assertEqual(GuestCart.from_request(self.request()).lines, {self.products[0].pk: 2, self.products[1].pk: 1})
+        # Підпис не збігається — кошик порожній
+        self.client.cookies[cookie_name()] = f'{self.products[0].pk}:5'
+        self.assertEqual(GuestCart.from_request(self.request()).lines, {})
+        self.assertEqual(self.client.get('/cart/').context['cart'].total_items, 0)
+
+    def test_oversized_cookie(self):
+        pks = [product.pk for product in self.products]
+        self.set_cookie(f'{pks[0]}:{"9" * 5000},{pks[1]}:7,x:1,{pks[2]}:0,{pks[3]}:1,999999:1')
+        self.assertEqual(GuestCart.from_request(self.request()).lines, {pks[0]: 10, pks[1]: 7, pks[3]: 1})
+        # Кількість обмежується і залишком на складі, а очищений кошик записується в cookie
+        response = self.client.get('/cart/')
+        self.assertEqual([item.quantity for item in response.context['cart_items']], [5, 5, 1])
+        self.assertEqual(GuestCart.from_request(self.request()).lines, {pks[0]: 5, pks[1]: 5, pks[3]: 1})
+
+    def test_merge_on_login(self):
+        first, second = self.products[:2]
+        add_items(cart_for(self.user), {first.pk: 2})
+        self.set_cookie(f'{first.pk}:2,{second.pk}:9')
+        response = self.client.post('/login/', {'username': 'buyer', 'password': 'secret-password'})
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(response.cookies[cookie_name()].value, '')
+        quantities = dict(CartItem.objects.filter(cart__user=self.user).values_list('product_id', 'quantity'))
+        self.assertEqual(quantities, {first.pk: 4, second.pk: 5})
+
+
+@override_settings(SHOP_STOCK_RESERVATIONS=True)
+class CartBatchTest(TestCase):
+    """POST /cart/batch/: абсолютні кількості, 0 видаляє рядок, нестача не змінює нічого"""
+
+    def setUp(self):
+        category = Category.objects.create(name='Одяг', slug='odiah')
+        self.products = [
+            Product.objects.create(name=f'Товар {i}', slug=f'tovar-{i}', category=category,
+                                   price=Decimal('10.00'), stock=5)
+            for i in range(3)
+        ]
+        self.user = User.objects.create_user('buyer', password='secret-password')
+        self.client.force_login(self.user)
+        self.cart = cart_for(self.user)
+        set_quantities(self.cart, {self.products[0].pk: 3, self.products[1].pk: 1})
+        self.items = dict(CartItem.objects.filter(cart=self.cart).values_list('product_id', 'id'))
+
+    def batch(self, *operations):
+        return self.client.post('/cart/batch/', {'operations': list(operations)}, content_type='application/json')
+
+    def state(self):
+        quantities = dict(CartItem.objects.filter(cart=self.cart).values_list('product_id', 'quantity'))
+        reserved = dict(Product.objects.values_list('pk', 'reserved'))
+        return quantities, reserved
+
+    def test_absolute_quantities(self):
+        first, second, third = self.products
+        data = self.batch(
+            {'item_id': self.items[first.pk], 'quantity': 5},
+            {'item_id': self.items[second.pk], 'quantity': 0},
+            {'product_id': third.pk, 'quantity': 2},
+        ).json()
+        self.assertTrue(data['success'])
+        self.assertEqual(self.state(), ({first.pk: 5, third.pk: 2}, {first.pk: 5, second.pk: 0, third.pk: 2}))
+        self.assertEqual(data['cart_total'], 7)
+        self.assertEqual(data['removed'], [self.items[second.pk]])
+        # Повтор того самого пакета нічого не додає
+        self.batch({'item_id': self.items[first.pk], 'quantity': 5})
+        self.assertEqual(self.state()[0][first.pk], 5)
+
+    def test_shortage_rolls_back(self):
+        first, second, third = self.products
+        before = self.state()
+        data = self.batch(
+            {'item_id': self.items[first.pk], 'quantity': 1},
+            {'item_id': self.items[second.pk], 'quantity': 0},
+            {'product_id': third.pk, 'quantity': 6},
+        ).json()
+        self.assertFalse(data['success'])
+        self.assertIn(third.name, data['message'])
+        self.assertEqual(self.state(), before)
+        self.assertEqual(data['items'][str(self.items[first.pk])]['quantity'], 3)
+
+    def test_invalid_request(self):
+        self.assertEqual(self.batch({'item_id': 1, 'product_id': 2, 'quantity': 1}).status_code, 400)
+        self.assertEqual(self.batch(*[{'product_id': 1, 'quantity': 1}] * 101).status_code, 400)
+        self.assertEqual(self.client.post('/cart/batch/', 'x', content_type='application/json').status_code, 400)
+
+
+@override_settings(SHOP_CATALOG_CACHE=False, SHOP_IMAGE_WORKERS=0)
+class QueryBudgetTest(TestCase):
+    """Бюджет SQL-запитів для кожного URL із shop/urls.py; повтори однакових запитів (N+1) заборонені.
+
+    Дані навмисно більші за розмір сторінки, тож запит на кожен рядок одразу перевищить бюджет.
+    """
+
+    products_per_category = 15
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.categories = [Category.objects.create(name=f'Категорія {i}', slug=f'category-{i}') for i in range(3)]
+        cls.products = [
+            Product.objects.create(
+                name=f'Товар {category.pk}-{i}', slug=f'product-{category.pk}-{i}', description='Опис товару ' * 20,
+                category=category, price=Decimal('100.00'), discount_price=Decimal('90.00') if i % 2 else None,
+                stock=100, image='products/missing.jpg', is_featured=i < 3,
+            )
+            for category in cls.categories for i in range(cls.products_per_category)
+        ]
+        cls.product = cls.products[0]
+        cls.user = User.objects.create_user('buyer', password='secret-password')
+        reviewers = [User.objects.create(username=f'reviewer{i}') for i in range(10)]
+        ProductImage.objects.bulk_create(
+            ProductImage(product=cls.product, image=f'products/gallery-{i}.jpg') for i in range(4)
+        )
+        Review.objects.bulk_create(
+            Review(product=cls.product, user=reviewer, rating=4, title='Добре', comment='Добре', is_approved=True)
+            for reviewer in reviewers
+        )
+        cart = cart_for(cls.user)
+        add_items(cart, {product.pk: 1 for product in cls.products[:10]})
+        cls.order = place_order(cart, **SHIPPING)
+        add_items(cart, {product.pk: 2 for product in cls.products[10:20]})
+        cls.cart_item = CartItem.objects.filter(cart=cart).first()
+
+    def setUp(self):
+        cache.clear()
+        catalog_cache.invalidate_categories()
+        facets._indexes.clear()
+
+    def login(self):
+        self.client.force_login(self.user)
+
+    def guest_cart(self):
+        self.client.post(f'/cart/add/{self.product.pk}/', HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+
+    def assertBudget(self, max_queries, method, path, data=None, status=200, max_duplicates=0, **extra):
+        with query_budget(max_queries, max_duplicates):
+            response = getattr(self.client, method)(path, data, **extra)
+        self.assertEqual(response.status_code, status)
+        return response
+
+    def test_home(self):
+        self.assertBudget(2, 'get', '/')
+
+    def test_product_list(self):
+        self.assertBudget(3, 'get', '/catalog/')
+        self.assertBudget(3, 'get', '/catalog/?sort=price&min_price=10&page=2')
+
+    def test_product_list_by_category(self):
+        self.assertBudget(3, 'get', f'/catalog/{self.categories[0].slug}/')
+
+    def test_product_detail(self):
+        # Перший запит — валідатор ETag; без рекомендацій — ще один запит товарів категорії
+        self.assertBudget(7, 'get', f'/product/{self.product.slug}/')
+        with self.settings(SHOP_RECOMMENDATIONS_MIN_SUPPORT=1):
+            Builder().run()
+        self.assertBudget(6, 'get', f'/product/{self.product.slug}/')
+        self.login()
+        self.assertBudget(
+            4, 'post', f'/product/{self.products[1].slug}/',
+            {'rating': 5, 'title': 'Чудово', 'comment': 'Чудово'}, status=302,
+        )
+
+    def test_search(self):
+        self.assertBudget(5, 'get', '/search/', {'q': 'Товар'})
+
+    def test_search_autocomplete(self):
+        # Індекс будується під час старту воркера (autocomplete.warm_up), запит до бази не звертається
+        autocomplete.warm_up(background=False)
+        response = self.assertBudget(0, 'get', '/search/autocomplete/', {'q': 'Тов'})
+        self.assertTrue(response.json()['results'])
+
+    def test_cart_view(self):
+        self.guest_cart()
+        self.assertBudget(2, 'get', '/cart/')
+        self.login()
+        self.assertBudget(5, 'get', '/cart/')
+
+    def test_add_to_cart(self):
+        ajax = {'HTTP_X_REQUESTED_WITH': 'XMLHttpRequest'}
+        self.assertBudget(1, 'post', f'/cart/add/{self.product.pk}/', **ajax)
+        self.login()
+        self.assertBudget(6, 'post', f'/cart/add/{self.product.pk}/', **ajax)
+
+    def test_update_cart_item(self):
+        self.login()
+        self.assertBudget(
+            5, 'post', f'/cart/update/{self.cart_item.pk}/', {'quantity': 3}, HTTP_X_REQUESTED_WITH='XMLHttpRequest'
+        )
+
+    def test_remove_from_cart(self):
+        self.login()
+        self.assertBudget(
+            5, 'post', f'/cart/remove/{self.cart_item.pk}/', HTTP_X_REQUESTED_WITH='XMLHttpRequest'
+        )
+
+    def test_update_cart_batch(self):
+        operations = {'operations': [{'product_id': product.pk, 'quantity': 3} for product in self.products[10:20]]}
+        self.guest_cart()
+        self.assertBudget(1, 'post', '/cart/batch/', operations, content_type='application/json')
+        self.login()
+        self.assertBudget(7, 'post', '/cart/batch/', operations, content_type='application/json')
+
+    def test_checkout(self):
+        self.login()
+        self.assertBudget(6, 'get', '/checkout/')
+        # Склад списується одним умовним UPDATE на всі позиції (inventory.allocate)
+        self.assertBudget(8, 'post', '/checkout/', SHIPPING, status=302)
+
+    def test_csrf_token(self):
+        # Токен для форм кешованих сторінок: без запитів до бази і без збереження в жодному кеші
+        response = self.assertBudget(0, 'get', '/csrf/')
+        self.assertTrue(response.json()['token'])
+        self.assertIn('csrftoken', response.cookies)
+        for directive in ('no-cache', 'no-store', 'must-revalidate', 'private', 'max-age=0'):
+            self.assertIn(directive, response['Cache-Control'])
+        self.assertIn('Expires', response)
+
+    def test_order_list(self):
+        self.login()
+        self.assertBudget(6, 'get', '/orders/')
+
+    def test_order_detail(self):
+        self.login()
+        self.assertBudget(7, 'get', f'/orders/{self.order.pk}/')
+
+    def test_user_login(self):
+        self.assertBudget(1, 'get', '/login/')
+        self.assertBudget(5, 'post', '/login/', {'username': 'buyer', 'password': 'secret-password'}, status=302)
+
+    def test_user_register(self):
+        self.assertBudget(1, 'get', '/register/')
+
+    def test_user_logout(self):
+        self.login()
+        self.assertBudget(4, 'get', '/logout/', status=302)
+
+    def test_user_profile(self):
+        self.login()
+        self.assertBudget(6, 'get', '/profile/')
+
+    def test_change_password(self):
+        self.login()
+        self.assertBudget(5, 'get', '/change-password/')
+
+
+
+@override_settings(SHOP_SEARCH_MAX_RESULTS=20)
+class SearchTest(TestCase):
+    """Фільтри й сортування пошуку застосовуються до всіх збігів, а не до обрізаного списку"""
+
+    def setUp(self):
+        cache.clear()
+        catalog_cache.invalidate_categories()
+        facets._indexes.clear()
+        alpha = Category.objects.create(name='Alpha', slug='alpha')
+        beta = Category.objects.create(name='Beta', slug='beta')
+        # Назви з «widget» релевантніші за опис, тож збіги з beta — останні за BM25
+        for i in range(25):
+            Product.objects.create(
+                name=f'Widget {i}', slug=f'widget-{i}', description='', category=alpha,
+                price=Decimal('100.00') + i, stock=5, image='products/test.jpg',
+            )
+        self.cheap = [
+            Product.objects.create(
+                name=f'Gadget {i}', slug=f'gadget-{i}', description='works like a widget', category=beta,
+                price=Decimal('1.00') + i, stock=5, image='products/test.jpg',
+            ).pk
+            for i in range(3)
+        ]
+
+    def slugs(self, response):
+        return [product.slug for product in response.context['products']]
+
+    def test_search_in_category(self):
+        response = self.client.get('/catalog/beta/', {'search': 'widget'})
+        self.assertEqual(sorted(self.slugs(response)), ['gadget-0', 'gadget-1', 'gadget-2'])
+
+    def test_sorted_search(self):
+        response = self.client.get('/search/', {'q': 'widget', 'sort': 'price_asc'})
+        self.assertEqual(self.slugs(response)[:3], ['gadget-0', 'gadget-1', 'gadget-2'])
+        self.assertEqual(response.context['products'].paginator.count, 28)
+
+    def test_relevance_limit(self):
+        ranked = search_products(Product.objects.filter(is_active=True), 'widget')
+        self.assertEqual(ranked.count(), 20)
+        self.assertNotIn(self.cheap[0], ranked.matched_ids)
+        self.assertEqual(sorted(ranked.filter(category__slug='beta').matched_ids), self.cheap)
+        self.assertEqual(ranked.unranked().count(), 28)
+
+
+class FacetIndexTest(TestCase):
+    """Лічильники бітового індексу збігаються з агрегатним запитом _counts()"""
+
+    def setUp(self):
+        self.category = Category.objects.create(name='Одяг', slug='odiah')
+        other = Category.objects.create(name='Взуття', slug='vzuttia')
+        prices = ['99.99', '499.99', '500.00', '750.00', '1000.00', '2499.99', '2500.00', '6000.00']
+        for i, price in enumerate(prices):
+            price = Decimal(price)
+            # Знижки 40% і менше 1%, резерв на весь залишок, різні середні оцінки
+            product = Product.objects.create(
+                name=f'Товар {i}', slug=f'tovar-{i}', category=self.category, price=price,
+                discount_price=price * Decimal('0.6') if i % 3 == 0 else (price - 1 if i % 3 == 1 else None),
+                stock=i % 4, reserved=1 if i % 4 == 1 else 0, is_featured=i % 2 == 0,
+            )
+            histogram = Counter({'rating_1': 1, f'rating_{i % 5 + 1}': 2})
+            Product.objects.filter(pk=product.pk).update(**histogram)
+        Product.objects.create(name='Чужий', slug='chuzhyi', category=other, price=Decimal('10.00'))
+        Product.objects.create(name='Прихований', slug='pryhovanyi', category=self.category,
+                               price=Decimal('10.00'), is_active=False)
+
+    def test_counts_match_query(self):
+        cases = [
+            {}, {'in_stock': '1'}, {'on_sale': '1', 'featured': '1'}, {'discount': '25'}, {'rating': '3'},
+            {'min_price': '500', 'max_price': '2499.99'}, {'min_price': '0.5', 'rating': '2', 'in_stock': '1'},
+            {'max_price': '499.99', 'discount': '10'}, {'min_price': '7000'},
+        ]
+        for category_id in (self.category.pk, None):
+            index = facets.FacetIndex.build(category_id)
+            self.assertEqual(index.size, 8 if category_id else 9)
+            products = Product.objects.filter(is_active=True)
+            if category_id is not None:
+                products = products.filter(category_id=category_id)
+            for params in cases:
+                with self.subTest(category=category_id, params=params):
+                    filters = facets.CatalogFilters(params)
+                    self.assertEqual(index.counts(filters), facets._counts(products, filters))
+
+    def test_variants_keep_catalog_version(self):
+        from .images import save_variants
+
+        product = Product.objects.create(name='Фото', slug='foto', category=self.category, price=Decimal('1.00'),
+                                         image='products/foto.jpg')
+        version = catalog_cache.catalog_version()
+        self.assertTrue(save_variants(Product, product.pk, {'name': 'products/foto.jpg', 'hash': 'abc'}))
+        self.assertEqual(catalog_cache.catalog_version(), version)
+
+    def in_stock(self, category_id=None):
+        return facets.get_index(None, category_id).counts(facets.CatalogFilters({}))['in_stock']
+
+    def test_in_stock_follows_stock_version(self):
+        facets._indexes.clear()
+        self.assertEqual(self.in_stock(self.category.pk), 4)
+        in_stock = list(Product.objects.filter(category=self.category, stock__gt=F('reserved')).order_by('pk'))
+        with self.captureOnCommitCallbacks(execute=True):
+            allocate([(product.pk, product.stock - product.reserved) for product in in_stock[:2]])
+        # Змінилися лише залишки: один запит оновлює маску «В наявності» без повної побудови
+        with self.assertNumQueries(1):
+            self.assertEqual(self.in_stock(self.category.pk), 2)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.in_stock(self.category.pk), 2)
+        with self.captureOnCommitCallbacks(execute=True):
+            restock([(in_stock[0].pk, 5)])
+        self.assertEqual(self.in_stock(self.category.pk), 3)
+        self.assertEqual(self.in_stock(self.category.pk), facets._counts(
+            Product.objects.filter(category=self.category, is_active=True), facets.CatalogFilters({}),
+        )['in_stock'])
+
+    def test_single_flight_rebuild(self):
+        facets._indexes.clear()
+        stale = facets.FacetIndex.build(self.category.pk)
+        facets._indexes[self.category.pk] = (0, 0, time.monotonic(), stale)
+        facets._building[self.category.pk] = threading.Event()
+        try:
+            # Індекс перебудовує інший потік — цей відповідає попереднім без запитів
+            with self.assertNumQueries(0):
+                self.assertIs(facets.get_index(None, self.category.pk), stale)
+            # Першого індексу ще немає — чекаємо на потік, що його будує
+            del facets._indexes[self.category.pk]
+            fresh = facets.FacetIndex.build(self.category.pk)
+
+            def finish():
+                facets._indexes[self.category.pk] = (0, 0, time.monotonic(), fresh)
+                facets._building.pop(self.category.pk).set()
+
+            threading.Timer(0.1, finish).start()
+            with self.assertNumQueries(0):
+                self.assertIs(facets.get_index(None, self.category.pk), fresh)
+        finally:
+            facets._building.pop(self.category.pk, None)
+
+
+@override_settings(SHOP_IMAGE_WORKERS=0)
+class ImageVariantsTest(TestCase):
+    """Застарілі файли варіантів видаляються після перегенерації чи заміни зображення"""
+
+    def setUp(self):
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media, ignore_errors=True)
+        settings_override = override_settings(MEDIA_ROOT=media)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.category = Category.objects.create(name='Одяг', slug='odiah')
+        self.upload('products/a.png', 'red')
+
+    def upload(self, name, color):
+        from PIL import Image
+
+        buffer = io.BytesIO()
+        Image.new('RGB', (600, 400), color).save(buffer, 'PNG')
+        if default_storage.exists(name):
+            default_storage.delete(name)
+        default_storage.save(name, ContentFile(buffer.getvalue()))
+
+    def product(self, slug, image='products/a.png'):
+        return Product.objects.create(name=slug, slug=slug, category=self.category, price=Decimal('1.00'), image=image)
+
+    def generate(self, **options):
+        call_command('generate_image_variants', workers=1, chunk_size=1, stdout=io.StringIO(), **options)
+
+    def files(self, product):
+        product.refresh_from_db()
+        return variant_files(product.image_variants)
+
+    def test_force_replaces_files(self):
+        product = self.product('a')
+        self.generate()
+        old = self.files(product)
+        self.assertEqual(len(old), 6)
+        self.assertTrue(all(default_storage.exists(path) for path in old))
+        # Вміст змінився під тим самим ім'ям: новий хеш, нові файли
+        self.upload('products/a.png', 'blue')
+        self.generate(force=True)
+        new = self.files(product)
+        self.assertFalse(old & new)
+        self.assertTrue(all(default_storage.exists(path) for path in new))
+        self.assertFalse(any(default_storage.exists(path) for path in old))
+
+    def test_replaced_image(self):
+        product, other = self.product('a'), self.product('b')
+        self.generate()
+        shared = self.files(product)
+        self.assertEqual(self.files(other), shared)
+        self.upload('products/c.png', 'green')
+        product.image = 'products/c.png'
+        with self.captureOnCommitCallbacks(execute=True):
+            product.save()
+        # Файли ще використовує інший товар з тим самим зображенням
+        self.assertTrue(all(default_storage.exists(path) for path in shared))
+        other.image = 'products/c.png'
+        with self.captureOnCommitCallbacks(execute=True):
+            other.save()
+        self.assertFalse(any(default_storage.exists(path) for path in shared))
+        self.assertEqual(self.files(other), self.files(product))
+
+    @override_settings(SHOP_IMAGE_WORKERS=2, SHOP_IMAGE_MAX_PENDING=2)
+    def test_pending_jobs_are_bounded(self):
+        futures = []
+
+        def submit(*args):
+            futures.append(Future())
+            return futures[-1]
+
+        executor = mock.Mock(submit=submit)
+        with mock.patch.object(images, 'get_executor', return_value=executor), \
+                mock.patch.object(images, 'connections'), self.assertLogs('shop.images', 'WARNING') as logs:
+            with self.captureOnCommitCallbacks(execute=True):
+                products = [self.product(slug) for slug in 'abc']
+            self.assertEqual(len(futures), 2)
+            self.assertIn('products/a.png', logs.output[0])
+            # Завершена задача звільняє місце
+            futures[0].set_exception(OSError('тест'))
+            with self.captureOnCommitCallbacks(execute=True):
+                images.schedule(products[2])
+            self.assertEqual(len(futures), 3)
+            self.assertEqual(images._pending, 2)
+            for future in futures[1:]:
+                future.cancel()
+        self.assertEqual(images._pending, 0)
+
+
+class CursorPaginationTest(TestCase):
+    """Курсори проходять усі рядки без пропусків і повторів, зокрема за рівних значень сортування"""
+
+    def setUp(self):
+        category = Category.objects.create(name='Одяг', slug='odiah')
+        # Пари товарів з однаковою ціною: порядок серед рівних визначає id
+        self.products = [
+            Product.objects.create(name=f'Товар {i}', slug=f'tovar-{i}', category=category,
+                                   price=Decimal('10.00') + i // 2, stock=1)
+            for i in range(8)
+        ]
+        self.queryset = Product.objects.all()
+
+    def walk(self, paginator):
+        pages, cursor = [], None
+        while True:
+            page = paginator.page(cursor)
+            pages.append(page)
+            if not page.has_next():
+                return pages
+            cursor = page.next_cursor
+
+    def test_forward_and_back(self):
+        paginator = CursorPaginator(self.queryset, ('-price', 'id'), 3)
+        pages = self.walk(paginator)
+        expected = list(self.queryset.order_by('-price', 'id').values_list('pk', flat=True))
+        self.assertEqual([product.pk for page in pages for product in page], expected)
+        self.assertEqual([len(page) for page in pages], [3, 3, 2])
+        self.assertFalse(pages[0].has_previous())
+        self.assertIsNone(pages[-1].next_cursor)
+        # Назад від останньої сторінки — ті самі сторінки
+        previous = paginator.page(pages[-1].previous_cursor)
+        self.assertEqual(list(previous), list(pages[1]))
+        self.assertEqual(list(paginator.page(previous.previous_cursor)), list(pages[0]))
+        self.assertFalse(paginator.page(previous.previous_cursor).has_previous())
+
+    def test_last_page_exactly_full(self):
+        pages = self.walk(CursorPaginator(self.queryset, ('price', 'id'), 4))
+        self.assertEqual([len(page) for page in pages], [4, 4])
+        self.assertFalse(pages[-1].has_next())
+
+    def test_cursor_round_trip(self):
+        paginator = CursorPaginator(self.queryset, ('price', 'id'), 3)
+        cursor = paginator.page().next_cursor
+        self.assertEqual(paginator._decode(cursor), ('n', [Decimal('11.00'), self.products[2].pk]))
+
+    def test_tampered_cursor(self):
+        paginator = CursorPaginator(self.queryset, ('price', 'id'), 3)
+        cursor = paginator.page().next_cursor
+        with self.assertRaises(InvalidCursor):
+            paginator.page(cursor[:-2] + ('A' if cursor[-1] != 'A' else 'B') + cursor[-1])
+        # Курсор іншого сортування не застосовується
+        with self.assertRaises(InvalidCursor):
+            CursorPaginator(self.queryset, ('-price', 'id'), 3).page(cursor)
+        request = RequestFactory().get('/', {'cursor': 'garbage'})
+        self.assertEqual(list(paginate(request, self.queryset, ('price', 'id'), 3)), self.products[:3])
+
+    def test_list_positions(self):
+        paginator = CursorPaginator(list(range(7)), ('rank',), 3)
+        pages = self.walk(paginator)
+        self.assertEqual([list(page) for page in pages], [[0, 1, 2], [3, 4, 5], [6]])
+        self.assertEqual(list(paginator.page(pages[-1].previous_cursor)), [3, 4, 5])
+        with self.assertRaises(InvalidCursor):
+            paginator.page(paginator._encode('n', -1))
+
+
+class RatingAggregateTest(TestCase):
+    """Інкрементальна гістограма оцінок збігається з повним перерахунком recompute()"""
+
+    def setUp(self):
+        category = Category.objects.create(name='Одяг', slug='odiah')
+        self.products = [
+            Product.objects.create(name=f'Товар {i}', slug=f'tovar-{i}', category=category, price=Decimal('10.00'))
+            for i in range(2)
+        ]
+        self.users = [User.objects.create(username=f'reviewer{i}') for i in range(4)]
+
+    def review(self, product, user, rating, approved=True):
+        return Review.objects.create(product=product, user=user, rating=rating, title='Відгук', comment='',
+                                     is_approved=approved)
+
+    def stored(self):
+        return list(Product.objects.order_by('pk').values_list(*RATING_FIELDS, 'rating_count', 'rating_avg'))
+
+    def assertMatchesRecompute(self):
+        before = self.stored()
+        self.assertEqual(ratings.recompute(), 0)
+        self.assertEqual(self.stored(), before)
+        for product in Product.objects.all():
+            approved = [review.rating for review in product.reviews.filter(is_approved=True)]
+            self.assertEqual(product.rating_count, len(approved))
+            self.assertEqual(product.rating_avg, round(sum(approved) / len(approved), 2) if approved else 0)
+
+    def test_incremental_updates(self):
+        first, second = self.products
+        reviews = [self.review(first, self.users[i], i + 2) for i in range(3)]
+        self.review(second, self.users[0], 1, approved=False)
+        self.assertMatchesRecompute()
+        self.assertEqual(Product.objects.get(pk=first.pk).rating_avg, 3)
+
+        reviews[0].rating = 5
+        reviews[0].save()
+        reviews[1].is_approved = False
+        reviews[1].save()
+        self.assertMatchesRecompute()
+
+        self.assertEqual(ratings.set_approval(Review.objects.all(), True), 2)
+        self.assertMatchesRecompute()
+        self.assertEqual(ratings.set_approval(Review.objects.filter(product=first), False), 3)
+        self.assertMatchesRecompute()
+        ratings.set_approval(Review.objects.all(), True)
+
+        # Екземпляр у пам'яті застарів після масового схвалення
+        reviews[1].delete()
+        self.assertMatchesRecompute()
+        Review.objects.filter(product=first).delete()
+        self.assertMatchesRecompute()
+        self.assertEqual(Product.objects.get(pk=first.pk).rating_count, 0)
+
+    def test_recompute_fixes_drift(self):
+        self.review(self.products[0], self.users[0], 4)
+        Product.objects.filter(pk=self.products[0].pk).update(rating_4=0, rating_1=3)
+        self.assertEqual(ratings.recompute(chunk_size=1), 1)
+        self.assertMatchesRecompute()
+
+
+class AutocompleteTest(TestCase):
+    """Ранжування підказок і перебудова індексу без блокування запитів"""
+
+    def setUp(self):
+        cache.clear()
+        autocomplete._index = None
+        autocomplete._builder = None
+        autocomplete._checked_at = 0.0
+
+    def tearDown(self):
+        # Фонова побудова не повинна пережити тест
+        for thread in threading.enumerate():
+            if thread.name == 'autocomplete-rebuild':
+                thread.join(5)
+
+    def test_categories_before_products(self):
+        index = autocomplete.PrefixIndex(1000)
+        # Понад 200 товарів з тим самим префіксом і ключами, меншими за ключ категорії
+        index.load(('product', pk, f'Lamp {pk:03}', f'lamp-{pk}', 0) for pk in range(300))
+        index.load([('product', 999, 'Lamp Zeta', 'lamp-zeta', 3)])
+        index.load([('category', 1, 'Lamps', 'lamps', autocomplete.CATEGORY_WEIGHT)])
+        found = index.search('lam', 3)
+        self.assertEqual([(kind, pk) for kind, pk, name, slug in found],
+                         [('category', 1), ('product', 999), ('product', 0)])
+
+    def test_key_budget(self):
+        index = autocomplete.PrefixIndex(5)
+        index.load([('product', 1, 'Red Smart Watch', 'watch', 0), ('product', 2, 'Blue Smart Lamp', 'lamp', 0)])
+        # Другий запис із трьома ключами не вміщається в бюджет із п'яти ключів
+        self.assertEqual((len(index), index.key_count), (1, 3))
+        index.add('product', 3, 'Lamp Two', 'lamp-two')
+        self.assertEqual((len(index), index.key_count), (2, 5))
+        index.add('product', 4, 'Desk', 'desk')
+        self.assertEqual(len(index), 2)
+        index.remove('product', 1)
+        index.add('product', 4, 'Desk', 'desk')
+        self.assertEqual((len(index), index.key_count), (2, 3))
+        self.assertEqual(index.search('desk', 5), [('product', 4, 'Desk', 'desk')])
+
+    def test_first_index_built_in_background(self):
+        built = autocomplete.PrefixIndex(10)
+        built.load([('product', 1, 'Lamp', 'lamp', 0)])
+        release = threading.Event()
+
+        def build_index():
+            release.wait(5)
+            return built
+
+        with mock.patch.object(autocomplete, 'build_index', build_index), \
+                mock.patch.object(autocomplete, 'connection'):
+            autocomplete.warm_up()
+            # Запит не чекає на побудову: поки індексу немає, підказок немає
+            self.assertEqual(autocomplete.suggest('lamp'), [])
+            builder = autocomplete._builder
+            autocomplete.get_index()
+            self.assertIs(autocomplete._builder, builder)
+            release.set()
+            builder.join(5)
+        self.assertEqual(autocomplete.suggest('lamp'), [('product', 1, 'Lamp', 'lamp')])
+
+    def test_search_skips_removed_entries(self):
+        index = autocomplete.PrefixIndex(10)
+        index.load([('product', 1, 'Lamp', 'lamp', 0), ('product', 2, 'Lamp Two', 'lamp-two', 0)])
+        # Запис зник між читанням ключів і записів (видалення в іншому потоці)
+        del index.entries[('product', 1)]
+        self.assertEqual(index.search('lamp', 5), [('product', 2, 'Lamp Two', 'lamp-two')])
+
+    def test_limit_is_clamped(self):
+        category = Category.objects.create(name='Lamps', slug='lamps')
+        for i in range(3):
+            Product.objects.create(name=f'Lamp {i}', slug=f'lamp-{i}', category=category, price=Decimal('1.00'))
+        autocomplete.warm_up(background=False)
+        results = self.client.get('/search/autocomplete/', {'q': 'lam', 'limit': -5}).json()['results']
+        self.assertEqual(len(results), 1)
+        results = self.client.get('/search/autocomplete/', {'q': 'lam', 'limit': 'x'}).json()['results']
+        self.assertEqual(len(results), 4)
+
+    def test_rebuild_in_background(self):
+        old = autocomplete.PrefixIndex(10)
+        old.load([('product', 1, 'Old Lamp', 'old-lamp', 0)])
+        new = autocomplete.PrefixIndex(10)
+        new.load([('product', 2, 'New Lamp', 'new-lamp', 0)])
+        autocomplete._index, autocomplete._local_version = old, 1
+        cache.set(autocomplete.VERSION_KEY, 2)
+        started, release = threading.Event(), threading.Event()
+
+        def build_index():
+            started.set()
+            release.wait(5)
+            return new
+
+        with mock.patch.object(autocomplete, 'build_index', build_index), \
+                mock.patch.object(autocomplete, 'connection'):
+            # Поки новий індекс будується, відповідає старий
+            self.assertIs(autocomplete.get_index(), old)
+            self.assertTrue(started.wait(5))
+            self.assertEqual(autocomplete.suggest('lamp'), [('product', 1, 'Old Lamp', 'old-lamp')])
+            release.set()
+            for thread in threading.enumerate():
+                if thread.name == 'autocomplete-rebuild':
+                    thread.join(5)
+        autocomplete._checked_at = 0.0
+        self.assertIs(autocomplete.get_index(), new)
+        self.assertEqual(autocomplete._local_version, 2)
+
+
+class CatalogImportTest(TestCase):
+    """Імпорт оновлює лише присутні колонки, генерує унікальні slug і не зупиняється на помилках"""
+
+    def setUp(self):
+        self.category = Category.objects.create(name='Чохли', slug='cases')
+        Product.objects.create(
+            name='Чохол для телефону', slug='chokhol-dlia-telefonu', description='', category=self.category,
+            price=Decimal('100.00'), stock=5, image='products/test.jpg',
+        )
+
+    def run_import(self, text, fmt='csv'):
+        errors = []
+        importer = Importer(on_error=lambda number, message: errors.append((number, message)))
+        importer.run(read_rows(io.StringIO(text), fmt))
+        return importer, errors
+
+    def test_upsert_partial_and_errors(self):
+        importer, errors = self.run_import(
+            'slug,name,category,price,stock\n'
+            ',Чохол для телефону,cases,120.50,3\n'
+            ',Чохол для телефону,Чохли,99,1\n'
+            'chokhol-dlia-telefonu,,,,\n'
+            'bad,Товар,missing,10,1\n'
+            'neg,Товар,cases,-1,1\n'
+        )
+        self.assertEqual((importer.created, importer.updated), (2, 0))
+        self.assertEqual([number for number, _ in errors], [4, 5, 6])
+        self.assertQuerySetEqual(
+            Product.objects.order_by('slug').values_list('slug', flat=True),
+            ['chokhol-dlia-telefonu', 'chokhol-dlia-telefonu-2', 'chokhol-dlia-telefonu-3'],
+        )
+
+        importer, errors = self.run_import('{"slug": "chokhol-dlia-telefonu", "stock": 42}\n', 'jsonl')
+        self.assertEqual((importer.updated, errors), (1, []))
+        product = Product.objects.get(slug='chokhol-dlia-telefonu')
+        self.assertEqual((product.stock, product.price, product.name), (42, Decimal('100.00'), 'Чохол для телефону'))
+
+    def test_export_round_trip(self):
+        stream = io.StringIO()
+        self.assertEqual(write_rows(stream, export_rows(Product.objects.all()), 'csv'), 1)
+        Product.objects.update(price=Decimal('1.00'))
+        importer, errors = self.run_import(stream.getvalue())
+        self.assertEqual((importer.updated, errors), (1, []))
+        self.assertEqual(Product.objects.get().price, Decimal('100.00'))
+
+
+class OrderExportTest(TestCase):
+    """Експорт замовлень віддається потоком і враховує фільтри списку"""
+
+    def setUp(self):
+        user = User.objects.create_superuser('admin', 'admin@example.com', 'password')
+        category = Category.objects.create(name='Тест', slug='test')
+        product = Product.objects.create(
+            name='Товар', slug='item', description='', category=category,
+            price=Decimal('10.00'), stock=5, image='products/test.jpg',
+        )
+        for number, status in enumerate(['delivered', 'delivered', 'cancelled']):
+            order = Order.objects.create(user=user, order_number=f'N{number}', status=status,
+                                         total_amount=Decimal('20.00'), **SHIPPING)
+            if number:
+                OrderItem.objects.create(order=order, product=product, quantity=2, price=Decimal('10.00'))
+        self.client.force_login(user)
+
+    def test_admin_action_streams_filtered_orders(self):
+        response = self.client.post('/admin/shop/order/?status__exact=delivered', {
+            'action': 'export_csv', 'select_across': '1', 'index': '0',
+            '_selected_action': Order.objects.values_list('pk', flat=True),
+        })
+        self.assertTrue(response.streaming)
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(len(lines), 3)
+        self.assertEqual([line.split(',')[0] for line in lines[1:]], ['N0', 'N1'])
+        self.assertTrue(lines[1].endswith(',' * 6))
+        self.assertIn('item,Товар,2,10.00,20.00', lines[2])
+
+
+class AdminScalingTest(TestCase):
+    """Списки адмінки: сталий бюджет запитів, пошук за індексами й оцінка кількості"""
+
+    def setUp(self):
+        self.admin = User.objects.create_superuser('admin', 'admin@example.com', 'password')
+        category = Category.objects.create(name='Одяг', slug='clothes')
+        self.products = [
+            Product.objects.create(
+                name=f'{name} {i}', slug=f'item-{i}', description='', category=category,
+                price=Decimal('10.00'), stock=5, image='products/test.jpg',
+            )
+            for i, name in enumerate(['Футболка', 'Светр'] * 5)
+        ]
+        for i in range(10):
+            user = User.objects.create(username=f'buyer{i}')
+            order = Order.objects.create(user=user, order_number=f'AB{i:04d}', total_amount=Decimal('10.00'), **SHIPPING)
+            OrderItem.objects.create(order=order, product=self.products[i], quantity=1, price=Decimal('10.00'))
+            Review.objects.create(product=self.products[i], user=user, rating=5, title='Добре', comment='')
+            CartItem.objects.create(cart=Cart.objects.create(user=user), product=self.products[i], quantity=1)
+        self.client.force_login(self.admin)
+
+    def get(self, path, max_queries=9):
+        with query_budget(max_queries):
+            response = self.client.get(path)
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def test_changelists_within_budget(self):
+        for model in ('product', 'productimage', 'cart', 'cartitem', 'order', 'orderitem', 'review'):
+            with self.subTest(model=model):
+                self.get(f'/admin/shop/{model}/')
+                self.get(f'/admin/shop/{model}/?q=buyer')
+
+    def test_indexed_search(self):
+        self.assertEqual(self.get('/admin/shop/order/?q=ab000').context['cl'].result_count, 10)
+        self.assertEqual(self.get('/admin/shop/order/?q=buyer3').context['cl'].result_count, 1)
+        self.assertEqual(self.get('/admin/shop/product/?q=футболк').context['cl'].result_count, 5)
+        self.assertEqual(self.get('/admin/shop/review/?q=светр').context['cl'].result_count, 5)
+
+    @override_settings(SHOP_ADMIN_EXACT_COUNT_LIMIT=3)
+    def test_estimated_count(self):
+        cl = self.get('/admin/shop/order/').context['cl']
+        self.assertEqual(cl.result_count, 10)
+        self.assertFalse(cl.show_full_result_count)
+        Order.objects.filter(order_number='AB0004').delete()
+        self.assertEqual(self.get('/admin/shop/order/').context['cl'].result_count, 10)
+        self.assertEqual(self.get('/admin/shop/order/?q=ab000').context['cl'].result_count, 9)
+
+
+class RecommendationTest(TestCase):
+    """«Часто купують разом»: інкрементний перерахунок дає те саме, що й повний"""
+
+    def setUp(self):
+        self.user = User.objects.create(username='buyer')
+        category = Category.objects.create(name='Тест', slug='test')
+        self.products = [
+            Product.objects.create(
+                name=f'Товар {i}', slug=f'item-{i}', description='', category=category,
+                price=Decimal('10.00'), stock=5, image='products/test.jpg',
+            )
+            for i in range(6)
+        ]
+
+    def order(self, *indexes, status='delivered'):
+        order = Order.objects.create(user=self.user, status=status, total_amount=Decimal('10.00'), **SHIPPING)
+        OrderItem.objects.bulk_create(
+            OrderItem(order=order, product=self.products[i], quantity=1, price=Decimal('10.00'), total_price=0)
+            for i in indexes
+        )
+
+    def snapshot(self):
+        return (
+            list(ProductPair.objects.order_by('product', 'other').values_list('product', 'other', 'orders')),
+            list(ProductRecommendation.objects.order_by('product', 'rank').values_list('product', 'recommended')),
+        )
+
+    def test_incremental_matches_rebuild(self):
+        self.order(0, 1)
+        self.order(0, 1, 2)
+        self.order(0, 2)
+        self.assertEqual(Builder().run().orders, 3)
+        self.order(1, 2)
+        self.order(0, 1)
+        self.order(0, 3, status='cancelled')
+        self.assertEqual(Builder(max_pairs=2).run().orders, 2)
+        incremental = self.snapshot()
+        self.assertEqual(Builder().run(rebuild=True).orders, 5)
+        self.assertEqual(self.snapshot(), incremental)
+        self.assertIn((self.products[0].pk, self.products[1].pk, 3), incremental[0])
+
+    def test_cancel_and_reopen(self):
+        self.order(0, 1)
+        self.order(0, 1, 2)
+        self.order(0, 2)
+        Builder().run()
+        order = Order.objects.order_by('pk')[1]
+        order.status = 'cancelled'
+        order.save()
+        # Скасування вже врахованого замовлення віднімає його пари так само, як повний перерахунок
+        cancelled = self.snapshot()
+        self.assertNotIn(self.products[2].pk, [recommended for _, recommended in cancelled[1]])
+        Builder().run(rebuild=True)
+        self.assertEqual(self.snapshot(), cancelled)
+        order.status = 'processing'
+        order.save()
+        reopened = self.snapshot()
+        Builder().run(rebuild=True)
+        self.assertEqual(self.snapshot(), reopened)
+        self.assertIn((self.products[0].pk, self.products[1].pk, 2), reopened[0])
+
+    def test_related_products(self):
+        first, second, third = self.products[:3]
+        for _ in range(2):
+            self.order(0, 1)
+            self.order(0, 2)
+        self.order(0, 2)
+        Builder().run()
+        self.assertEqual([product.pk for product in related_products(first, limit=2)], [third.pk, second.pk])
+        # Неактивні рекомендації пропускаються, а решта місць заповнюється товарами категорії
+        Product.objects.filter(pk=third.pk).update(is_active=False)
+        related = [product.pk for product in related_products(first)]
+        self.assertEqual(related[0], second.pk)
+        self.assertEqual(len(related), 4)
+        self.assertNotIn(third.pk, related)
+        self.assertNotIn(first.pk, related)
+
+
+class SalesRollupTest(TestCase):
+    """Зведення продажів: інкрементне оновлення дає те саме, що й повний перерахунок"""
+
+    def setUp(self):
+        self.user = User.objects.create(username='buyer')
+        self.categories = [Category.objects.create(name=f'Категорія {i}', slug=f'category-{i}') for i in range(2)]
+        self.products = [
+            Product.objects.create(
+                name=f'Товар {i}', slug=f'item-{i}', description='', category=self.categories[i % 2],
+                price=Decimal('10.00'), stock=50, image='products/test.jpg',
+            )
+            for i in range(3)
+        ]
+        self.today = timezone.localdate()
+
+    def order(self, days_ago, *lines):
+        order = Order.objects.create(user=self.user, total_amount=Decimal('0.00'), **SHIPPING)
+        Order.objects.filter(pk=order.pk).update(created_at=timezone.now() - timedelta(days=days_ago))
+        order.refresh_from_db(fields=['created_at'])
+        OrderItem.objects.bulk_create(
+            OrderItem(
+                order=order, product=self.products[i], quantity=quantity, price=Decimal('10.00'),
+                total_price=Decimal('10.00') * quantity,
+            )
+            for i, quantity in lines
+        )
+        return order
+
+    def snapshot(self):
+        return [
+            list(model.objects.order_by('day', *fields).values_list('day', *fields, 'orders', 'units', 'revenue'))
+            for model, fields in ((DailySales, ()), (DailyProductSales, ('product',)),
+                                  (DailyCategorySales, ('category',)))
+        ]
+
+    def test_incremental_matches_rebuild(self):
+        self.order(2, (0, 1), (1, 2))
+        cancelled = self.order(1, (0, 3))
+        self.assertEqual(sales.update(), 2)
+        self.assertEqual(DailySales.objects.get(day=self.today - timedelta(days=1)).revenue, Decimal('30.00'))
+
+        self.order(0, (2, 1))
+        cancelled.status = 'cancelled'
+        cancelled.save()
+        deleted = self.order(2, (1, 5))
+        self.assertEqual(sales.update(), 3)
+        self.assertFalse(DailySales.objects.filter(day=self.today - timedelta(days=1)).exists())
+        self.assertEqual(DailySales.objects.get(day=self.today - timedelta(days=2)).units, 8)
+        deleted.delete()
+        self.assertTrue(DailySales.objects.get(day=self.today - timedelta(days=2)).dirty)
+        sales.update()
+        incremental = self.snapshot()
+
+        self.assertEqual(sales.rebuild(workers=1, chunk_days=2), 3)
+        self.assertEqual(self.snapshot(), incremental)
+        self.assertEqual(incremental[0], [
+            (self.today - timedelta(days=2), 1, 3, Decimal('30.00')),
+            (self.today, 1, 1, Decimal('10.00')),
+        ])
+        self.assertIn(
+            (self.today - timedelta(days=2), self.categories[1].pk, 1, 2, Decimal('20.00')), incremental[2],
+        )
+
+    def test_dashboard_within_budget(self):
+        for days_ago in range(5):
+            self.order(days_ago, (0, 1), (1, 1))
+        sales.rebuild(workers=1)
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'password'))
+        with query_budget(8):
+            response = self.client.get('/admin/shop/dailysales/?days=7')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['total_orders'], 5)
+        self.assertEqual(len(response.context['days']), 7)
+        self.assertEqual(response.context['top_products'][0]['total_revenue'], Decimal('50.00'))
+
+
+@override_settings(SHOP_CATALOG_CACHE=False)
+class ProductCardTest(TestCase):
+    """Картки товарів читають лише CARD_FIELDS, а короткий опис обрізає база"""
+
+    def setUp(self):
+        category = Category.objects.create(name='Одяг', slug='clothes')
+        for slug, description in (('long', 'Дуже довгий опис. ' * 20), ('exact', 'а' * CARD_DESCRIPTION_LENGTH),
+                                  ('short', 'Короткий опис')):
+            Product.objects.create(name=slug, slug=slug, description=description, category=category,
+                                   price=Decimal('10.00'), discount_price=Decimal('8.00'), image='products/test.jpg')
+
+    def test_card_fields_and_short_description(self):
+        cards = {product.slug: product for product in Product.objects.cards()}
+        deferred = {field.attname for field in Product._meta.concrete_fields} - set(CARD_FIELDS)
+        self.assertIn('description', deferred)
+        for product in cards.values():
+            self.assertEqual(product.get_deferred_fields(), deferred)
+        long_description = Product.objects.get(slug='long').description
+        self.assertEqual(cards['long'].short_description, long_description[:CARD_DESCRIPTION_LENGTH - 1] + '…')
+        self.assertEqual(len(cards['long'].short_description), CARD_DESCRIPTION_LENGTH)
+        self.assertEqual(cards['exact'].short_description, 'а' * CARD_DESCRIPTION_LENGTH)
+        self.assertEqual(cards['short'].short_description, 'Короткий опис')
+        # Рендер картки не довантажує відкладені поля
+        with self.assertNumQueries(0):
+            html = ''.join(
+                render_to_string('shop/includes/product_card.html', {'product': product}) for product in cards.values()
+            )
+        self.assertIn('Короткий опис', html)
+        self.assertIn('-20%', html)
+
+
+@override_settings(SHOP_CATALOG_CACHE=False)
+class EffectivePriceTest(TestCase):
+    """Сортування й фільтр ціни каталогу враховують ціну зі знижкою (effective_price)"""
+
+    def setUp(self):
+        category = Category.objects.create(name='Одяг', slug='clothes')
+        for slug, price, discount_price in (('a', '100.00', '40.00'), ('b', '60.00', None), ('c', '80.00', '70.00')):
+            Product.objects.create(
+                name=slug, slug=slug, category=category, price=Decimal(price),
+                discount_price=Decimal(discount_price) if discount_price else None,
+            )
+
+    def slugs(self, **params):
+        response = self.client.get('/catalog/', params)
+        return [product.slug for product in response.context['products']]
+
+    def test_sort_and_filter(self):
+        self.assertEqual(Product.objects.get(slug='a').effective_price, Decimal('40.00'))
+        self.assertEqual(self.slugs(sort='price_asc'), ['a', 'b', 'c'])
+        self.assertEqual(self.slugs(sort='price_desc'), ['c', 'b', 'a'])
+        # Звичайна ціна «a» (100) більша за межі — фільтрується саме ціна зі знижкою
+        self.assertEqual(self.slugs(sort='price_asc', min_price='50'), ['b', 'c'])
+        self.assertEqual(self.slugs(sort='price_asc', max_price='65'), ['a', 'b'])
+        self.assertEqual(self.slugs(sort='price_asc', min_price='40', max_price='60'), ['a', 'b'])
+        product = Product.objects.get(slug='a')
+        product.discount_price = None
+        product.save()
+        self.assertEqual(self.slugs(sort='price_asc'), ['b', 'c', 'a'])
+        self.assertEqual(self.slugs(sort='price_asc', max_price='65'), ['b'])
+
+
+class CatalogCacheTest(TestCase):
+    """Кеш сторінок каталогу: повторний перегляд без запитів, зміна товару — свіжа сторінка"""
+
+    def setUp(self):
+        cache.clear()
+        catalog_cache.invalidate_categories()
+        self.category = Category.objects.create(name='Одяг', slug='clothes')
+        self.product = Product.objects.create(
+            name='Футболка', slug='t-shirt', description='', category=self.category,
+            price=Decimal('10.00'), stock=5, image='products/test.jpg',
+        )
+
+    def test_page_served_from_cache(self):
+        first = self.client.get('/catalog/clothes/')
+        self.assertContains(first, 'Футболка')
+        with self.assertNumQueries(0):
+            second = self.client.get('/catalog/clothes/')
+        self.assertEqual(second.content, first.content)
+        self.product.name = 'Сорочка'
+        self.product.save()
+        fresh = self.client.get('/catalog/clothes/')
+        self.assertContains(fresh, 'Сорочка')
+        self.assertNotContains(fresh, 'Футболка')
+
+    def test_categories_kept_in_process(self):
+        request = RequestFactory().get('/')
+        request.user = AnonymousUser()
+        self.assertEqual([category.slug for category in catalog_cache.catalog_categories()], ['clothes'])
+        # Навігація в шаблоні бере категорії з пам'яті процесу
+        with self.assertNumQueries(0):
+            html = render_to_string('shop/base.html', request=request)
+        self.assertIn('Одяг', html)
+        shoes = Category.objects.create(name='Взуття', slug='shoes')
+        with self.assertNumQueries(1):
+            slugs = {category.slug for category in catalog_cache.catalog_categories()}
+        self.assertEqual(slugs, {'clothes', 'shoes'})
+        shoes.delete()
+        with self.assertNumQueries(1):
+            self.assertEqual([category.slug for category in catalog_cache.catalog_categories()], ['clothes'])
+
+
+class ConditionalGetTest(TestCase):
+    """ETag / Last-Modified: незмінна сторінка — 304 без рендерингу, зміна товару чи залишку — нова сторінка"""
+
+    def setUp(self):
+        cache.clear()
+        catalog_cache.invalidate_categories()
+        self.category = Category.objects.create(name='Одяг', slug='clothes')
+        self.product = Product.objects.create(
+            name='Футболка', slug='t-shirt', description='', category=self.category,
+            price=Decimal('10.00'), stock=5, image='products/test.jpg',
+        )
+
+    def revalidate(self, path, response, max_queries=1):
+        with query_budget(max_queries):
+            return self.client.get(path, HTTP_IF_NONE_MATCH=response['ETag'])
+
+    def test_not_modified(self):
+        for path in ('/', '/catalog/', '/catalog/clothes/', '/product/t-shirt/'):
+            with self.subTest(path=path):
+                response = self.client.get(path)
+                self.assertEqual(response.status_code, 200)
+                # Без Set-Cookie відповідь може зберегти спільний кеш
+                self.assertFalse(response.cookies)
+                self.assertIn('Last-Modified', response)
+                self.assertIn('public', response['Cache-Control'])
+                self.assertIn('s-maxage', response['Cache-Control'])
+                self.assertIn('Cookie', response['Vary'])
+                revalidated = self.revalidate(path, response)
+                self.assertEqual(revalidated.status_code, 304)
+                self.assertEqual(revalidated['ETag'], response['ETag'])
+
+    def test_csrf_token_outside_page(self):
+        response = self.client.get('/catalog/')
+        token = self.client.get('/csrf/')
+        self.assertTrue(token.json()['token'])
+        self.assertIn('csrftoken', token.cookies)
+        self.assertIn('no-store', token['Cache-Control'])
+        # Токен не входить у сторінку, тож і ETag той самий, а проксі й далі може її кешувати
+        revalidated = self.revalidate('/catalog/', response)
+        self.assertEqual(revalidated.status_code, 304)
+        self.assertFalse(revalidated.cookies)
+        self.assertIn('public', revalidated['Cache-Control'])
+
+    def test_last_modified_follows_catalog(self):
+        catalog_cache.bump_catalog_version()
+        response = self.client.get('/')
+        self.assertEqual(parse_http_date(response['Last-Modified']), cache.get(catalog_cache.CHANGED_KEY))
+
+    def test_changes_invalidate(self):
+        path = '/product/t-shirt/'
+        response = self.client.get(path)
+        Product.objects.filter(pk=self.product.pk).update(stock=4)
+        self.assertEqual(self.revalidate(path, response, max_queries=9).status_code, 200)
+        response = self.client.get(path)
+        self.product.refresh_from_db()
+        self.product.price = Decimal('12.00')
+        self.product.save()
+        self.assertEqual(self.revalidate(path, response, max_queries=9).status_code, 200)
+        self.assertEqual(self.client.get('/product/missing/').status_code, 404)
+
+    def test_personal_pages(self):
+        response = self.client.get('/catalog/')
+        self.client.post(f'/cart/add/{self.product.pk}/', HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+        # Інший кошик — інший лічильник у шапці, тож і ETag інший; кешувати може лише браузер
+        changed = self.client.get('/catalog/', HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(changed.status_code, 200)
+        self.assertIn('private', changed['Cache-Control'])
+        self.client.force_login(User.objects.create_user('buyer', password='secret-password'))
+        response = self.client.get('/catalog/')
+        self.assertNotIn('ETag', response)
+        self.assertIn('private', response['Cache-Control'])
@@ -16,12 +16,15 @@ urlpatterns = [
     
     # Пошук
     path('search/', views.search, name='search'),
+    path('search/autocomplete/', views.search_autocomplete, name='search_autocomplete'),
     
     # Кошик
     path('cart/', views.cart_view, name='cart_view'),
     path('cart/add/<int:product_id>/', views.add_to_cart, name='add_to_cart'),
     path('cart/update/<int:item_id>/', views.update_cart_item, name='update_cart_item'),
     path('cart/remove/<int:item_id>/', views.remove_from_cart, name='remove_from_cart'),
+    path('cart/batch/', views.update_cart_batch, name='update_cart_batch'),
+    path('csrf/', views.csrf_token, name='csrf_token'),
     
     # Замовлення
     path('checkout/', views.checkout, name='checkout'),
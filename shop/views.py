@@ -1,21 +1,38 @@
+import json
+from decimal import Decimal
+
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth import login, authenticate, logout
 from django.contrib.auth.models import User
 from django.contrib import messages
-from django.db.models import Q
-from django.http import JsonResponse
+from django.db import transaction
+from django.http import Http404, JsonResponse
+from django.middleware.csrf import get_token
+from django.views.decorators.cache import never_cache
+from django.views.decorators.csrf import ensure_csrf_cookie
 from django.views.decorators.http import require_POST
-from django.core.paginator import Paginator
 from django.urls import reverse
-from .models import Category, Product, Cart, CartItem, Order, OrderItem, Review
+from .models import Category, Product, CartItem, Order, Review
 from .forms import ReviewForm, CheckoutForm, UserRegistrationForm, UserLoginForm, UserProfileForm
-
-
+from .carts import add_items, cart_for, set_quantities, set_quantity
+from .checkout import EmptyCartError, place_order
+from .guest_cart import GuestCart, GuestCartFull, merge_guest_cart
+from .inventory import OutOfStockError, reservations_enabled, reserve
+from . import autocomplete, recommendations
+from .cache import cache_catalog_page, catalog_categories
+from .conditional import conditional_catalog_page
+from .facets import CatalogFilters, build_facets
+from .pagination import paginate
+from .search import RankedResults, search_products
+
+
+@conditional_catalog_page()
+@cache_catalog_page
 def home(request):
     """Головна сторінка з рекомендованими товарами"""
-    featured_products = Product.objects.filter(is_featured=True, is_active=True)[:8]
-    categories = Category.objects.all()[:6]
+    featured_products = Product.objects.cards().filter(is_featured=True, is_active=True)[:8]
+    categories = catalog_categories()[:6]
     
     context = {
         'featured_products': featured_products,
@@ -24,59 +41,97 @@ def home(request):
     return render(request, 'shop/home.html', context)
 
 
-def product_list(request, category_slug=None):
-    """Список товарів з фільтрацією по категоріях"""
-    category = None
-    categories = Category.objects.all()
-    products = Product.objects.filter(is_active=True)
+# Порядок сортування каталогу; id розв'язує рівні значення для пагінації за курсором
+PRODUCT_ORDERINGS = {
+    'created_at': ('-created_at', '-id'),
+    'price_asc': ('effective_price', 'id'),
+    'price_desc': ('-effective_price', '-id'),
+    'name': ('name', 'id'),
+    'rating': ('-rating_avg', '-rating_count', '-id'),
+    'discount': ('-discount_percent', '-id'),
+}
+
+
+def _catalog_page(request, products, search_query, category=None):
+    """Фільтри, фасети, пошук, сортування та пагінація каталогу; повертає контекст для шаблону"""
+    filters = CatalogFilters(request.GET)
     
-    if category_slug:
-        category = get_object_or_404(Category, slug=category_slug)
-        products = products.filter(category=category)
+    # Пошук (без явного сортування результати йдуть за релевантністю)
+    by_relevance = bool(search_query) and 'sort' not in request.GET
+    if search_query:
+        products = search_products(products, search_query, ranked=by_relevance)
     
-    # Пошук
-    search_query = request.GET.get('search')
+    # Лічильники фасетів рахуються до фільтрів, фільтри (ціна, знижка, рейтинг, прапорці) — за індексами
     if search_query:
-        products = products.filter(
-            Q(name__icontains=search_query) | 
-            Q(description__icontains=search_query)
+        facets = build_facets(
+            request, filters, queryset=products.unranked() if isinstance(products, RankedResults) else products
         )
+    else:
+        facets = build_facets(request, filters, category_id=category.pk if category else None)
+    products = filters.apply(products)
     
     # Сортування
     sort_by = request.GET.get('sort', 'created_at')
-    if sort_by == 'price_asc':
-        products = products.order_by('price')
-    elif sort_by == 'price_desc':
-        products = products.order_by('-price')
-    elif sort_by == 'name':
-        products = products.order_by('name')
-    else:
-        products = products.order_by('-created_at')
+    if sort_by not in PRODUCT_ORDERINGS:
+        sort_by = 'created_at'
+    if by_relevance:
+        sort_by = ''
     
     # Пагінація
-    paginator = Paginator(products, 12)
-    page_number = request.GET.get('page')
-    products = paginator.get_page(page_number)
+    products = paginate(request, products, PRODUCT_ORDERINGS.get(sort_by, ()), 12)
     
+    return {
+        'products': products,
+        'sort_by': sort_by,
+        'filters': filters,
+        'facets': facets,
+    }
+
+
+def _category_timestamps(request, category_slug=None):
+    if not category_slug:
+        return ()
+    category = next((item for item in catalog_categories() if item.slug == category_slug), None)
+    return None if category is None else (category.updated_at,)
+
+
+@conditional_catalog_page(_category_timestamps)
+@cache_catalog_page
+def product_list(request, category_slug=None):
+    """Список товарів з фільтрацією по категоріях"""
+    category = None
+    categories = catalog_categories()
+    products = Product.objects.cards().filter(is_active=True)
+    
+    if category_slug:
+        category = next((item for item in categories if item.slug == category_slug), None)
+        if category is None:
+            category = get_object_or_404(Category, slug=category_slug)
+        products = products.filter(category=category)
+    
+    search_query = request.GET.get('search')
     context = {
         'category': category,
         'categories': categories,
-        'products': products,
         'search_query': search_query,
-        'sort_by': sort_by,
+        **_catalog_page(request, products, search_query, category),
     }
     return render(request, 'shop/product_list.html', context)
 
 
+def _product_timestamps(request, product_slug):
+    # Залишки змінюються без updated_at, тож теж входять у валідатор
+    return Product.objects.filter(slug=product_slug, is_active=True).values_list(
+        'updated_at', 'category__updated_at', 'stock', 'reserved',
+    ).order_by().first()
+
+
+@conditional_catalog_page(_product_timestamps)
+@cache_catalog_page
 def product_detail(request, product_slug):
     """Детальна сторінка товару"""
-    product = get_object_or_404(Product, slug=product_slug, is_active=True)
-    related_products = Product.objects.filter(
-        category=product.category, 
-        is_active=True
-    ).exclude(id=product.id)[:4]
-    
-    reviews = Review.objects.filter(product=product, is_approved=True)
+    product = get_object_or_404(Product.objects.select_related('category'), slug=product_slug, is_active=True)
+    reviews = Review.objects.filter(product=product, is_approved=True).select_related('user')
     
     # Форма відгуку
     if request.method == 'POST':
@@ -87,27 +142,36 @@ def product_detail(request, product_slug):
             review.user = request.user
             review.save()
             messages.success(request, 'Ваш відгук було додано!')
-            return redirect('product_detail', product_slug=product.slug)
+            return redirect('shop:product_detail', product_slug=product.slug)
     else:
         form = ReviewForm()
     
     context = {
         'product': product,
-        'related_products': related_products,
+        # «Часто купують разом» (див. build_recommendations), інакше — товари тієї ж категорії
+        'related_products': recommendations.related_products(product),
         'reviews': reviews,
         'form': form,
     }
     return render(request, 'shop/product_detail.html', context)
 
 
+@ensure_csrf_cookie
 def cart_view(request):
     """Перегляд кошика"""
     if not request.user.is_authenticated:
-        messages.warning(request, 'Для перегляду кошика необхідно увійти в систему.')
-        return redirect('shop:user_login')
-    
-    cart, created = Cart.objects.get_or_create(user=request.user)
-    cart_items = cart.items.all()
+        guest = GuestCart.from_request(request)
+        context = {
+            'cart': guest,
+            'cart_items': guest.items(),
+        }
+        response = render(request, 'shop/cart.html', context)
+        guest.save(response)
+        return response
+    
+    cart = cart_for(request.user)
+    # Повний опис товару кошику не потрібен
+    cart_items = cart.items.select_related('product__category').defer('product__description')
     
     context = {
         'cart': cart,
@@ -116,31 +180,60 @@ def cart_view(request):
     return render(request, 'shop/cart.html', context)
 
 
+def _cart_error(request, message, redirect_to):
+    if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
+        return JsonResponse({'success': False, 'message': message})
+    messages.error(request, message)
+    return redirect(redirect_to)
+
+
+def _set_guest_quantity(request, guest, product, quantity, redirect_to):
+    """Змінює кошик гостя; повертає відповідь з помилкою або None"""
+    # Гість нічого не резервує, але більше вільного залишку додати не може
+    if reservations_enabled() and quantity > product.available_stock:
+        return _cart_error(request, f'{product.name}: недостатньо товару на складі', redirect_to)
+    try:
+        guest.set(product.pk, quantity)
+    except GuestCartFull:
+        return _cart_error(request, 'Кошик переповнений. Увійдіть, щоб додати більше товарів.', redirect_to)
+    return None
+
+
 @require_POST
 def add_to_cart(request, product_id):
     """Додавання товару в кошик"""
+    product = get_object_or_404(Product, id=product_id, is_active=True)
+    
     if not request.user.is_authenticated:
+        guest = GuestCart.from_request(request)
+        redirect_to = reverse('shop:product_detail', kwargs={'product_slug': product.slug})
+        error = _set_guest_quantity(request, guest, product, guest.quantity(product.id) + 1, redirect_to)
+        if error:
+            return error
         if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
-            return JsonResponse({
-                'success': False,
-                'message': 'Для додавання товару в кошик необхідно увійти в систему.',
-                'redirect': '/login/'
+            response = JsonResponse({
+                'success': True,
+                'message': 'Товар додано в кошик',
+                'cart_total': guest.total_items
             })
-        messages.warning(request, 'Для додавання товару в кошик необхідно увійти в систему.')
-        return redirect('shop:user_login')
-    
-    product = get_object_or_404(Product, id=product_id, is_active=True)
-    cart, created = Cart.objects.get_or_create(user=request.user)
-    
-    cart_item, created = CartItem.objects.get_or_create(
-        cart=cart,
-        product=product,
-        defaults={'quantity': 1}
-    )
-    
-    if not created:
-        cart_item.quantity += 1
-        cart_item.save()
+        else:
+            messages.success(request, f'{product.name} додано в кошик')
+            response = redirect(redirect_to)
+        guest.save(response)
+        return response
+    
+    cart = cart_for(request.user)
+    
+    try:
+        with transaction.atomic():
+            quantity = add_items(cart, {product.id: 1})[product.id]
+            if reservations_enabled():
+                reserve(cart, product.id, quantity)
+    except OutOfStockError:
+        return _cart_error(
+            request, f'{product.name}: недостатньо товару на складі',
+            reverse('shop:product_detail', kwargs={'product_slug': product.slug}),
+        )
     
     if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
         return JsonResponse({
@@ -153,95 +246,240 @@ def add_to_cart(request, product_id):
     return redirect('shop:product_detail', product_slug=product.slug)
 
 
-@login_required
+def _update_guest_cart(request, product_id, quantity):
+    """Зміна кількості в кошику гостя; item_id для гостя — це id товару"""
+    guest = GuestCart.from_request(request)
+    if not guest.quantity(product_id):
+        raise Http404
+    product = get_object_or_404(Product, id=product_id)
+    error = _set_guest_quantity(request, guest, product, max(quantity, 0), reverse('shop:cart_view'))
+    if error:
+        return error
+    message = 'Кількість оновлено' if quantity > 0 else f'{product.name} видалено з кошика'
+    
+    if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
+        summary = guest.summary
+        response = JsonResponse({
+            'success': True,
+            'message': message,
+            'cart_total': summary['total_items'],
+            'item_total': product.final_price * guest.quantity(product.pk),
+            'cart_total_price': summary['total_price']
+        })
+    else:
+        messages.success(request, message)
+        response = redirect('shop:cart_view')
+    guest.save(response)
+    return response
+
+
+def _request_data(request):
+    """Дані POST-запиту: JSON-тіло (так надсилає main.js) або звичайна форма"""
+    if request.content_type != 'application/json':
+        return request.POST
+    try:
+        data = json.loads(request.body or b'{}')
+    except ValueError:
+        return {}
+    return data if isinstance(data, dict) else {}
+
+
 @require_POST
 def update_cart_item(request, item_id):
     """Оновлення кількості товару в кошику"""
-    cart_item = get_object_or_404(CartItem, id=item_id, cart__user=request.user)
-    quantity = int(request.POST.get('quantity', 1))
+    try:
+        quantity = int(_request_data(request).get('quantity', 1))
+    except (TypeError, ValueError):
+        return _cart_error(request, 'Некоректна кількість', 'shop:cart_view')
+    if not request.user.is_authenticated:
+        return _update_guest_cart(request, item_id, quantity)
     
-    if quantity <= 0:
-        cart_item.delete()
-        message = 'Товар видалено з кошика'
-    else:
-        cart_item.quantity = quantity
-        cart_item.save()
-        message = 'Кількість оновлено'
+    cart_item = get_object_or_404(
+        CartItem.objects.select_related('cart', 'product'), id=item_id, cart__user=request.user
+    )
+    
+    try:
+        with transaction.atomic():
+            set_quantity(cart_item, quantity)
+            message = 'Товар видалено з кошика' if quantity <= 0 else 'Кількість оновлено'
+            
+            if reservations_enabled():
+                reserve(cart_item.cart, cart_item.product_id, max(quantity, 0))
+    except OutOfStockError:
+        return _cart_error(request, f'{cart_item.product.name}: недостатньо товару на складі', 'shop:cart_view')
     
     if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
+        summary = cart_item.cart.summary
         return JsonResponse({
             'success': True,
             'message': message,
-            'cart_total': cart_item.cart.total_items,
+            'cart_total': summary['total_items'],
             'item_total': cart_item.total_price,
-            'cart_total_price': cart_item.cart.total_price
+            'cart_total_price': summary['total_price']
         })
     
     messages.success(request, message)
-    return redirect('cart_view')
+    return redirect('shop:cart_view')
 
 
-@login_required
 @require_POST
 def remove_from_cart(request, item_id):
     """Видалення товару з кошика"""
-    cart_item = get_object_or_404(CartItem, id=item_id, cart__user=request.user)
+    if not request.user.is_authenticated:
+        return _update_guest_cart(request, item_id, 0)
+    
+    cart_item = get_object_or_404(
+        CartItem.objects.select_related('cart', 'product'), id=item_id, cart__user=request.user
+    )
     product_name = cart_item.product.name
-    cart_item.delete()
+    with transaction.atomic():
+        set_quantity(cart_item, 0)
+        if reservations_enabled():
+            reserve(cart_item.cart, cart_item.product_id, 0)
     
     if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
+        summary = cart_item.cart.summary
         return JsonResponse({
             'success': True,
             'message': f'{product_name} видалено з кошика',
-            'cart_total': Cart.objects.get(user=request.user).total_items
+            'cart_total': summary['total_items'],
+            'cart_total_price': summary['total_price']
         })
     
     messages.success(request, f'{product_name} видалено з кошика')
-    return redirect('cart_view')
+    return redirect('shop:cart_view')
+
+
+# Максимум операцій в одному пакетному оновленні кошика
+CART_BATCH_LIMIT = 100
+
+
+def _parse_operations(request):
+    """[(item_id чи None, product_id чи None, кількість), ...] з JSON-тіла; None — некоректний запит"""
+    operations = _request_data(request).get('operations')
+    if not isinstance(operations, list) or len(operations) > CART_BATCH_LIMIT:
+        return None
+    parsed = []
+    for operation in operations:
+        if not isinstance(operation, dict):
+            return None
+        try:
+            item_id = int(operation['item_id']) if operation.get('item_id') is not None else None
+            product_id = int(operation['product_id']) if operation.get('product_id') is not None else None
+            quantity = max(int(operation['quantity']), 0)
+        except (KeyError, TypeError, ValueError):
+            return None
+        if (item_id is None) == (product_id is None):
+            return None
+        parsed.append((item_id, product_id, quantity))
+    return parsed
+
+
+def _cart_state(success, message, lines, requested):
+    """Відповідь пакетного оновлення: підсумки та всі рядки кошика; lines — пари (id рядка, рядок)"""
+    lines = list(lines)
+    total_price = sum((line.total_price for _, line in lines), Decimal('0')).quantize(Decimal('0.01'))
+    return JsonResponse({
+        'success': success,
+        'message': message,
+        'cart_total': sum(line.quantity for _, line in lines),
+        'cart_total_price': total_price,
+        'items': {
+            line_id: {'quantity': line.quantity, 'item_total': line.total_price} for line_id, line in lines
+        },
+        # Рядки, яких після змін у кошику немає, — клієнт прибирає їх зі сторінки
+        'removed': sorted(set(requested) - {line_id for line_id, _ in lines}),
+    })
+
+
+def _update_guest_cart_batch(request, operations):
+    guest = GuestCart.from_request(request)
+    before = dict(guest.lines)
+    success, message = True, 'Кошик оновлено'
+    try:
+        # Для гостя id рядка — це id товару
+        for item_id, product_id, quantity in operations:
+            guest.set(item_id or product_id, quantity)
+    except GuestCartFull:
+        success, message = False, 'Кошик переповнений. Увійдіть, щоб додати більше товарів.'
+    items = guest.items() if success else []
+    if success and reservations_enabled():
+        changed = {item_id or product_id for item_id, product_id, _ in operations}
+        short = [item.product.name for item in items
+                 if item.product_id in changed and item.quantity > item.product.available_stock]
+        if short:
+            success, message = False, f'Недостатньо на складі: {", ".join(short)}'
+    if not success:
+        guest = GuestCart(before)
+        items = guest.items()
+    requested = [item_id or product_id for item_id, product_id, _ in operations]
+    response = _cart_state(success, message, ((item.id, item) for item in items), requested)
+    guest.save(response)
+    return response
+
+
+@require_POST
+def update_cart_batch(request):
+    """Кілька змін кошика одним запитом.
+
+    Тіло: {"operations": [{"item_id": 5, "quantity": 2}, {"product_id": 7, "quantity": 0}, ...]};
+    кількість абсолютна, 0 видаляє рядок. Усі зміни застосовуються однією
+    транзакцією, а відповідь містить підсумки та всі рядки кошика.
+    """
+    operations = _parse_operations(request)
+    if operations is None:
+        return JsonResponse({'success': False, 'message': 'Некоректний запит'}, status=400)
+    if not request.user.is_authenticated:
+        return _update_guest_cart_batch(request, operations)
+    
+    cart = cart_for(request.user)
+    products = dict(CartItem.objects.filter(cart=cart).values_list('id', 'product_id'))
+    quantities = {}
+    for item_id, product_id, quantity in operations:
+        product_id = products.get(item_id) if item_id is not None else product_id
+        if product_id is not None:
+            quantities[product_id] = quantity
+    
+    success, message = True, 'Кошик оновлено'
+    try:
+        set_quantities(cart, quantities)
+    except OutOfStockError as error:
+        names = Product.objects.filter(id__in=error.shortages).values_list('name', flat=True)
+        success, message = False, f'Недостатньо на складі: {", ".join(names)}'
+    
+    items = cart.items.select_related('product')
+    requested = [item_id for item_id, _, _ in operations if item_id is not None]
+    return _cart_state(success, message, ((item.id, item) for item in items), requested)
 
 
 @login_required
 def checkout(request):
     """Оформлення замовлення"""
-    cart = get_object_or_404(Cart, user=request.user)
-    cart_items = cart.items.all()
-    
-    if not cart_items.exists():
-        messages.warning(request, 'Ваш кошик порожній')
-        return redirect('cart_view')
+    cart = cart_for(request.user)
     
     if request.method == 'POST':
         form = CheckoutForm(request.POST)
         if form.is_valid():
-            # Створюємо замовлення
-            order = Order.objects.create(
-                user=request.user,
-                total_amount=cart.total_price,
-                shipping_address=form.cleaned_data['shipping_address'],
-                shipping_city=form.cleaned_data['shipping_city'],
-                shipping_zip_code=form.cleaned_data['shipping_zip_code'],
-                shipping_phone=form.cleaned_data['shipping_phone'],
-                notes=form.cleaned_data.get('notes', '')
-            )
-            
-            # Додаємо товари в замовлення
-            for cart_item in cart_items:
-                OrderItem.objects.create(
-                    order=order,
-                    product=cart_item.product,
-                    quantity=cart_item.quantity,
-                    price=cart_item.product.final_price,
-                    total_price=cart_item.total_price
-                )
-            
-            # Очищуємо кошик
-            cart_items.delete()
+            try:
+                order = place_order(cart, **form.cleaned_data)
+            except EmptyCartError:
+                messages.warning(request, 'Ваш кошик порожній')
+                return redirect('shop:cart_view')
+            except OutOfStockError as error:
+                names = Product.objects.filter(id__in=error.shortages).values_list('name', flat=True)
+                messages.error(request, f'Недостатньо на складі: {", ".join(names)}')
+                return redirect('shop:cart_view')
             
             messages.success(request, f'Замовлення #{order.order_number} створено успішно!')
-            return redirect('order_detail', order_id=order.id)
+            return redirect('shop:order_detail', order_id=order.id)
     else:
         form = CheckoutForm()
     
+    cart_items = list(cart.items.select_related('product').defer('product__description'))
+    if not cart_items:
+        messages.warning(request, 'Ваш кошик порожній')
+        return redirect('shop:cart_view')
+    
     context = {
         'cart': cart,
         'cart_items': cart_items,
@@ -253,7 +491,7 @@ def checkout(request):
 @login_required
 def order_list(request):
     """Список замовлень користувача"""
-    orders = Order.objects.filter(user=request.user).order_by('-created_at')
+    orders = paginate(request, Order.objects.filter(user=request.user), ('-created_at', '-id'), 20)
     
     context = {
         'orders': orders,
@@ -265,7 +503,7 @@ def order_list(request):
 def order_detail(request, order_id):
     """Деталі замовлення"""
     order = get_object_or_404(Order, id=order_id, user=request.user)
-    order_items = order.items.all()
+    order_items = order.items.select_related('product')
     
     context = {
         'order': order,
@@ -274,30 +512,41 @@ def order_detail(request, order_id):
     return render(request, 'shop/order_detail.html', context)
 
 
+@conditional_catalog_page()
+@cache_catalog_page
 def search(request):
     """Пошук товарів"""
     query = request.GET.get('q', '')
-    products = Product.objects.filter(is_active=True)
-    
-    if query:
-        products = products.filter(
-            Q(name__icontains=query) | 
-            Q(description__icontains=query) |
-            Q(category__name__icontains=query)
-        )
-    
-    # Пагінація
-    paginator = Paginator(products, 12)
-    page_number = request.GET.get('page')
-    products = paginator.get_page(page_number)
     
     context = {
-        'products': products,
         'query': query,
+        **_catalog_page(request, Product.objects.cards().filter(is_active=True), query),
     }
     return render(request, 'shop/search.html', context)
 
 
+def search_autocomplete(request):
+    """Підказки для рядка пошуку (JSON)"""
+    query = request.GET.get('q', '')[:100]
+    try:
+        limit = max(1, min(int(request.GET['limit']), 20)) if 'limit' in request.GET else None
+    except ValueError:
+        limit = None
+    
+    urls = {'product': 'shop:product_detail', 'category': 'shop:product_list_by_category'}
+    results = [
+        {'type': kind, 'name': name, 'url': reverse(urls[kind], args=[slug])}
+        for kind, pk, name, slug in autocomplete.suggest(query, limit)
+    ]
+    return JsonResponse({'query': query, 'results': results})
+
+
+@never_cache
+def csrf_token(request):
+    """CSRF-токен для main.js: сторінки каталогу його не містять, щоб їх міг кешувати проксі"""
+    return JsonResponse({'token': get_token(request)})
+
+
 # Аутентифікація
 def user_login(request):
     """Вхід користувача"""
@@ -328,7 +577,7 @@ def user_login(request):
                 
                 # Перенаправляємо на наступну сторінку або на головну
                 next_page = request.GET.get('next', 'shop:home')
-                return redirect(next_page)
+                return merge_guest_cart(request, redirect(next_page))
             else:
                 messages.error(request, 'Невірне ім\'я користувача або пароль.')
     else:
@@ -358,7 +607,7 @@ def user_register(request):
             # Автоматично логінимо користувача після реєстрації
             login(request, user)
             messages.success(request, f'Реєстрація успішна! Ласкаво просимо, {user.first_name}!')
-            return redirect('shop:home')
+            return merge_guest_cart(request, redirect('shop:home'))
     else:
         form = UserRegistrationForm()
     
@@ -3,11 +3,32 @@
 document.addEventListener('DOMContentLoaded', function() {
     // Ініціалізація всіх компонентів
     initCart();
+    initCartPage();
     initSearch();
+    initCatalogFilters();
     initAlerts();
     initAnimations();
 });
 
+// Сортування та фільтри каталогу: кожен елемент .filter-select змінює свій параметр URL
+function initCatalogFilters() {
+    document.querySelectorAll('.filter-select').forEach(element => {
+        element.addEventListener('change', function() {
+            const url = new URL(window.location);
+            const value = this.type === 'checkbox' ? (this.checked ? this.value : '') : this.value;
+            if (value) {
+                url.searchParams.set(this.dataset.param, value);
+            } else {
+                url.searchParams.delete(this.dataset.param);
+            }
+            // Курсор сторінки дійсний лише для попередніх фільтрів
+            url.searchParams.delete('cursor');
+            url.searchParams.delete('page');
+            window.location.href = url.toString();
+        });
+    });
+}
+
 // Функції для роботи з кошиком
 function initCart() {
     // Додавання товару в кошик
@@ -30,15 +51,15 @@ function initCart() {
 }
 
 function addToCart(productId, button, originalText) {
-    fetch(`/cart/add/${productId}/`, {
+    getCSRFToken().then(token => fetch(`/cart/add/${productId}/`, {
         method: 'POST',
         headers: {
-            'X-CSRFToken': getCSRFToken(),
+            'X-CSRFToken': token,
             'X-Requested-With': 'XMLHttpRequest',
             'Content-Type': 'application/json',
         },
         body: JSON.stringify({})
-    })
+    }))
     .then(response => response.json())
     .then(data => {
         if (data.success) {
@@ -51,7 +72,7 @@ function addToCart(productId, button, originalText) {
             // Анімація кнопки
             animateButton(button, 'success');
         } else {
-            showAlert('danger', 'Помилка при додаванні товару');
+            showAlert('danger', data.message || 'Помилка при додаванні товару');
             animateButton(button, 'error');
         }
     })
@@ -98,12 +119,19 @@ function initSearch() {
     
     if (searchInput && searchForm) {
         // Автодоповнення пошуку
-        let searchTimeout;
+        const suggest = debounce(query => performSearch(searchInput, query), 150);
         searchInput.addEventListener('input', function() {
-            clearTimeout(searchTimeout);
-            searchTimeout = setTimeout(() => {
-                performSearch(this.value);
-            }, 300);
+            suggest(this.value.trim());
+        });
+        searchInput.addEventListener('keydown', function(e) {
+            if (e.key === 'Escape') {
+                hideSuggestions(searchInput);
+            }
+        });
+        document.addEventListener('click', function(e) {
+            if (!searchForm.contains(e.target)) {
+                hideSuggestions(searchInput);
+            }
         });
         
         // Обробка форми пошуку
@@ -117,11 +145,61 @@ function initSearch() {
     }
 }
 
-function performSearch(query) {
-    if (query.length < 2) return;
+let searchController = null;
+
+function performSearch(input, query) {
+    // Скасовуємо попередній запит, щоб застарілі відповіді не перезаписали новіші
+    if (searchController) {
+        searchController.abort();
+    }
+    if (query.length < 2) {
+        hideSuggestions(input);
+        return;
+    }
+    
+    searchController = new AbortController();
+    const url = `${input.dataset.autocompleteUrl}?q=${encodeURIComponent(query)}`;
+    fetch(url, {signal: searchController.signal})
+    .then(response => response.json())
+    .then(data => renderSuggestions(input, data.results))
+    .catch(error => {
+        if (error.name !== 'AbortError') {
+            console.error('Error:', error);
+        }
+    });
+}
+
+function renderSuggestions(input, results) {
+    let menu = input.parentNode.querySelector('.search-suggestions');
+    if (!menu) {
+        menu = document.createElement('ul');
+        menu.className = 'dropdown-menu search-suggestions';
+        menu.style.top = '100%';
+        menu.style.left = '0';
+        input.parentNode.appendChild(menu);
+    }
     
-    // Тут можна додати AJAX пошук з автодоповненням
-    console.log('Searching for:', query);
+    menu.innerHTML = '';
+    results.forEach(result => {
+        const item = document.createElement('li');
+        const link = document.createElement('a');
+        const icon = document.createElement('i');
+        link.className = 'dropdown-item';
+        link.href = result.url;
+        icon.className = result.type === 'category' ? 'fas fa-folder me-2 text-muted' : 'fas fa-box me-2 text-muted';
+        link.appendChild(icon);
+        link.appendChild(document.createTextNode(result.name));
+        item.appendChild(link);
+        menu.appendChild(item);
+    });
+    menu.classList.toggle('show', results.length > 0);
+}
+
+function hideSuggestions(input) {
+    const menu = input.parentNode.querySelector('.search-suggestions');
+    if (menu) {
+        menu.classList.remove('show');
+    }
 }
 
 // Функції для повідомлень
@@ -185,9 +263,29 @@ function initAnimations() {
 }
 
 // Утилітарні функції
+let csrfTokenRequest = null;
+
 function getCSRFToken() {
     const token = document.querySelector('[name=csrfmiddlewaretoken]');
-    return token ? token.value : '';
+    if (token) {
+        return Promise.resolve(token.value);
+    }
+    const cookie = document.cookie.split('; ').find(row => row.startsWith('csrftoken='));
+    if (cookie) {
+        return Promise.resolve(decodeURIComponent(cookie.split('=')[1]));
+    }
+    // Сторінки каталогу не містять токена і не видають cookie (щоб їх міг кешувати проксі) —
+    // отримуємо його один раз перед першим POST
+    if (!csrfTokenRequest) {
+        csrfTokenRequest = fetch('/csrf/', {headers: {'X-Requested-With': 'XMLHttpRequest'}})
+            .then(response => response.json())
+            .then(data => data.token)
+            .catch(error => {
+                csrfTokenRequest = null;
+                throw error;
+            });
+    }
+    return csrfTokenRequest;
 }
 
 function formatPrice(price) {
@@ -210,40 +308,103 @@ function debounce(func, wait) {
     };
 }
 
-// Функції для роботи з кошиком (для сторінки кошика)
-function updateCartItemQuantity(itemId, quantity) {
-    if (quantity < 1) {
-        removeCartItem(itemId);
-        return;
+// Сторінка кошика: зміни кількості накопичуються і надсилаються одним запитом
+const CART_FLUSH_DELAY = 400;
+const pendingCartChanges = new Map();
+let cartFlushTimer = null;
+let cartRequest = Promise.resolve();
+
+function initCartPage() {
+    document.querySelectorAll('.quantity-input').forEach(input => {
+        input.addEventListener('change', function() {
+            const quantity = parseInt(this.value, 10);
+            queueCartChange(this.dataset.itemId, Number.isNaN(quantity) || quantity < 1 ? 1 : quantity);
+        });
+    });
+
+    document.querySelectorAll('.quantity-btn').forEach(button => {
+        button.addEventListener('click', function() {
+            const input = document.querySelector(`.quantity-input[data-item-id="${this.dataset.itemId}"]`);
+            let quantity = parseInt(input.value, 10) || 1;
+            if (this.dataset.action === 'increase') {
+                quantity += 1;
+            } else if (quantity > 1) {
+                quantity -= 1;
+            }
+            input.value = quantity;
+            queueCartChange(this.dataset.itemId, quantity);
+        });
+    });
+
+    document.querySelectorAll('.remove-item').forEach(button => {
+        button.addEventListener('click', function() {
+            if (confirm('Ви впевнені, що хочете видалити цей товар з кошика?')) {
+                queueCartChange(this.dataset.itemId, 0, true);
+            }
+        });
+    });
+
+    // Незбережені зміни надсилаємо, навіть якщо користувач іде зі сторінки
+    document.addEventListener('visibilitychange', () => {
+        if (document.visibilityState === 'hidden') {
+            flushCartChanges(true);
+        }
+    });
+}
+
+function queueCartChange(itemId, quantity, immediate = false) {
+    // Остання кількість для рядка перекриває попередні — надсилається лише вона
+    pendingCartChanges.set(itemId, quantity);
+    clearTimeout(cartFlushTimer);
+    if (immediate) {
+        flushCartChanges();
+    } else {
+        cartFlushTimer = setTimeout(flushCartChanges, CART_FLUSH_DELAY);
     }
-    
-    fetch(`/cart/update/${itemId}/`, {
+}
+
+function flushCartChanges(keepalive = false) {
+    clearTimeout(cartFlushTimer);
+    if (!pendingCartChanges.size) {
+        return cartRequest;
+    }
+    if (keepalive) {
+        // Сторінка ховається: черга промісів може вже не виконатися,
+        // тож усе, що ще не пішло на сервер, надсилаємо одразу
+        sendCartChanges(true);
+        return cartRequest;
+    }
+    // Запити йдуть по черзі, щоб відповідь на старіший не перезаписала новіший стан;
+    // зміни беруться з черги в момент надсилання, тож нічого не чекає у вже сформованому запиті
+    cartRequest = cartRequest.then(() => sendCartChanges(false));
+    return cartRequest;
+}
+
+function sendCartChanges(keepalive) {
+    if (!pendingCartChanges.size) {
+        return Promise.resolve();
+    }
+    const operations = Array.from(pendingCartChanges, ([itemId, quantity]) => ({
+        item_id: Number(itemId),
+        quantity: quantity
+    }));
+    pendingCartChanges.clear();
+
+    // На сторінці кошика cookie з токеном уже є, тож запит не чекає мережі навіть із keepalive
+    return getCSRFToken().then(token => fetch('/cart/batch/', {
         method: 'POST',
+        keepalive: keepalive,
         headers: {
-            'X-CSRFToken': getCSRFToken(),
+            'X-CSRFToken': token,
             'X-Requested-With': 'XMLHttpRequest',
             'Content-Type': 'application/json',
         },
-        body: JSON.stringify({
-            quantity: quantity
-        })
-    })
+        body: JSON.stringify({operations: operations})
+    }))
     .then(response => response.json())
     .then(data => {
-        if (data.success) {
-            // Оновлюємо ціну елемента
-            const itemElement = document.querySelector(`[data-item-id="${itemId}"]`);
-            const totalElement = itemElement.querySelector('.item-total');
-            if (totalElement) {
-                totalElement.textContent = formatPrice(data.item_total);
-            }
-
-            // Оновлюємо загальну кількість та ціну
-            updateCartTotals(data.cart_total, data.cart_total_price);
-            showAlert('success', data.message);
-        } else {
-            showAlert('danger', 'Помилка при оновленні кошика');
-        }
+        applyCartState(data);
+        showAlert(data.success ? 'success' : 'danger', data.message || 'Помилка при оновленні кошика');
     })
     .catch(error => {
         console.error('Error:', error);
@@ -251,48 +412,42 @@ function updateCartItemQuantity(itemId, quantity) {
     });
 }
 
-function removeCartItem(itemId) {
-    if (confirm('Ви впевнені, що хочете видалити цей товар з кошика?')) {
-        fetch(`/cart/remove/${itemId}/`, {
-            method: 'POST',
-            headers: {
-                'X-CSRFToken': getCSRFToken(),
-                'X-Requested-With': 'XMLHttpRequest',
-                'Content-Type': 'application/json',
-            },
-            body: JSON.stringify({})
-        })
-        .then(response => response.json())
-        .then(data => {
-            if (data.success) {
-                // Видаляємо елемент з DOM
-                const itemElement = document.querySelector(`[data-item-id="${itemId}"]`);
-                if (itemElement) {
-                    itemElement.style.animation = 'slideOut 0.3s ease-out';
-                    setTimeout(() => {
-                        itemElement.remove();
-                    }, 300);
-                }
-
-                // Оновлюємо загальну кількість та ціну
-                updateCartTotals(data.cart_total, data.cart_total_price);
-
-                // Якщо кошик порожній, перезавантажуємо сторінку
-                if (data.cart_total == 0) {
-                    setTimeout(() => {
-                        location.reload();
-                    }, 1000);
-                }
-
-                showAlert('success', data.message);
-            } else {
-                showAlert('danger', 'Помилка при видаленні товару');
-            }
-        })
-        .catch(error => {
-            console.error('Error:', error);
-            showAlert('danger', 'Помилка при видаленні товару');
-        });
+function applyCartState(data) {
+    if (!data.items) {
+        return;
+    }
+    Object.entries(data.items).forEach(([itemId, item]) => {
+        const itemElement = document.querySelector(`.cart-item[data-item-id="${itemId}"]`);
+        if (!itemElement) {
+            return;
+        }
+        // Поле, яке користувач уже змінив знову, не чіпаємо до наступної відповіді
+        const input = itemElement.querySelector('.quantity-input');
+        if (input && !pendingCartChanges.has(itemId)) {
+            input.value = item.quantity;
+        }
+        const totalElement = itemElement.querySelector('.item-total');
+        if (totalElement) {
+            totalElement.textContent = formatPrice(item.item_total);
+        }
+    });
+    (data.removed || []).forEach(itemId => {
+        const itemElement = document.querySelector(`.cart-item[data-item-id="${itemId}"]`);
+        if (itemElement) {
+            itemElement.style.animation = 'slideOut 0.3s ease-out';
+            setTimeout(() => {
+                itemElement.remove();
+            }, 300);
+        }
+    });
+
+    updateCartTotals(data.cart_total, data.cart_total_price);
+
+    // Якщо кошик порожній, перезавантажуємо сторінку
+    if (data.cart_total == 0) {
+        setTimeout(() => {
+            location.reload();
+        }, 1000);
     }
 }
 
@@ -14,3 +14,8 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'terko_shop.settings')
 
 application = get_asgi_application()
+
+# Індекс автодоповнення будується у фоні одразу після старту воркера, а не в першому запиті
+from shop import autocomplete  # noqa: E402
+
+autocomplete.warm_up()
@@ -41,6 +41,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # Першим, щоб рахувати й запити сесій та автентифікації
+    'shop.instrumentation.QueryInstrumentationMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -63,6 +65,7 @@ TEMPLATES = [
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
                 'shop.context_processors.categories',
+                'shop.context_processors.guest_cart',
             ],
         },
     },
@@ -78,6 +81,16 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'OPTIONS': {
+            # Транзакції одразу беруть блокування на запис — паралельні
+            # оформлення замовлень чекають одне на одного замість помилки
+            'transaction_mode': 'IMMEDIATE',
+            'timeout': 20,
+        },
+        # Тестова база у файлі: in-memory SQLite не дозволяє паралельних транзакцій
+        'TEST': {
+            'NAME': BASE_DIR / 'test_db.sqlite3',
+        },
     }
 }
 
@@ -130,3 +143,95 @@ MEDIA_ROOT = BASE_DIR / 'media'
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+
+# Кеш. Для кількох воркерів потрібен спільний бекенд (Redis або Memcached),
+# інакше версія каталогу та лічильники кешу будуть свої в кожному процесі
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'terko-shop',
+        'OPTIONS': {'MAX_ENTRIES': 10000},
+    }
+}
+
+
+# Магазин
+# Оформлювати замовлення на доступну кількість, якщо товару не вистачає
+SHOP_CHECKOUT_PARTIAL_FILL = False
+
+# Резервувати товар на складі під час додавання в кошик
+SHOP_STOCK_RESERVATIONS = False
+
+# Скільки секунд живе резерв без змін кошика
+SHOP_RESERVATION_TTL = 15 * 60
+
+# Максимум результатів повнотекстового пошуку за релевантністю (після фільтрів; з явним сортуванням — без обмеження)
+SHOP_SEARCH_MAX_RESULTS = 1000
+
+# «Часто купують разом» (manage.py build_recommendations): скільки сусідів зберігати
+# для товару, мінімум спільних замовлень пари та міра схожості (jaccard або lift)
+SHOP_RECOMMENDATIONS_TOP_K = 8
+SHOP_RECOMMENDATIONS_MIN_SUPPORT = 2
+SHOP_RECOMMENDATIONS_MEASURE = 'jaccard'
+
+# Автодоповнення пошуку: кількість підказок, бюджет ключів індексу в пам'яті процесу
+# (ключ на кожне слово назви, ≈250 байт разом із записом; 200000 — близько 50 МБ) та як часто (с)
+# перевіряти, чи інший воркер не змінив каталог
+SHOP_AUTOCOMPLETE_LIMIT = 8
+SHOP_AUTOCOMPLETE_MAX_KEYS = 200000
+SHOP_AUTOCOMPLETE_CHECK_INTERVAL = 5
+
+# Скільки секунд кешувати загальну кількість рядків для пагінації
+SHOP_PAGINATION_COUNT_TTL = 300
+
+# До скількох рядків списки адмінки рахують точну кількість; більші таблиці — оцінку
+SHOP_ADMIN_EXACT_COUNT_LIMIT = 10000
+
+# Кеш сторінок каталогу для анонімних відвідувачів і фрагментів карток товарів
+SHOP_CATALOG_CACHE = True
+SHOP_CATALOG_CACHE_TIMEOUT = 60
+
+# ETag / Last-Modified і Cache-Control (public для reverse proxy) сторінок каталогу для анонімних відвідувачів
+SHOP_CONDITIONAL_GET = True
+
+# Скільки секунд категорії навігації живуть у пам'яті процесу та у спільному кеші
+SHOP_CATEGORIES_CACHE_TTL = 60
+
+# Межі діапазонів цін (₴) для фасетного фільтра каталогу
+SHOP_PRICE_FACETS = (500, 1000, 2500, 5000)
+# Скільки індексів фасетів (категорій) тримати в пам'яті процесу
+SHOP_FACET_INDEXES = 32
+
+# Варіанти зображень (назва: ширина, px), що генеруються у WebP і JPEG після завантаження
+SHOP_IMAGE_VARIANTS = {'thumb': 160, 'card': 400, 'detail': 1200}
+# Процесів для генерації варіантів; 0 — генерувати одразу в процесі запиту
+SHOP_IMAGE_WORKERS = 2
+# Скільки задач генерації може чекати в пулі процесу; решту пропускає й пізніше
+# обробляє manage.py generate_image_variants
+SHOP_IMAGE_MAX_PENDING = 100
+
+# Кошик гостя: назва підписаного cookie, строк зберігання (с) і максимум різних товарів
+SHOP_GUEST_CART_COOKIE = 'cart'
+SHOP_GUEST_CART_AGE = 30 * 24 * 60 * 60
+SHOP_GUEST_CART_MAX_LINES = 50
+# Максимальна кількість одного товару в рядку кошика гостя
+SHOP_CART_MAX_QUANTITY = 99
+
+# Облік SQL-запитів кожного HTTP-запиту (shop/instrumentation.py): заголовок X-DB-Queries,
+# журнал shop.queries і попередження, якщо один запит повторюється стільки разів (N+1)
+SHOP_QUERY_INSTRUMENTATION = DEBUG
+SHOP_QUERY_DEBUG_HEADER = DEBUG
+SHOP_QUERY_DUPLICATE_THRESHOLD = 3
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        # DEBUG — підсумок кожного запиту, WARNING — лише ймовірні N+1
+        'shop.queries': {'handlers': ['console'], 'level': 'INFO', 'propagate': False},
+    },
+}